@@ -0,0 +1,97 @@
+# times the parse of granules built to make regular expressions backtrack; run it
+# from the root of the repository with: python -m benchmarks.adversarial [sizes ...]
+from typing import Callable, Dict, List
+from xml.etree import ElementTree as et
+import argparse
+import random
+import time
+
+from crec.granule import Granule
+
+HEAD = '''<html>
+<head>
+<title>Congressional Record, Volume 164 Issue 3</title>
+</head>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+[Senate]
+[Page S27]
+From the Congressional Record Online through the Government Publishing Office [www.gpo.gov]
+
+
+
+
+                        MORNING BUSINESS
+
+'''
+FOOT = '\n\n                          ____________________\n\n</pre></body>\n</html>\n'
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgS27</granuleId>
+<congMember role="SPEAKING" bioGuideId="S000001"><name type="parsed">Mr. SMITH</name><name type="authority-fnf">John Smith</name></congMember>
+<congMember role="SPEAKING" bioGuideId="K000001"><name type="parsed">Mr. KING of Iowa</name><name type="authority-fnf">Steve King</name></congMember>
+</extension></mods>'''
+
+
+def repeated(body: str) -> Callable[[int], str]:
+    """
+    Returns a function that takes as an input a size, and returns the text of a
+    granule whose body is ``body`` repeated ``size`` times.
+    """
+    return lambda size : HEAD + '  ' + body*size + FOOT
+
+
+def shuffled(size: int) -> str:
+    """
+    Returns the text of a granule made of ``size`` pieces of the other inputs, in a
+    random (but fixed) order.
+    """
+    r = random.Random(size)
+    pieces = ['Mr. SMITH (for ', '[[Page ', '{time}\n', '\n \n', 'The PRESIDING OFFICER (', ' =========== NOTE ===========\n', '\n\n  ', '<bullet> ', 'Mr. KING of Iowa. ', 'words ']
+    return HEAD + '  ' + ''.join(r.choice(pieces) for _ in range(size)) + FOOT
+
+
+# inputs that made some step of a parse take time quadratic in their length
+ADVERSARIAL : Dict[str, Callable[[int], str]] = {
+    'unclosed for': repeated('Mr. SMITH (for '),
+    'unclosed page number': repeated('x [[Page '),
+    'time before blank lines': lambda size : HEAD + '  Mr. SMITH. Yes. {time}' + '\n '*size + FOOT,
+    'unclosed title': repeated('The PRESIDING OFFICER ('),
+    'unclosed note': lambda size : HEAD + '  Mr. SMITH. Yes.\n =========== NOTE ===========\n' + ' x\n'*size + FOOT,
+    'blank lines': lambda size : HEAD + '  Mr. SMITH. Yes.' + '\n'*size + 'x' + FOOT,
+    'bullets': repeated('<bullet> '),
+    'speakers': repeated('Mr. SMITH. Yes.\n  Mr. KING of Iowa. No.\n  '),
+    'shuffled': shuffled,
+}
+
+
+def time_parse(text: str) -> float:
+    """
+    Parses a granule with the given text, and returns how long that took, in
+    seconds.
+    """
+    granule = Granule(granule_id='CREC-2018-01-04-pt1-PgS27')
+    start = time.perf_counter()
+    granule.parse_responses(xml_response=et.fromstring(MODS), htm_response=text)
+    elapsed = time.perf_counter() - start
+    if not granule.parsed:
+        raise granule.parse_exception
+    return elapsed
+
+
+def main(sizes: List[int]) -> None:
+    """
+    Times the parse of each adversarial input at each size. Since every step of a
+    parse is meant to take time linear in the length of the text, the time per
+    character should stay about the same as the size grows.
+    """
+    for name, make in ADVERSARIAL.items():
+        for size in sizes:
+            text = make(size)
+            elapsed = time_parse(text=text)
+            print(f'{name:<24} {size:>8} {len(text):>10} chars {elapsed:>9.4f} s {elapsed/len(text)*1e9:>8.1f} ns/char')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the parse of granules built to make regular expressions backtrack.')
+    parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    main(sizes=args.sizes)
@@ -0,0 +1,109 @@
+# compares the regular expression engines that crec can compile its patterns with
+# (see crec.engine): how long each takes to parse the same granules, and whether it
+# finds the same passages and paragraphs as re. Run it from the root of the
+# repository with: python -m benchmarks.engines [--directory DIRECTORY]
+from typing import List, Tuple
+from xml.etree import ElementTree as et
+import argparse
+import glob
+import os
+import random
+import time
+
+from crec import cleaner, patterns
+from crec.engine import EnginePattern, available_engines, set_engine
+from crec.granule import Granule
+from benchmarks.adversarial import HEAD, FOOT
+
+MEMBERS = [('Mr. McCONNELL', 'Mitch McConnell'), ('Mr. SCHUMER', 'Charles Schumer'), ('Ms. ROS-LEHTINEN', 'Ileana Ros-Lehtinen'), ('Mr. KING of Iowa', 'Steve King'), ('Mrs. MURRAY', 'Patty Murray')]
+TITLES = ['The PRESIDING OFFICER', 'The PRESIDING OFFICER (Mr. SULLIVAN)', 'The SPEAKER pro tempore', 'The CHAIR', 'Mr. Manager RASKIN']
+WORDS = 'the senate bill amendment consent unanimous ask president time order question motion vote members state committee report section'.split()
+EXTRAS = ['', '', '', '\n\n[[Page S{page}]]\n\n', '\n                          {{time}}  {page}', '\n =========== NOTE ===========\n\n  A note.\n\n =========== END NOTE ===========']
+
+
+def synthetic_granule(seed: int) -> Tuple[str, str]:
+    """
+    Returns the metadata (xml) and text (htm) of a made-up granule, with speakers,
+    titled speakers, page numbers, times, and notes.
+    """
+    r = random.Random(seed)
+    members = r.sample(MEMBERS, r.randint(1, len(MEMBERS)))
+    speakers = [parsed for parsed, _ in members] + r.sample(TITLES, r.randint(0, 2))
+    paragraphs = []
+    for _ in range(r.randint(5, 60)):
+        words = ' '.join(r.choice(WORDS) for _ in range(r.randint(10, 120)))
+        lines = '\n'.join(words[i:i + 70] for i in range(0, len(words), 70))
+        speaker = f'{r.choice(speakers)}. ' if r.random() < 0.4 else ''
+        paragraphs.append(f'  {speaker}{lines}' + r.choice(EXTRAS).format(page=r.randint(1000, 9999)))
+    members_xml = ''.join(f'<congMember role="SPEAKING" bioGuideId="B{i}"><name type="parsed">{parsed}</name><name type="authority-fnf">{name}</name></congMember>' for i, (parsed, name) in enumerate(members))
+    xml = f'<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgS{seed}</granuleId>{members_xml}</extension></mods>'
+    return xml, HEAD + '\n'.join(paragraphs) + FOOT
+
+
+def written_granules(directory: str) -> List[Tuple[str, str]]:
+    """
+    Returns the metadata (xml) and text (htm) of the granules written to
+    ``directory`` (see the ``write`` parameter of :class:`.Record`).
+    """
+    granules = []
+    for htm_path in sorted(glob.glob(os.path.join(directory, '*.htm'))):
+        xml_path = htm_path[:-len('.htm')] + '.xml'
+        if os.path.exists(xml_path):
+            with open(xml_path, 'r') as xml_file, open(htm_path, 'r') as htm_file:
+                granules.append((xml_file.read(), htm_file.read()))
+    return granules
+
+
+def parse_all(granules: List[Tuple[str, str]]) -> Tuple[float, list]:
+    """
+    Parses each granule, and returns how long that took, in seconds, along with the
+    passages and paragraphs that were found.
+    """
+    roots = [et.fromstring(xml) for xml, _ in granules]
+    results = []
+    start = time.perf_counter()
+    for root, (_, htm) in zip(roots, granules):
+        granule = Granule(granule_id=root.find('.//{http://www.loc.gov/mods/v3}granuleId').text)
+        granule.parse_responses(xml_response=root, htm_response=htm)
+        results.append((granule.clean_text, [(p.speaker.parsed_name, [paragraph.text for paragraph in p.paragraphs]) for p in granule.passages], repr(granule.parse_exception)))
+    return time.perf_counter() - start, results
+
+
+def fallbacks(engine: str) -> int:
+    """
+    Returns the number of crec's patterns that ``engine`` could not compile, and
+    that are compiled with re instead.
+    """
+    compiled = [p for module in (patterns, cleaner) for p in vars(module).values() if isinstance(p, EnginePattern)]
+    compiled += patterns.TITLE_PATTERNS + patterns.UNCLOSED_TITLE_PATTERNS
+    return sum(p.engine != engine for p in compiled)
+
+
+def main(granules: List[Tuple[str, str]], repeat: int) -> None:
+    """
+    Parses the granules with each installed engine, ``repeat`` times, and prints the
+    fastest time of each engine, how many patterns fell back to re, and how many
+    granules came out differently than with re.
+    """
+    engines = available_engines()
+    print(f'{len(granules)} granules, {sum(len(htm) for _, htm in granules)} characters; engines: {", ".join(engines)}')
+    expected = None
+    for engine in engines:
+        set_engine(engine)
+        parse_all(granules=granules[:10])
+        seconds, results = min((parse_all(granules=granules) for _ in range(repeat)), key=lambda t : t[0])
+        if expected is None:
+            expected = results
+        mismatches = sum(result != e for result, e in zip(results, expected))
+        print(f'{engine:<6} {seconds:>8.3f} s  {fallbacks(engine=engine):>3} patterns fell back to re  {mismatches:>5} granules differ from re')
+    set_engine('re')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the regular expression engines that crec can use.')
+    parser.add_argument('--directory', default=None, help='a directory of granules written by crec (xml and htm files); made-up granules are used otherwise')
+    parser.add_argument('--granules', type=int, default=500, help='the number of made-up granules')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    granules = written_granules(directory=args.directory) if args.directory is not None else [synthetic_granule(seed=seed) for seed in range(args.granules)]
+    main(granules=granules, repeat=args.repeat)
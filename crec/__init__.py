@@ -1 +1,3 @@
-from .record import Record
\ No newline at end of file
+from .record import Record, fetch, aiter_granules
+from .session import Session
+from .filters import GranuleFilter
\ No newline at end of file
@@ -1,9 +1,13 @@
 import httpx
-from typing import Union, Tuple
+from typing import Union, List, Tuple, BinaryIO
 import asyncio
+import functools
+import random
 import time
+import email.utils
 
 from crec.logger import Logger
+from crec.cache import ResponseCache
 
 
 class RateLimitError(BaseException):
@@ -21,6 +25,361 @@ class APIKeyError(BaseException):
     pass
 
 
+class RateLimiter:
+    """
+    A token bucket, owned by a :class:`.GovInfoClient`, that controls how quickly
+    requests are sent to GovInfo. The bucket mirrors GovInfo's own quota: it learns
+    the quota from the ``X-RateLimit-Limit`` and ``X-RateLimit-Remaining`` response
+    headers (and ``X-RateLimit-Reset`` or ``Retry-After``, when provided), so that
+    requests run just under the limit instead of exceeding it. On top of the bucket,
+    the number of concurrent requests is adjusted with additive increase and
+    multiplicative decrease: every successful round of requests allows one more
+    concurrent request, and every rate limit error halves both the concurrency and
+    the request rate (errors that arrive while requests are already paused count as
+    the same error).
+
+    Until GovInfo reports a quota, requests are not rate-limited, and concurrency is
+    only limited by ``max_concurrency``.
+
+    Parameters
+    ----------
+    window : int = 3600
+        The length, in seconds, of the window over which GovInfo's quota is
+        enforced. Used when GovInfo does not report when the quota resets.
+    min_rate : float = 0.05
+        The lowest rate, in requests per second, that the limiter will decrease to.
+    min_concurrency : int = 1
+        The lowest number of concurrent requests that the limiter will decrease to.
+    max_concurrency : int = 100
+        The highest number of concurrent requests that the limiter will allow. Should
+        not exceed the size of the client's connection pool.
+    """
+    def __init__(self, window: int = 3600, min_rate: float = 0.05, min_concurrency: int = 1, max_concurrency: int = 100) -> None:
+        self.window = window
+        self.min_rate = min_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+        self.limit : Union[int, None] = None
+        self.remaining : Union[int, None] = None
+        self.learned_rate : Union[float, None] = None
+        self.rate : Union[float, None] = None
+        self.concurrency : Union[int, None] = None
+
+        self.in_flight = 0
+        self.tokens = float('inf')
+        self.paused_until = 0.0
+        self.rate_limit_errors = 0
+
+        self._last_refill = time.monotonic()
+        self._successes = 0
+        self._condition : Union[asyncio.Condition, None] = None
+
+    def __repr__(self) -> str:
+        return self.report()
+
+    def report(self) -> str:
+        """
+        Returns a summary of the limiter's current and learned rates.
+        """
+        current_rate = 'unlimited' if self.rate is None else f'{self.rate:.2f} requests/second'
+        learned_rate = 'unknown' if self.learned_rate is None else f'{self.learned_rate:.2f} requests/second'
+        concurrency = f'{self.max_concurrency if self.concurrency is None else self.concurrency} requests'
+        return f'current rate: {current_rate}; learned rate: {learned_rate}; concurrency: {concurrency}; rate limit errors: {self.rate_limit_errors}'
+
+    @property
+    def concurrency_limit(self) -> int:
+        """
+        The number of requests that can currently be in flight at once.
+        """
+        return min(self.concurrency or self.max_concurrency, self.max_concurrency)
+
+    def token_wait(self) -> float:
+        """
+        Returns the number of seconds until the bucket holds a token, not counting
+        a pause.
+        """
+        self.refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refill(self) -> None:
+        """
+        Adds the tokens that have accumulated since the last refill to the bucket.
+        """
+        now = time.monotonic()
+        if self.rate is not None:
+            capacity = self.limit if self.limit is not None else float('inf')
+            self.tokens = min(capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self) -> None:
+        """
+        Waits until a concurrency slot and a token are both available, and takes
+        them.
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        async with self._condition:
+            await self._condition.wait_for(lambda : self.in_flight < self.concurrency_limit)
+            self.in_flight += 1
+
+        try:
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self) -> None:
+        """
+        Gives back the concurrency slot taken by :meth:`.RateLimiter.acquire()`.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def update(self, response: httpx.Response, in_flight: int = None) -> None:
+        """
+        Reads GovInfo's rate limit headers from a response, and updates the learned
+        rate and the contents of the bucket accordingly. ``in_flight`` is the number
+        of requests that were in flight when the response arrived, including the one
+        that got it; if it is ``None``, the current number is used.
+        """
+        in_flight = self.in_flight if in_flight is None else in_flight
+        limit = _int_header(response, 'X-RateLimit-Limit')
+        remaining = _int_header(response, 'X-RateLimit-Remaining')
+        if limit is None and remaining is None:
+            return
+
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+
+        reset = _reset_seconds(response)
+        if reset is not None and self.remaining is not None and reset > 0:
+            self.learned_rate = max(self.remaining, 1) / reset
+        elif self.limit is not None:
+            self.learned_rate = self.limit / self.window
+
+        if self.learned_rate is None:
+            return
+
+        if self.rate is None or self.rate > self.learned_rate:
+            self.rate = self.learned_rate
+
+        if self.remaining is not None:
+            self.refill()
+            self.tokens = min(self.tokens, max(self.remaining - (in_flight - 1), 0))
+
+    def on_success(self) -> None:
+        """
+        Additively increases the concurrency limit (by one request per round of
+        successful requests) and the rate (up to the learned rate).
+        """
+        self._successes += 1
+        if self.concurrency is not None and self._successes >= self.concurrency:
+            self._successes = 0
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        if self.rate is not None and self.learned_rate is not None and self.rate < self.learned_rate:
+            self.rate = min(self.learned_rate, self.rate + self.learned_rate / 100)
+
+    def on_rate_limited(self, wait: Union[int, float], response: httpx.Response = None, in_flight: int = None) -> float:
+        """
+        Multiplicatively decreases the concurrency limit and the rate, empties the
+        bucket, and pauses all requests, unless requests are already paused. Requests
+        are paused until GovInfo says the quota resets, if it says so, or for ``wait``
+        seconds otherwise. Returns the length of the pause.
+
+        Until the concurrency limit has been decreased once, it is taken to be the
+        number of requests that were in flight when the rate limit error arrived,
+        including the one that got it (``in_flight``; if it is ``None``, the current
+        number is used).
+        """
+        in_flight = self.in_flight if in_flight is None else in_flight
+        self.rate_limit_errors += 1
+        now = time.monotonic()
+        if self.paused_until > now:
+            return self.paused_until - now
+
+        self._successes = 0
+        self.concurrency = max(self.min_concurrency, (self.concurrency or min(in_flight, self.max_concurrency)) // 2)
+        if self.rate is not None:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+        reset = _reset_seconds(response) if response is not None else None
+        pause = reset if reset is not None else wait
+
+        self.refill()
+        self.tokens = 0 if self.rate is not None else float('inf')
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        return pause
+
+
+class Backoff:
+    """
+    Decides how long a :class:`.GovInfoClient` waits before trying a request again:
+    a random time between zero and an exponentially growing limit (``base`` seconds
+    after the first attempt, twice that after the second, and so on, up to ``cap``
+    seconds), so that requests that failed together do not all retry at the same
+    moment. If the response says when to try again with a ``Retry-After`` header,
+    that is used instead.
+
+    Parameters
+    ----------
+    base : float = 1
+        The limit, in seconds, on the wait after the first attempt.
+    cap : float = 60
+        The largest limit, in seconds, on any wait.
+    """
+    def __init__(self, base: float = 1, cap: float = 60) -> None:
+        self.base = base
+        self.cap = cap
+
+    def __repr__(self) -> str:
+        return f'Backoff (base: {self.base}, cap: {self.cap})'
+
+    def delay(self, attempt: int, response: httpx.Response = None) -> float:
+        """
+        Returns the number of seconds to wait after the ``attempt``-th attempt at a
+        request (counting from one), which got ``response``, if any.
+        """
+        retry_after = _retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.cap, self.base * 2**(attempt - 1)))
+
+
+class APIKey:
+    """
+    An API key in a :class:`.KeyPool`, with its own :class:`.RateLimiter` (GovInfo
+    enforces its rate limit per key) and a count of the requests sent with it.
+
+    Parameters
+    ----------
+    api_key : str
+        API key from GovInfo.
+    """
+    def __init__(self, api_key: str) -> None:
+        self.api_key = api_key
+        self.rate_limiter = RateLimiter()
+        self.requests = 0
+
+    def __repr__(self) -> str:
+        return f'APIKey (key: {self.label})'
+
+    @property
+    def label(self) -> str:
+        """
+        A label for the key that can be logged without revealing it.
+        """
+        return 'none' if not self.api_key else f'...{self.api_key[-4:]}'
+
+    def report(self) -> str:
+        """
+        Returns a summary of the key's usage and rate limiter.
+        """
+        return f'{self.label}: {self.requests} requests; {self.rate_limiter.report()}'
+
+
+class KeyPool:
+    """
+    A pool of GovInfo API keys, owned by a :class:`.GovInfoClient`, that requests
+    are spread across. Each request is sent with the key that is most available: a
+    key is only waited on if every key is saturated, that is, paused (because its
+    rate limit was exceeded), out of tokens in its :class:`.RateLimiter`, or at its
+    limit of concurrent requests. Among the keys that can send a request right
+    away, the one with the most tokens left (and then the fewest requests in
+    flight, and the fewest requests overall) is chosen. If every key is saturated,
+    the one that will have a token (and not be paused) soonest is chosen, and then
+    the one that is not at its limit of concurrent requests.
+
+    Parameters
+    ----------
+    api_keys : List[str]
+        API keys from GovInfo.
+    """
+    def __init__(self, api_keys: List[str]) -> None:
+        if len(api_keys) == 0:
+            raise ValueError('a key pool needs at least one api_key')
+        self.keys = [APIKey(api_key=k) for k in api_keys]
+
+    def __repr__(self) -> str:
+        return f'KeyPool (keys: {len(self.keys)})'
+
+    def choose(self) -> APIKey:
+        """
+        Returns the key that the next request should be sent with.
+        """
+        now = time.monotonic()
+        def availability(key: APIKey) -> Tuple[bool, float, bool, float, int, int]:
+            limiter = key.rate_limiter
+            wait = max(limiter.paused_until - now, 0) + limiter.token_wait()
+            saturated = limiter.in_flight >= limiter.concurrency_limit
+            return wait > 0 or saturated, wait, saturated, -limiter.tokens, limiter.in_flight, key.requests
+        return min(self.keys, key=availability)
+
+    def report(self) -> List[str]:
+        """
+        Returns a summary of each key's usage and rate limiter.
+        """
+        return [k.report() for k in self.keys]
+
+
+def _int_header(response: httpx.Response, header: str) -> Union[int, None]:
+    value = response.headers.get(header, None)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_seconds(response: httpx.Response) -> Union[float, None]:
+    """
+    Returns the number of seconds until GovInfo's quota resets, read from the
+    ``X-RateLimit-Reset`` header (in seconds or as a timestamp) or the ``Retry-After``
+    header (in seconds or as an HTTP date), if either is provided.
+    """
+    reset = _int_header(response, 'X-RateLimit-Reset')
+    if reset is not None:
+        if reset > 10**9:
+            reset = reset - time.time()
+        return max(float(reset), 0.0)
+
+    return _retry_after_seconds(response)
+
+
+def _retry_after_seconds(response: httpx.Response) -> Union[float, None]:
+    """
+    Returns the number of seconds that the ``Retry-After`` header of a response
+    (in seconds or as an HTTP date) asks to wait, if it is provided.
+    """
+    retry_after = response.headers.get('Retry-After', None)
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
 class GovInfoClient(httpx.AsyncClient):
     """
     Handles requesting data from the GovInfo API. Inherits from 
@@ -38,77 +397,220 @@ class GovInfoClient(httpx.AsyncClient):
         should be ``False``, and URLs will only be tried once.
     logger : :class:`.Logger`
         An object that handles outputting logs.
-    api_key : str = None
+    api_key : Union[str, List[str]] = None
         API key from GovInfo. Can be obtained by visiting 
-        https://www.govinfo.gov/api-signup
+        https://www.govinfo.gov/api-signup. If a list of keys is provided, requests
+        are spread across them, and each key's rate limit is tracked on its own (see
+        :class:`.KeyPool`).
+    cache : :class:`.ResponseCache` = None
+        If provided, responses are served from and stored in this on-disk cache.
+    http2 : bool = False
+        Whether to use HTTP/2, which lets many requests share one connection.
+        Requires the ``h2`` package.
+    limits : :class:`httpx.Limits` = None
+        If provided, controls how many connections are opened and how long idle
+        connections are kept alive. Otherwise, the defaults of :mod:`httpx` are used.
+    backoff : :class:`.Backoff` = None
+        Decides how long to wait before trying a failed request again. If
+        ``backoff`` is ``None``, a :class:`.Backoff` with the default settings is
+        used.
+
+    Attributes
+    ----------
+    key_pool : :class:`.KeyPool`
+        The API keys that requests are spread across, each with a
+        :class:`.RateLimiter` that controls how quickly and how concurrently requests
+        are sent with it, based on what GovInfo reports about its rate limit.
+    rate_limiter : :class:`.RateLimiter`
+        The rate limiter of the first key in ``key_pool`` (the only one, unless a
+        list of keys was provided).
     """
-    def __init__(self, rate_limit_wait: Union[bool, int], retry_limit: Union[bool, int], logger: Logger, api_key: str):
+    def __init__(self, rate_limit_wait: Union[bool, int], retry_limit: Union[bool, int], logger: Logger, api_key: Union[str, List[str]], cache: ResponseCache = None, http2: bool = False, limits: httpx.Limits = None, backoff: Backoff = None):
         timeout = httpx.Timeout(30.0, connect=30.0)
-        super().__init__(timeout=timeout)
+        if limits is None:
+            super().__init__(timeout=timeout, http2=http2)
+        else:
+            super().__init__(timeout=timeout, http2=http2, limits=limits)
 
         self.api_root = 'https://api.govinfo.gov/'
         self.non_api_root = 'https://www.govinfo.gov/'
 
-        self.api_key = api_key
+        self.key_pool = KeyPool(api_keys=api_key if isinstance(api_key, list) else [api_key])
+        self.api_key = self.key_pool.keys[0].api_key
         self.rate_limit_wait = rate_limit_wait
         self.retry_limit = retry_limit
         self.logger = logger
+        self.rate_limiter = self.key_pool.keys[0].rate_limiter
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.cache = cache
     
-    async def get(self, url: str, params: dict = {}, use_api: bool = True) -> Tuple[bool, Union[httpx.Response, None]]:
+    async def get(self, url: str, params: dict = {}, use_api: bool = True, file: BinaryIO = None, use_cache: bool = True, headers: dict = None, defer: bool = False) -> Tuple[bool, Union[httpx.Response, None]]:
         """
         Extends :meth:`httpx.AsyncClient.get()`. Controls waiting and retrying URLs, 
-        and handles GovInfo-specific query parameters like the ``api_key``. 
+        and handles GovInfo-specific query parameters like the ``api_key`` (each
+        attempt is sent with the key chosen by ``self.key_pool``). 
         Returns a tuple consisting of a boolean indicating whether or not the request 
         was successful and the response itself (the response could be ``None`` 
-        if the request fails ``self.retry_limit`` times).
+        if the request fails ``self.retry_limit`` times). If the client has a
+        :class:`.ResponseCache`, cached responses are used instead of contacting
+        GovInfo whenever possible; the cache is read and written in a separate
+        thread, so that hashing and copying large bodies does not block the event
+        loop.
+
+        If a binary ``file`` is provided, a successful response body is streamed into
+        it in chunks instead of being held in memory, and the returned response has
+        no content of its own. If ``use_cache`` is ``False``, the cache is neither
+        read nor written, which suits listings that change over time.
+
+        Extra request ``headers`` can be provided. If they include a ``Range``, a
+        partial (``206``) response is successful too; partial responses are read
+        into memory even if a ``file`` is provided, and should not be cached.
+
+        Failed requests are tried again after a wait decided by ``self.backoff``.
+        If GovInfo responds that the content is still being generated (``503``) and
+        ``defer`` is ``True``, the ``503`` response is returned at once instead, so
+        that the caller can set the request aside and try it again later (see
+        :meth:`.GovInfoClient.is_deferred()`).
         """
         if use_api:
             url = self.api_root + url
-            params.update({'api_key': self.api_key})
         else:
             url = self.non_api_root + url
 
+        headers = dict(headers) if headers is not None else {}
+        accepts_partial = 'Range' in headers
+        cache_entry = None
+        cache = self.cache if use_cache else None
+        loop = asyncio.get_running_loop()
+        if cache is not None:
+            cache_key = cache.key(url=url, params=params)
+            cache_entry = await loop.run_in_executor(None, cache.lookup, cache_key)
+            if cache_entry is not None and (cache.offline or cache.is_fresh(cache_entry)):
+                return await loop.run_in_executor(None, functools.partial(cache.response, cache_entry, file=file))
+            if cache.offline:
+                self.logger.log(message=f'{url} is not cached, and the cache is offline; skipping')
+                return False, None
+            if cache_entry is not None and not cache_entry.missing:
+                headers.update(cache.conditional_headers(cache_entry))
+
         request_counter = 0
         response_validity = False
         while self.retry_limit is False or request_counter < self.retry_limit:
             request_counter += 1
+            key = self.key_pool.choose()
+            await key.rate_limiter.acquire()
+            key.requests += 1
+            request_params = dict(params, api_key=key.api_key) if use_api else params
             try:
-                response = await super().get(url=url, params=params)
+                if file is None:
+                    response = await super().get(url=url, params=request_params, headers=headers)
+                else:
+                    response = await self.stream_to_file(url=url, params=request_params, headers=headers, file=file)
             except (httpx.ConnectTimeout, httpx.ConnectError, httpx.ReadTimeout, httpx.ReadError, httpx.PoolTimeout, httpx.RemoteProtocolError) as e:
                 response = None
+            finally:
+                # counted before this request gives back its slot, so that it counts itself
+                in_flight = key.rate_limiter.in_flight
+                await key.rate_limiter.release()
 
             if response is None:
-                self.logger.log(message=f'httpx error; trying again')
-                await asyncio.sleep(2)
+                delay = self.backoff.delay(attempt=request_counter)
+                self.logger.log(message=f'httpx error; trying again in {delay:.1f} seconds')
+                await asyncio.sleep(delay)
                 continue
 
+            key.rate_limiter.update(response, in_flight=in_flight)
+
             if (response.status_code == 400 and 'does not exist' in response.text) or response.status_code == 302:
                 response_validity = False
                 response = None
+                if cache is not None:
+                    await loop.run_in_executor(None, functools.partial(cache.store, key=cache_key, url=url, response=None))
                 break
 
+            if response.status_code == 304 and cache_entry is not None:
+                await loop.run_in_executor(None, cache.revalidated, cache_entry)
+                return await loop.run_in_executor(None, functools.partial(cache.response, cache_entry, file=file))
+
             if response.status_code == 401:
                 raise APIKeyError('api_key is invalid or not provided')
 
             if response.status_code == 503:
-                self.logger.log(message=f'the content you requested is not cached by GovInfo; it is currently being generated, pausing 30 seconds')
-                await asyncio.sleep(30)
+                if defer:
+                    self.logger.log(message=f'the content you requested is not cached by GovInfo; it is currently being generated, setting it aside')
+                    break
+                delay = self.backoff.delay(attempt=request_counter, response=response)
+                self.logger.log(message=f'the content you requested is not cached by GovInfo; it is currently being generated, pausing {delay:.0f} seconds')
+                await asyncio.sleep(delay)
                 continue
 
-            if 'OVER_RATE_LIMIT' in response.text:
+            if self.is_rate_limited(response):
                 if type(self.rate_limit_wait) == int:
-                    self.logger.log(message=f'exceeded rate limit; pausing for {self.rate_limit_wait} seconds now')
-                    await asyncio.sleep(self.rate_limit_wait)
+                    pause = key.rate_limiter.on_rate_limited(wait=self.rate_limit_wait, response=response, in_flight=in_flight)
+                    if len(self.key_pool.keys) > 1:
+                        self.logger.log(message=f'exceeded rate limit of api key {key.label}; taking it out of rotation for {pause:.0f} seconds ({key.rate_limiter.report()})')
+                    else:
+                        self.logger.log(message=f'exceeded rate limit; pausing for {pause:.0f} seconds now ({key.rate_limiter.report()})')
                     continue
                 else:
                     raise RateLimitError('you have exceeded the rate limit; halting now')
 
-            if response.status_code != 200:
-                self.logger.log(message=f'api error (status {response.status_code}); trying again')
-                await asyncio.sleep(2)
+            if response.status_code != 200 and not (response.status_code == 206 and accepts_partial):
+                delay = self.backoff.delay(attempt=request_counter, response=response)
+                self.logger.log(message=f'api error (status {response.status_code}); trying again in {delay:.1f} seconds')
+                await asyncio.sleep(delay)
                 continue
 
+            key.rate_limiter.on_success()
             response_validity = True
+            if cache is not None:
+                await loop.run_in_executor(None, functools.partial(cache.store, key=cache_key, url=url, response=response, file=file))
             break
 
-        return response_validity, response
\ No newline at end of file
+        return response_validity, response
+
+    async def stream_to_file(self, url: str, params: dict, headers: dict, file: BinaryIO) -> httpx.Response:
+        """
+        Requests a URL and, if the request is successful, writes the response body
+        into ``file`` chunk by chunk. Unsuccessful response bodies (which are small)
+        are read into memory as usual, so that they can be inspected.
+        """
+        async with self.stream('GET', url=url, params=params, headers=headers) as response:
+            if response.status_code == 200:
+                file.seek(0)
+                file.truncate()
+                async for chunk in response.aiter_bytes():
+                    file.write(chunk)
+                file.flush()
+                file.seek(0)
+            else:
+                await response.aread()
+        return response
+
+    @staticmethod
+    def is_deferred(response_validity: bool, response: Union[httpx.Response, None]) -> bool:
+        """
+        Returns whether the result of :meth:`.GovInfoClient.get()` says that the
+        content is still being generated by GovInfo, so that the request should be
+        tried again later.
+        """
+        return response_validity is not True and response is not None and response.status_code == 503
+
+    @staticmethod
+    def is_rate_limited(response: httpx.Response) -> bool:
+        """
+        Returns whether a response says the rate limit was exceeded. Only textual
+        bodies that have been read are searched for GovInfo's ``OVER_RATE_LIMIT``
+        code, so that binary bodies like zip files are never decoded.
+        """
+        if response.status_code == 429:
+            return True
+
+        content_type = response.headers.get('content-type', '')
+        if not any(t in content_type for t in ['json', 'text', 'xml']) and content_type != '':
+            return False
+
+        try:
+            return b'OVER_RATE_LIMIT' in response.content
+        except httpx.ResponseNotRead:
+            return False
\ No newline at end of file
@@ -0,0 +1,358 @@
+from typing import Union, Tuple, BinaryIO
+import httpx
+import hashlib
+import sqlite3
+import threading
+import time
+import os
+import json
+import shutil
+
+
+class CacheEntry:
+    """
+    Describes a single cached response.
+
+    Parameters
+    ----------
+    key : str
+        The cache key of the request that produced the response.
+    url : str
+        The URL of the request that produced the response, without the ``api_key``.
+    digest : str
+        The SHA-256 digest of the response body, which is also the name of the file
+        the body is stored in. ``None`` if GovInfo said the content does not exist.
+    size : int
+        The size of the response body in bytes.
+    headers : dict
+        The response headers that are kept alongside the body (content type,
+        ``ETag`` and ``Last-Modified``).
+    stored_at : float
+        The time at which the response was stored or last revalidated.
+    """
+    def __init__(self, key: str, url: str, digest: Union[str, None], size: int, headers: dict, stored_at: float) -> None:
+        self.key = key
+        self.url = url
+        self.digest = digest
+        self.size = size
+        self.headers = headers
+        self.stored_at = stored_at
+
+    def __repr__(self) -> str:
+        return f'CacheEntry (url: {self.url})'
+
+    @property
+    def missing(self) -> bool:
+        """
+        Whether GovInfo said the requested content does not exist.
+        """
+        return self.digest is None
+
+
+class ResponseCache:
+    """
+    A persistent, on-disk cache of GovInfo responses, used by a
+    :class:`.GovInfoClient`. Response bodies are content-addressed: each one is
+    stored once, in a file named after its SHA-256 digest. Requests are keyed by
+    their URL and query parameters, ignoring the ``api_key``. An index of requests,
+    kept in a SQLite database inside ``directory``, records which body belongs to
+    which request and when each one was last used, so that the least recently used
+    bodies can be evicted once the cache grows beyond ``max_size``.
+
+    Past days of the Congressional Record almost never change, so by default cached
+    responses are served without contacting GovInfo at all. If ``max_age`` is an
+    ``int``, responses older than ``max_age`` seconds are revalidated with GovInfo
+    using their ``ETag`` and ``Last-Modified`` headers, and are only downloaded
+    again if they have changed.
+
+    Parameters
+    ----------
+    directory : str
+        A directory to store cached responses in. Created if it does not exist.
+    max_size : Union[bool, int] = False
+        If ``max_size`` is an ``int``, then once the bodies in the cache take up more
+        than ``max_size`` bytes, the least recently used ones are evicted. Otherwise,
+        ``max_size`` should be ``False``, and the cache can grow indefinitely.
+    max_age : Union[bool, int] = False
+        If ``max_age`` is an ``int``, then cached responses older than ``max_age``
+        seconds are revalidated before being used. Otherwise, ``max_age`` should be
+        ``False``, and cached responses are always used as-is.
+    missing_max_age : int = 86400
+        The number of seconds to remember that GovInfo said some content does not
+        exist (for example, a day on which Congress was not in session). Kept short
+        by default, since that content may be published later.
+    offline : bool = False
+        If ``offline`` is ``True``, responses are only served from the cache, and no
+        requests are sent to GovInfo. Requests that are not cached fail.
+
+    Attributes
+    ----------
+    hits : int
+        The number of requests that were served from the cache, including those
+        that were revalidated.
+    misses : int
+        The number of requests that were not in the cache, or that had changed.
+    """
+    def __init__(self, directory: str, max_size: Union[bool, int] = False, max_age: Union[bool, int] = False, missing_max_age: int = 86400, offline: bool = False) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.missing_max_age = missing_max_age
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, url TEXT, digest TEXT, size INTEGER, headers TEXT, stored_at REAL, accessed_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+        self._db.commit()
+        # the size of the bodies is summed once here, and kept up to date as entries
+        # are stored and removed, so that storing a response does not scan the index
+        self._size = self._db.execute('SELECT SUM(size) FROM (SELECT DISTINCT digest, size FROM entries WHERE digest IS NOT NULL)').fetchone()[0] or 0
+
+    def __repr__(self) -> str:
+        return f'ResponseCache (directory: {self.directory})'
+
+    def report(self) -> str:
+        """
+        Returns a summary of how many requests were served from the cache.
+        """
+        return f'{self.hits} hits; {self.misses} misses; {self.size} bytes cached'
+
+    @staticmethod
+    def key(url: str, params: dict = {}) -> str:
+        """
+        Returns the cache key for a request: a digest of its URL and its query
+        parameters, ignoring the ``api_key``.
+        """
+        params = sorted((k, str(v)) for k, v in params.items() if k != 'api_key')
+        return hashlib.sha256(json.dumps([url, params]).encode()).hexdigest()
+
+    def object_path(self, digest: str) -> str:
+        """
+        Returns the path of the file that holds the body with the given digest.
+        """
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    @property
+    def size(self) -> int:
+        """
+        The number of bytes taken up by the bodies in the cache.
+        """
+        with self._lock:
+            return self._size
+
+    def lookup(self, key: str) -> Union[CacheEntry, None]:
+        """
+        Returns the :class:`.CacheEntry` for a cache key, or ``None`` if the request
+        is not cached.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT key, url, digest, size, headers, stored_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        entry = CacheEntry(key=row[0], url=row[1], digest=row[2], size=row[3], headers=json.loads(row[4]), stored_at=row[5])
+        if not entry.missing and not os.path.exists(self.object_path(entry.digest)):
+            self.remove(key)
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Returns whether a cached response can be used without revalidating it.
+        """
+        age = time.time() - entry.stored_at
+        if entry.missing:
+            return age < self.missing_max_age
+        return self.max_age is False or age < self.max_age
+
+    def conditional_headers(self, entry: CacheEntry) -> dict:
+        """
+        Returns the headers that ask GovInfo to only send a response if it differs
+        from the cached one.
+        """
+        headers = {}
+        if entry.headers.get('etag', None) is not None:
+            headers['If-None-Match'] = entry.headers['etag']
+        if entry.headers.get('last-modified', None) is not None:
+            headers['If-Modified-Since'] = entry.headers['last-modified']
+        return headers
+
+    def response(self, entry: CacheEntry, file: BinaryIO = None) -> Tuple[bool, Union[httpx.Response, None]]:
+        """
+        Builds a response from a :class:`.CacheEntry`, in the same form that
+        :meth:`.GovInfoClient.get()` returns, and marks the entry as recently used.
+        If a binary ``file`` is provided, the body is copied into it instead of being
+        read into memory.
+        """
+        self.hits += 1
+        self.touch(entry.key)
+        if entry.missing:
+            return False, None
+
+        with open(self.object_path(entry.digest), 'rb') as f:
+            if file is None:
+                content = f.read()
+            else:
+                content = b''
+                file.seek(0)
+                file.truncate()
+                shutil.copyfileobj(f, file)
+                file.flush()
+                file.seek(0)
+        return True, httpx.Response(status_code=200, headers=entry.headers, content=content, request=httpx.Request('GET', entry.url))
+
+    def store(self, key: str, url: str, response: Union[httpx.Response, None], file: BinaryIO = None) -> None:
+        """
+        Stores a response under a cache key. If ``response`` is ``None``, records
+        that GovInfo said the requested content does not exist. If the response body
+        was streamed into a binary ``file``, it is copied from there.
+        """
+        self.misses += 1
+        if response is None:
+            digest, size, headers = None, 0, {}
+        else:
+            headers = {h: response.headers[h] for h in ['content-type', 'etag', 'last-modified'] if h in response.headers}
+            if file is None:
+                digest = hashlib.sha256(response.content).hexdigest()
+                size = len(response.content)
+            else:
+                file.seek(0)
+                sha = hashlib.sha256()
+                for chunk in iter(lambda : file.read(2**20), b''):
+                    sha.update(chunk)
+                digest = sha.hexdigest()
+                size = file.tell()
+
+            path = self.object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    if file is None:
+                        f.write(response.content)
+                    else:
+                        file.seek(0)
+                        shutil.copyfileobj(file, f)
+                os.replace(tmp_path, path)
+
+            if file is not None:
+                file.seek(0)
+
+        now = time.time()
+        with self._lock:
+            unused_path = self._remove(key)
+            is_new_body = digest is not None and not self.is_used(digest)
+            self._db.execute('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)', (key, url, digest, size, json.dumps(headers), now, now))
+            self._db.commit()
+            if is_new_body:
+                self._size += size
+            if digest is not None and unused_path == self.object_path(digest):
+                unused_path = None
+
+        if unused_path is not None and os.path.exists(unused_path):
+            os.remove(unused_path)
+
+        if self.max_size is not False and digest is not None:
+            self.evict()
+
+    def revalidated(self, entry: CacheEntry) -> None:
+        """
+        Records that GovInfo confirmed a cached response is unchanged.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?', (now, now, entry.key))
+            self._db.commit()
+        entry.stored_at = now
+
+    def touch(self, key: str) -> None:
+        """
+        Marks a cache entry as recently used.
+        """
+        with self._lock:
+            self._db.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+
+    def is_used(self, digest: str) -> bool:
+        """
+        Returns whether any cache entry uses the body with the given digest. Should
+        only be called while holding the cache's lock.
+        """
+        return self._db.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone() is not None
+
+    def _remove(self, key: str) -> Union[str, None]:
+        """
+        Deletes a cache entry from the index, without committing, and subtracts the
+        size of its body if no other entry uses it. Returns the path of the body if it
+        is no longer used, or ``None``. Should only be called while holding the
+        cache's lock.
+        """
+        row = self._db.execute('SELECT digest, size FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        digest, size = row
+        if digest is None or self.is_used(digest):
+            return None
+        self._size -= size
+        return self.object_path(digest)
+
+    def remove(self, key: str) -> None:
+        """
+        Removes a cache entry, and deletes its body if no other entry uses it.
+        """
+        with self._lock:
+            unused_path = self._remove(key)
+            self._db.commit()
+
+        if unused_path is not None and os.path.exists(unused_path):
+            os.remove(unused_path)
+
+    def remove_matching(self, text: str) -> int:
+        """
+        Removes every cache entry whose URL contains ``text``, for example the
+        package identifier of a package that GovInfo has modified. Returns the number
+        of entries that were removed.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT key FROM entries WHERE instr(url, ?) > 0", (text,)).fetchall()
+
+        for (key,) in rows:
+            self.remove(key)
+        return len(rows)
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the bodies in the cache take
+        up no more than ``max_size`` bytes. The entries are removed from the index in
+        a single transaction.
+        """
+        unused_paths = []
+        with self._lock:
+            if self._size <= self.max_size:
+                return
+            rows = self._db.execute('SELECT key FROM entries WHERE digest IS NOT NULL ORDER BY accessed_at')
+            for (key,) in rows.fetchall():
+                unused_path = self._remove(key)
+                if unused_path is not None:
+                    unused_paths.append(unused_path)
+                if self._size <= self.max_size:
+                    break
+            self._db.commit()
+
+        for path in unused_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self) -> None:
+        """
+        Closes the cache's index.
+        """
+        with self._lock:
+            self._db.close()
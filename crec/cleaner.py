@@ -0,0 +1,245 @@
+from typing import List, Iterator
+
+from crec.engine import EnginePattern
+from crec.patterns import BULLET, TITLE_BLOCK, FOOTER, INLINE_PAGE_NUMBER, PAGE_NUMBER, TIME, NOTE, BOTTOM_HTML, SPOKEN_PARAGRAPH
+
+FOOTER_RULE = '____________________\n'
+NOTE_HEADER = EnginePattern(r' =+ NOTE =')
+NOTE_END = ' END NOTE ='
+TRAILING_TIME = EnginePattern(r'\{time\}\s*$')
+
+
+def clean_htm(raw_text: str) -> str:
+    """
+    Takes as an input the text (htm) of a granule, and returns its clean text: the
+    spoken paragraphs, separated by blank lines, without the title, the footer,
+    page numbers, times, notes, or html. Each rule is applied to the whole text in
+    turn, so that every rule makes a new copy of it.
+
+    This is the reference that :func:`.clean_htm_lines` is tested against.
+    """
+    text = raw_text
+
+    # remove bullets
+    text = BULLET.sub(' ', text)
+
+    # remove title block
+    title_block_match = TITLE_BLOCK.search(text)
+    if title_block_match is not None:
+        text = '\n  ' + text[title_block_match.end():]
+
+    # remove footer
+    footer_match = FOOTER.search(text)
+    if footer_match is not None:
+        text = text[:footer_match.start()]
+
+    # remove inline page numbers
+    text = INLINE_PAGE_NUMBER.sub(' ', text)
+
+    # remove other page numbers
+    text = PAGE_NUMBER.sub('', text)
+
+    # remove times
+    text = TIME.sub('', text)
+
+    # remove notes
+    text = NOTE.sub('\n  ', text)
+
+    # remove bottom html
+    bottom_html_match = BOTTOM_HTML.search(text)
+    if bottom_html_match is not None:
+        text = text[:bottom_html_match.start() + 1]
+
+    spoken_paragraphs = SPOKEN_PARAGRAPH.finditer(text)
+    return '\n\n'.join([p.group('text') for p in spoken_paragraphs])
+
+
+def clean_htm_lines(raw_text: str) -> str:
+    """
+    Takes as an input the text (htm) of a granule, and returns the same clean text
+    as :func:`.clean_htm`, but walks the text line by line instead of applying each
+    rule to the whole text in turn. The title block and the footer are found
+    without copying the text, the lines in between are cleaned one at a time (page
+    numbers, times, and then notes and the bottom html), and each spoken paragraph
+    is collected as soon as the line that ends it is reached, so that the only
+    copies of the text are its lines and the clean text itself.
+    """
+    text = BULLET.sub(' ', raw_text) if '<bullet>' in raw_text else raw_text
+
+    start = 0
+    title_block_match = TITLE_BLOCK.search(text)
+    if title_block_match is not None:
+        start = title_block_match.end()
+
+    end = footer_start(text=text, start=start)
+    if end is None:
+        end = len(text)
+    elif end < start:
+        return ''
+
+    lines = text[start:end].split('\n')
+    if title_block_match is not None:
+        lines[0] = '  ' + lines[0]
+        lines.insert(0, '')
+
+    lines = list(without_times(lines=without_page_numbers(lines=lines)))
+    lines = without_bottom_html(lines=without_notes(lines=lines))
+    return '\n\n'.join(spoken_paragraphs(lines=lines))
+
+
+def footer_start(text: str, start: int) -> int:
+    """
+    Returns where the footer of a granule's text begins (along with the spaces and
+    blank lines before it), searching from ``start``, or ``None`` if there is no
+    footer. If the footer begins right at ``start``, just after the title block,
+    returns ``-1``, since the blank space before the footer then reaches back
+    into the title block.
+    """
+    position = start
+    while True:
+        rule = text.find(FOOTER_RULE, position)
+        if rule < 0:
+            return None
+        if rule == start and start > 0:
+            return -1
+        if rule > start and text[rule - 1] in ' \n':
+            while rule > start and text[rule - 1] in ' \n':
+                rule -= 1
+            return rule
+        position = rule + 1
+
+
+def is_page_line(line: str) -> bool:
+    """
+    Returns whether a line holds nothing but a page number.
+    """
+    return line.startswith('[[Page ') and line.endswith(']') and len(line) >= 9
+
+
+def without_page_numbers(lines: List[str]) -> Iterator[str]:
+    """
+    Takes as an input the lines of a granule's text, and yields them without page
+    numbers. A page number that stands on its own between blank lines, in the
+    middle of a paragraph, is replaced by a space that joins the lines around it.
+    """
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        while i + 3 < len(lines) and lines[i] == '' and lines[i + 2] == '' and is_page_line(lines[i + 1]) and lines[i + 3][:1].isascii() and lines[i + 3][:1].isalnum():
+            line = f'{line} {lines[i + 3]}'
+            i += 4
+        yield without_page_number(line=line)
+
+
+def without_page_number(line: str) -> str:
+    """
+    Takes as an input a line of a granule's text, and returns it without page
+    numbers, like ``PAGE_NUMBER.sub('', line)`` would: everything from the first
+    ``[[Page `` to the last ``]]`` is removed. Looking for both ends once keeps this
+    linear, where the pattern would scan the rest of the line from every ``[[Page ``
+    that is never closed.
+    """
+    start = line.find('[[Page ')
+    if start < 0:
+        return line
+    end = line.rfind(']]')
+    if end < start + 8:
+        return line
+    return line[:start] + line[end + 2:]
+
+
+def without_times(lines: Iterator[str]) -> Iterator[str]:
+    """
+    Takes as an input the lines of a granule's text, and yields them without times.
+    A time whose digits are on a later line takes the lines in between with it.
+    """
+    lines = iter(lines)
+    for line in lines:
+        if '{time}' not in line:
+            yield line
+            continue
+
+        joined = [line]
+        trailing = TRAILING_TIME.search(line) is not None
+        while trailing:
+            next_line = next(lines, None)
+            if next_line is None:
+                break
+            joined.append(next_line)
+            trailing = next_line.strip() == '' or TRAILING_TIME.search(next_line) is not None
+        yield from TIME.sub('', '\n'.join(joined)).split('\n')
+
+
+def without_notes(lines: List[str]) -> List[str]:
+    """
+    Takes as an input the lines of a granule's text, and returns them without
+    notes. Everything from the first note to the end of the last note is removed
+    (along with the blank lines before it), and whatever follows the end of the
+    last note starts a new paragraph.
+    """
+    header = next((i for i in range(1, len(lines)) if NOTE_HEADER.match(lines[i])), None)
+    if header is None:
+        return lines
+    last_end = next((i for i in range(len(lines) - 1, header - 1, -1) if NOTE_END in lines[i]), None)
+    if last_end is None:
+        return lines
+
+    end_position = lines[last_end].rfind(NOTE_END)
+    if last_end == header and end_position < NOTE_HEADER.match(lines[header]).end() + 1:
+        return lines
+
+    rest = lines[last_end][end_position + len(NOTE_END):].lstrip('=')
+    before = header - 1
+    while before > 0 and lines[before] == '':
+        before -= 1
+    return lines[:before + 1] + [f'  {rest}'] + lines[last_end + 1:]
+
+
+def without_bottom_html(lines: List[str]) -> List[str]:
+    """
+    Takes as an input the lines of a granule's text, and returns them up to the
+    html that closes the text (without the blank lines before it, but ending with
+    a line break).
+    """
+    for i in range(1, len(lines) - 1):
+        if lines[i] == '</pre></body>' and lines[i + 1].startswith('</html>'):
+            before = i - 1
+            while before > 0 and lines[before] == '':
+                before -= 1
+            return lines[:before + 1] + ['']
+    return lines
+
+
+def paragraph_start(line: str) -> int:
+    """
+    Returns where the spoken text of a line that starts a paragraph begins (after
+    an indent of two or three spaces), or ``-1`` if the line does not start one.
+    """
+    for indent in (2, 3):
+        if line[indent:indent + 1] and not line[indent].isspace() and line[indent] not in '([':
+            return indent
+        if line[indent:indent + 1] != ' ':
+            return -1
+    return -1
+
+
+def spoken_paragraphs(lines: List[str]) -> Iterator[str]:
+    """
+    Takes as an input the lines of a granule's clean text, and yields its spoken
+    paragraphs. A paragraph starts on a line indented by two or three spaces (but
+    not by a parenthesis or a bracket), and runs until the next line that is
+    indented by at least two spaces; lines that are indented like that but do not
+    start a paragraph are left out, along with the lines that follow them.
+    """
+    paragraph = None
+    for i, line in enumerate(lines):
+        if i > 0 and line.startswith('  '):
+            if paragraph is not None:
+                yield '\n'.join(paragraph)
+            indent = paragraph_start(line)
+            paragraph = [line[indent:]] if indent >= 0 else None
+        elif paragraph is not None:
+            paragraph.append(line)
+    if paragraph is not None:
+        yield '\n'.join(paragraph)
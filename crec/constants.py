@@ -18,6 +18,20 @@ TITLES = [
 ]
 
 GRANULE_CLASSES = ['HOUSE', 'SENATE', 'EXTENSIONS', 'DAILYDIGEST']
+SCHEDULERS = ['batch', 'window']
+SPOOL_SIZE = 2**20
+ZIPPED_OPTIONS = [True, False, 'auto']
+REGEX_ENGINES = ['re', 'regex', 're2']
+# rough sizes (in bytes) used to plan requests; the /granules listing does not report sizes
+GRANULE_SIZES = {'HOUSE': 12000, 'SENATE': 16000, 'EXTENSIONS': 4000, 'DAILYDIGEST': 30000}
+MODS_SIZE = 6000
+ZIPPED_GRANULE_SIZE = 40000
+ZIPPED_MODS_SIZE = 2000
+DIRECTORY_ENTRY_SIZE = 250
+SUMMARY_SIZE = 300
+LISTING_PAGE_SIZE = 1000
+ZIP_TAIL_SIZE = 2**16
+REQUEST_COST = 50000
 GRANULE_ATTRIBUTES = ['granuleDate',  'granuleId', 'searchTitle', 'granuleClass', 'subGranuleClass', 'chamber']
 SPEAKER_ATTRIBUTES = ['authorityId', 'bioGuideId', 'chamber', 'congress', 'gpoId', 'party', 'role', 'state']
 
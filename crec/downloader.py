@@ -1,20 +1,32 @@
-from typing import Union, List, Set, Tuple
+from typing import Union, List, Dict, Set, Tuple, Iterable, Iterator, AsyncIterator, Coroutine, Callable, Hashable, Any, BinaryIO
 import asyncio
+import time
+import contextlib
 from httpx._client import ClientState
 from httpx import Response
 import zipfile
-from io import BytesIO
 import re
 from xml.etree import ElementTree as et
 from xml.etree.ElementTree import Element
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
 import threading
+import tempfile
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
 
 from crec.api import GovInfoClient
-from crec.granule import Granule, get_granule_ids
+from crec.cache import ResponseCache
+from crec.filters import GranuleFilter, MODS_NAMESPACE
+from crec.manifest import Manifest
+from crec.granule import Granule, get_granule_ids, get_granule_summaries, wanted_granule_ids, parse_granule
+from crec.planner import Planner, DatePlan
+from crec.remotezip import RemoteZip
+from crec.package import PackageCalendar, get_modified_packages, get_published_packages, package_dates, current_watermark, read_watermark, write_watermark
 from crec.logger import Logger
-from crec.constants import GRANULE_CLASSES
+from crec.constants import GRANULE_CLASSES, SCHEDULERS, SPOOL_SIZE, ZIPPED_OPTIONS
+
+MODS_MEMBER_PATTERN = re.compile(r'CREC-\d+-\d+-\d+\/mods\.xml')
 
 
 class AsyncLoopHandler(threading.Thread):
@@ -33,6 +45,14 @@ class AsyncLoopHandler(threading.Thread):
         self.loop.run_forever()
         return self.loop
 
+    def stop(self) -> None:
+        """
+        Stops the event loop, waits for the thread to finish, and closes the loop.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+        self.loop.close()
+
 
 class Downloader:
     """
@@ -49,16 +69,60 @@ class Downloader:
         * ``SENATE``
         * ``EXTENSIONS``
         * ``DAILYDIGEST``
+    granule_filter : :class:`.GranuleFilter` = None
+        If provided, only granules that pass ``granule_filter`` (by date, chamber,
+        speaker, or title) will be retrieved. The filter is checked as early as
+        possible: before a granule's text is requested, read from a zipped file, or
+        parsed. Like ``granule_class_filter``, it is ignored when granule
+        identifiers are requested directly.
     parse : bool = True
         A boolean that indicates whether or not the text of granules should be parsed.
     write : Union[bool, str] = False
         If ``write`` is ``False``, then granule text (htm files) and metadata (xml files)
         will not be written to disk. Otherwise, ``write`` should be a path where those
         files should be written to.
-    zipped : bool = True
+    zipped : Union[bool, str] = True
         Determines if granules should be requested individually or in zips. Only applies
         to calls where dates are used; if you are requesting individual granule
-        identifiers, granules are always requested individually.
+        identifiers, granules are always requested individually. If ``zipped`` is
+        ``'auto'``, each date's granules are listed first, and a :class:`.Planner`
+        chooses whichever is estimated to cost less for that date, given the
+        granule class filter and granule filter; the plan is logged before it is
+        carried out.
+    zip_directory : str = None
+        Only applies when granules are requested in zips. If provided, zipped files
+        are saved to this directory, and zipped files that were saved in a previous
+        run are reused instead of being requested again. Otherwise, zipped files are
+        streamed to temporary files that are deleted once they have been read.
+    ranges : bool = False
+        Only applies when granules are requested in zips. If ``ranges`` is ``True``,
+        only the parts of each zipped file that are needed are requested, with HTTP
+        range requests: the listing of its files, its metadata, and the text of the
+        granules that pass the granule class filter and granule filter. The parts
+        are not saved to ``zip_directory``. If the server does not support range
+        requests, the whole zipped file is requested instead. If ``zipped`` is
+        ``'auto'``, the planner prices zipped files as range requests. Otherwise,
+        ``ranges`` should be ``False``, and whole zipped files are requested.
+    pipeline : Union[bool, int] = False
+        Only applies when granules are requested in zips. If ``pipeline`` is an
+        ``int``, zipped files are downloaded while earlier ones are parsed and
+        written, with at most ``pipeline`` downloaded files waiting to be processed
+        at a time; downloads are scheduled as if ``scheduler`` were ``'window'``.
+        Otherwise, ``pipeline`` should be ``False``, and all zipped files are
+        downloaded before any of them are processed.
+    workers : Union[bool, int] = False
+        If ``workers`` is an ``int``, granules are parsed in a pool of ``workers``
+        processes, so that parsing can use several CPU cores. As with any use of
+        :mod:`multiprocessing`, scripts that set ``workers`` should do so under an
+        ``if __name__ == '__main__':`` guard. Otherwise, ``workers`` should be
+        ``False``, and granules are parsed in this process.
+    parse_budget : Union[bool, float] = False
+        If ``parse_budget`` is a number, parsing a single granule is abandoned at the
+        first check after it has taken ``parse_budget`` seconds, and its
+        ``parse_exception`` is set to a :class:`.ParseTimeoutError`. The budget is
+        checked between the steps of a parse, so a step that runs past it finishes
+        first (see :meth:`.Granule.parse_responses()`). Otherwise, ``parse_budget``
+        should be ``False``, and granules are parsed for as long as it takes.
     batch_size: int = 3
         The number of request to asynchronously send at the same time. Too high of a 
         number will result in frequent rate limit issues. When requesting zip files,
@@ -71,6 +135,16 @@ class Downloader:
         after each batch. When requesting zip files, a ``batch_wait`` is not necessary.
         When requesting files individually, the ``batch_wait`` should be around 2-5
         seconds.
+    scheduler : str = 'batch'
+        Determines how requests are scheduled. If ``scheduler`` is ``'batch'``,
+        requests are sent in batches of size ``batch_size``, and each batch must
+        finish before the next one starts. If ``scheduler`` is ``'window'``,
+        ``batch_size`` requests are kept in flight at all times, and a new request is
+        started as soon as any other finishes; ``batch_wait`` is ignored.
+    fail_fast : bool = False
+        Only applies when granules are requested individually. If ``fail_fast`` is
+        ``True``, then as soon as either the metadata or the text request for a
+        granule has failed for good, the other request is cancelled.
     rate_limit_wait : Union[int, bool] = 300
         If ``rate_limit_wait`` is an ``int``, then exceeding the GovInfo rate limit 
         will cause the program to halt for ``rate_limit_wait`` seconds. Otherwise, 
@@ -80,11 +154,52 @@ class Downloader:
         If ``retry_limit`` is an ``int``, then the program will attempt to request
         URLs up to ``retry_limit`` times before moving on. Otherwise, ``retry_limit``
         should be ``False``, and URLs will only be tried once.
-    api_key : str = None
+    defer_wait : Union[bool, int] = 30
+        If ``defer_wait`` is an ``int``, granules and zipped files that GovInfo is
+        still generating (it answers ``503`` while it does) are set aside instead of
+        holding up a request slot, and requested again once the others are finished,
+        no sooner than ``defer_wait`` seconds after they were set aside (up to
+        ``retry_limit`` times). Otherwise, ``defer_wait`` should be ``False``, and
+        requests wait for them in place.
+    cache : Union[bool, str, :class:`.ResponseCache`] = False
+        If ``cache`` is a path, responses from GovInfo are cached on disk in that
+        directory, and reused in later runs instead of being requested again. For more
+        control (a size limit, revalidation, or offline use), ``cache`` can also be a
+        :class:`.ResponseCache` object. Otherwise, ``cache`` should be ``False``, and
+        nothing is cached.
+    calendar : Union[bool, str, :class:`.PackageCalendar`] = False
+        If ``calendar`` is ``True`` or a path, a :class:`.PackageCalendar` of the days
+        on which a CREC package was issued is consulted before any date is requested,
+        and dates without a package are skipped; if it is a path, the calendar is
+        stored there and reused across runs. ``calendar`` can also be a
+        :class:`.PackageCalendar` object. Otherwise, ``calendar`` should be
+        ``False``, and every date is requested.
+    resume : Union[bool, str, :class:`.Manifest`] = False
+        If ``resume`` is a path, the progress of the run is recorded in a
+        :class:`.Manifest` at that path, and work that was finished by an earlier run
+        with the same manifest is skipped: finished granules whose files are still in
+        the directory they were written to are read from there instead of being
+        requested again, and finished dates are not requested at all. Only granules
+        that were written to disk can be skipped. ``resume`` can also be a
+        :class:`.Manifest` object. Otherwise, ``resume`` should be ``False``.
+    api_key : Union[str, List[str]] = None
         API key from GovInfo. Can be obtained by visiting 
-        https://www.govinfo.gov/api-signup
+        https://www.govinfo.gov/api-signup. If a list of keys is provided, requests
+        are spread across them, and each key's rate limit is tracked on its own (see
+        :class:`.KeyPool`).
     logger : :class:`.Logger`
         An object that handles outputting logs.
+    client : :class:`.GovInfoClient` = None
+        If provided, requests are made with ``client`` instead of a new
+        :class:`.GovInfoClient`, and ``rate_limit_wait``, ``retry_limit``, ``cache``,
+        and ``api_key`` are ignored. The client is never closed by the downloader,
+        so that it can be shared with other code running on the same event loop;
+        closing it is up to the caller.
+    loop_handler : :class:`.AsyncLoopHandler` = None
+        If provided, the synchronous methods of this class run their coroutines on
+        the event loop of ``loop_handler``, which is left running once the downloader
+        is closed. Otherwise, a thread with its own event loop is started the first
+        time it is needed, and stopped when the downloader is closed.
 
     Attributes
     -----------
@@ -97,25 +212,90 @@ class Downloader:
         A set of granule identifiers that did *not* have their data retrieved, 
         parsed, or written to disk (depending on requested behavior).
     """
-    def __init__(self, granule_class_filter: List[str], parse: bool, write: Union[bool, str], zipped: bool, batch_size: int, batch_wait: Union[bool, int], rate_limit_wait: Union[bool, int], retry_limit: Union[bool, int], api_key: str, logger: Logger) -> None:
+    def __init__(self, granule_class_filter: List[str], parse: bool, write: Union[bool, str], zipped: Union[bool, str], batch_size: int, batch_wait: Union[bool, int], rate_limit_wait: Union[bool, int], retry_limit: Union[bool, int], api_key: Union[str, List[str]], logger: Logger, granule_filter: GranuleFilter = None, scheduler: str = 'batch', fail_fast: bool = False, defer_wait: Union[bool, int] = 30, cache: Union[bool, str, ResponseCache] = False, zip_directory: str = None, ranges: bool = False, pipeline: Union[bool, int] = False, workers: Union[bool, int] = False, parse_budget: Union[bool, float] = False, calendar: Union[bool, str, PackageCalendar] = False, resume: Union[bool, str, Manifest] = False, client: GovInfoClient = None, loop_handler: AsyncLoopHandler = None) -> None:
         if parse is False and write is False:
             raise Exception("You are neither parsing nor writing text and metadata; you must do at least one.")
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f'scheduler must be one of {SCHEDULERS}')
+        if zipped not in ZIPPED_OPTIONS:
+            raise ValueError(f'zipped must be one of {ZIPPED_OPTIONS}')
         self.granule_class_filters = granule_class_filter
         self.valid_classes = [c for c in GRANULE_CLASSES if c in granule_class_filter] if granule_class_filter is not None else GRANULE_CLASSES
         self.invalid_classes = [c for c in GRANULE_CLASSES if c not in granule_class_filter] if granule_class_filter is not None else []
+        self.granule_filter = granule_filter
         self.parse = parse
         self.write = write
         self.zipped = zipped
+        self.planner = Planner(ranges=ranges) if zipped == 'auto' else None
+        self.zip_directory = zip_directory
+        self.ranges = ranges
+        self.pipeline = pipeline
+        self.workers = workers
+        self.parse_budget = parse_budget
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if self.zip_directory is not None:
+            os.makedirs(self.zip_directory, exist_ok=True)
         self.batch_size = batch_size
         self.batch_wait = batch_wait
-        self.client = GovInfoClient(rate_limit_wait=rate_limit_wait, retry_limit=retry_limit, logger=logger, api_key=api_key)
+        self.scheduler = scheduler
+        self.fail_fast = fail_fast
+        self.defer_wait = defer_wait
+        if client is None:
+            if isinstance(cache, str):
+                cache = ResponseCache(directory=cache)
+            client = GovInfoClient(rate_limit_wait=rate_limit_wait, retry_limit=retry_limit, logger=logger, api_key=api_key, cache=cache if isinstance(cache, ResponseCache) else None)
+        self._owns_client = client is None
+        self.client = client
         self.logger = logger
+        if calendar is True:
+            calendar = PackageCalendar()
+        elif isinstance(calendar, str):
+            calendar = PackageCalendar(path=calendar)
+        self.calendar = calendar if isinstance(calendar, PackageCalendar) else None
+        self._owns_manifest = isinstance(resume, str)
+        if isinstance(resume, str):
+            resume = Manifest(path=resume)
+        self.manifest = resume if isinstance(resume, Manifest) else None
 
         self.incomplete_days : Set[str] = set()
         self.incomplete_granules : Set[str] = set()
 
-        self._loop_handler = AsyncLoopHandler()
-        self._loop_handler.start()
+        self._loop_handler = loop_handler
+        self._owns_loop_handler = loop_handler is None
+
+    @property
+    def loop_handler(self) -> AsyncLoopHandler:
+        """
+        The thread that runs the event loop used by the synchronous methods of this
+        class. Started the first time it is used, so that the asynchronous methods,
+        which run on the caller's event loop, never start a thread.
+        """
+        if self._loop_handler is None:
+            self._loop_handler = AsyncLoopHandler()
+            self._loop_handler.start()
+        return self._loop_handler
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+        Runs a coroutine on the event loop of ``self.loop_handler`` and blocks until
+        it has finished. Should only be called internally.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop_handler.loop).result()
+
+    @contextlib.asynccontextmanager
+    async def open_client(self) -> AsyncIterator[GovInfoClient]:
+        """
+        An asynchronous context manager that yields ``self.client``. If the client
+        was created by this downloader and is not open yet, it is opened and then
+        closed on exit. A client that was provided by the caller, or that is already
+        open, is left open. Should only be called internally.
+        """
+        if not self._owns_client or self.client._state == ClientState.OPENED:
+            yield self.client
+        else:
+            async with self.client as client:
+                yield client
 
     async def get_granules_in_batch(self, granules: List[Granule], client: GovInfoClient) -> List[Granule]:
         """
@@ -131,21 +311,139 @@ class Downloader:
 
         self.incomplete_granules = set([g.attributes['granuleId'] for g in granules])
 
+        started = time.monotonic()
         batches = [granules[i:i + self.batch_size] for i in range(0, len(granules), self.batch_size)]
         for i, batch in enumerate(batches):
             self.logger.log(message=f'getting granules individually in batch {i + 1} of {len(batches)}')
             tasks = []
             for g in batch:
-                tasks.append(self._loop_handler.loop.create_task(g.async_get(client=client, parse=self.parse, write=self.write)))
+                tasks.append(asyncio.ensure_future(self.get_granule(granule=g, client=client)))
             
             await asyncio.gather(*tasks)
 
             if type(self.batch_wait) == int:
                 await asyncio.sleep(self.batch_wait)
         
+        await self.retry_deferred_granules(granules=granules, client=client, deferred_at=started)
+        return self.summarize_granules(granules=granules)
+
+    async def get_granules_in_window(self, granules: List[Granule], client: GovInfoClient) -> List[Granule]:
+        """
+        Takes as an input a list of :class:`.Granule` objects and a 
+        :class:`GovInfoClient`. Keeps ``self.batch_size`` granules in flight at all
+        times; as soon as one granule finishes, the next one is started, so a single
+        slow or retrying granule never holds up the others. Should only be called
+        internally.
+        """
+        self.incomplete_granules = set([g.attributes['granuleId'] for g in granules])
+
+        self.logger.log(message=f'getting {len(granules)} granules individually with {self.batch_size} requests in flight')
+        started = time.monotonic()
+        await self.run_in_window(coroutines=(self.get_granule(granule=g, client=client) for g in granules), total=len(granules), description='granules')
+        await self.retry_deferred_granules(granules=granules, client=client, deferred_at=started)
+
+        return self.summarize_granules(granules=granules)
+
+    async def get_granule(self, granule: Granule, client: GovInfoClient) -> Granule:
+        """
+        Takes as an input a :class:`.Granule` object and a :class:`GovInfoClient`,
+        gets the granule's data, and potentially parses and writes it (depending on
+        ``self.parse`` and ``self.write``). Returns the granule. Should only be called
+        internally.
+        """
+        await granule.async_get(client=client, parse=self.parse, write=self.write, fail_fast=self.fail_fast, executor=self.executor, granule_filter=self.granule_filter, defer=self.defer_wait is not False, parse_budget=self.parse_budget)
+        return granule
+
+    async def retry_deferred(self, keys: List[Hashable], get: Callable[[Hashable], Coroutine], is_deferred: Callable[[Any], bool], deferred_at: float, description: str) -> Dict[Hashable, Any]:
+        """
+        Takes as an input a list of keys (granules or dates) that were set aside
+        because GovInfo was still generating them, a function that returns a
+        coroutine requesting a key, a function that tells from the result of that
+        coroutine whether the key was set aside again, and the time (from
+        :func:`time.monotonic`) at which the keys were set aside. Waits until
+        ``self.defer_wait`` seconds have passed since then and requests the keys
+        again, keeping ``self.batch_size`` requests in flight; keys that are set aside
+        again are retried the same way, up to the client's ``retry_limit`` times.
+        Returns a mapping from each key that was requested again to its last result.
+        Should only be called internally.
+        """
+        results = {}
+        if self.defer_wait is False:
+            return results
+
+        attempts = 0
+        while keys and (self.client.retry_limit is False or attempts < self.client.retry_limit):
+            attempts += 1
+            wait = max(deferred_at + self.defer_wait - time.monotonic(), 0)
+            self.logger.log(f'{len(keys)} {description} are still being generated by GovInfo; requesting them again in {wait:.0f} seconds')
+            await asyncio.sleep(wait)
+
+            attempt_results = await self.run_in_window(coroutines=(get(k) for k in keys), total=len(keys), description=f'set aside {description}')
+            deferred_at = time.monotonic()
+            results.update(zip(keys, attempt_results))
+            keys = [k for k, r in zip(keys, attempt_results) if is_deferred(r)]
+
+        if keys:
+            self.logger.log(f'{len(keys)} {description} were still being generated by GovInfo after {attempts} more attempts', level='warning')
+        return results
+
+    async def retry_deferred_granules(self, granules: List[Granule], client: GovInfoClient, deferred_at: float) -> None:
+        """
+        Takes as an input a list of :class:`.Granule` objects that have been
+        requested, a :class:`GovInfoClient`, and the time at which they were
+        requested, and requests the ones that were set aside again (see
+        :meth:`.Downloader.retry_deferred()`). Should only be called internally.
+        """
+        deferred = [g for g in granules if g.deferred]
+        if deferred:
+            await self.retry_deferred(keys=deferred, get=lambda g : self.get_granule(granule=g, client=client), is_deferred=lambda g : g.deferred, deferred_at=deferred_at, description='granules')
+
+    async def run_in_window(self, coroutines: Iterable[Coroutine], total: int, description: str) -> List[Any]:
+        """
+        Takes as an input an iterable of coroutines, and runs them such that at most
+        ``self.batch_size`` of them are running at the same time. A new coroutine is
+        started as soon as any running one finishes. Returns the results of the
+        coroutines in the order they were provided. Should only be called internally.
+        """
+        results = [None] * total
+        in_flight = {}
+        finished = 0
+        log_every = max(self.batch_size, total // 20, 1)
+
+        coroutines = iter(enumerate(coroutines))
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < self.batch_size:
+                try:
+                    i, coroutine = next(coroutines)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[asyncio.ensure_future(coroutine)] = i
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[in_flight.pop(task)] = task.result()
+                finished += 1
+                if finished % log_every == 0 or finished == total:
+                    self.logger.log(message=f'finished {finished} of {total} {description}')
+
+        return results
+
+    def summarize_granules(self, granules: List[Granule]) -> List[Granule]:
+        """
+        Takes as an input a list of :class:`.Granule` objects that have been
+        requested. Removes the complete granules from ``self.incomplete_granules``
+        and logs a summary. Should only be called internally.
+        """
         for g in granules:
             if g.complete:
-                self.incomplete_granules.remove(g.attributes['granuleId'])
+                self.incomplete_granules.discard(g.attributes['granuleId'])
+        self.record_progress(granules=granules)
+        granules = self.without_skipped(granules=granules)
 
         if self.parse is True and isinstance(self.write, str):
             action_string = 'got, parsed, and wrote'
@@ -168,24 +466,57 @@ class Downloader:
         """
         granules = [Granule(granule_id=g_id) for g_id in granule_ids]
 
-        if client._state == ClientState.OPENED:
-            granules = await self.get_granules_in_batch(granules=granules, client=client)
+        if self.scheduler == 'window':
+            get_granules = self.get_granules_in_window
         else:
-            async with client as client:
-                granules = await self.get_granules_in_batch(granules=granules, client=client)
+            get_granules = self.get_granules_in_batch
 
-        return granules
+        if client is self.client:
+            async with self.open_client() as client:
+                return await get_granules(granules=granules, client=client)
+        return await get_granules(granules=granules, client=client)
+
+    async def async_get_from_ids(self, granule_ids: List[str] = []) -> List[Granule]:
+        """
+        Takes as an input a list of granule identifiers and awaits the
+        :meth:`.Downloader.get_granules_from_ids()` coroutine on the running event
+        loop. If there is a ``self.manifest``, granules finished by an earlier run are
+        read from disk instead (see :meth:`.Downloader.resume_granules()`).
+        """
+        if self.valid_classes != GRANULE_CLASSES or self.granule_filter is not None:
+            self.logger.log("Since you've passed in your own granule ids, granule class filters and granule filters are being ignored", level='warning')
+            self.granule_filter = None
+        if self.manifest is None:
+            granules = await self.get_granules_from_ids(granule_ids=granule_ids, client=self.client)
+            self.log_client_report()
+            return granules
+
+        resumed, remaining_ids = await asyncio.get_running_loop().run_in_executor(None, self.resume_granules, granule_ids)
+        granules = await self.get_granules_from_ids(granule_ids=remaining_ids, client=self.client) if remaining_ids else []
+        self.logger.log(f'manifest: {self.manifest.report()}')
+        self.log_client_report()
+        return self.in_order(granules=resumed + granules, granule_ids=granule_ids)
 
     def get_from_ids(self, granule_ids: List[str] = []) -> List[Granule]:
         """
-        Takes as an input a list of granule identifiers and executes the 
-        :meth:`.Downloader.get_granules_from_ids()` coroutine.
+        Takes as an input a list of granule identifiers and runs
+        :meth:`.Downloader.async_get_from_ids()` on the event loop of
+        ``self.loop_handler``.
         """
-        if self.valid_classes != GRANULE_CLASSES:
-            self.logger.log("Since you've passed in your own granule ids, granule class filters are being ignored", level='warning')
-        future = asyncio.run_coroutine_threadsafe(self.get_granules_from_ids(granule_ids=granule_ids, client=self.client), self._loop_handler.loop)
-        granules = future.result()
-        return granules
+        return self.run(self.async_get_from_ids(granule_ids=granule_ids))
+
+    def log_client_report(self) -> None:
+        """
+        Logs a summary of the client's rate limiter (or, if it has several API keys,
+        of each key's usage) and, if there is one, its cache.
+        """
+        if len(self.client.key_pool.keys) > 1:
+            for key_report in self.client.key_pool.report():
+                self.logger.log(f'api key {key_report}')
+        else:
+            self.logger.log(f'rate limiter: {self.client.rate_limiter.report()}')
+        if self.client.cache is not None:
+            self.logger.log(f'cache: {self.client.cache.report()}')
 
     def get_from_directory(self, directory: str) -> List[Granule]:
         """
@@ -204,25 +535,21 @@ class Downloader:
                 granule_id = f[:-4]
                 granule_file_map[granule_id]['htm'] = directory + '/' + f
 
-        for granule_id, files in granule_file_map.items():
-            granule = Granule(granule_id=granule_id)
-            with open(files['mods']) as mods_file:
-                mods = et.fromstring(mods_file.read())
-            with open(files['htm']) as htm_file:
-                htm = htm_file.read()
-
-            if self.parse:
-                granule.parse_responses(xml_response=mods, htm_response=htm)
-            if self.write:
-                granule.write_responses(write=self.write, xml_response=mods, htm_response=htm)
-            if (granule.parsed or not self.parse) and (granule.written or not self.write):
-                granule.complete = True
+        def read_granules() -> Iterator[Tuple[Granule, Element, str]]:
+            for granule_id, files in granule_file_map.items():
+                granule = Granule(granule_id=granule_id)
+                with open(files['mods']) as mods_file:
+                    mods = et.fromstring(mods_file.read())
+                if not self.is_wanted(mods=mods):
+                    continue
+                with open(files['htm']) as htm_file:
+                    htm = htm_file.read()
+                yield granule, mods, htm
 
-            granule_class = granule.attributes.get('granuleClass', None)
-            if granule_class is not None and granule_class in self.valid_classes:
-                granules.append(granule)
-                if granule.complete is False:
-                    self.incomplete_granules.add(granule.id)
+        for granule in self.process_granules(jobs=read_granules()):
+            granules.append(granule)
+            if granule.complete is False:
+                self.incomplete_granules.add(granule.id)
 
         if self.parse is True and isinstance(self.write, str):
             action_string = 'got, parsed, and wrote'
@@ -237,21 +564,79 @@ class Downloader:
                 
         return granules
 
+    def is_wanted(self, mods: Element) -> bool:
+        """
+        Takes as an input the metadata of a granule: either its own MODS document, or
+        the ``relatedItem`` element that describes it in the MODS document of its
+        package. Returns whether the granule has one of ``self.valid_classes`` and
+        passes ``self.granule_filter``, if there is one, so that granules that are
+        not wanted can be left out before their text is read. Should only be called
+        internally.
+        """
+        granule_class = mods.find(f'.//{MODS_NAMESPACE}granuleClass')
+        if granule_class is None or granule_class.text not in self.valid_classes:
+            return False
+        return self.granule_filter is None or self.granule_filter.matches_mods(mods)
+
+    @staticmethod
+    def without_skipped(granules: List[Granule]) -> List[Granule]:
+        """
+        Returns a list of :class:`.Granule` objects without the granules that were
+        ruled out by a :class:`.GranuleFilter` once their metadata was retrieved.
+        Should only be called internally.
+        """
+        return [g for g in granules if not g.skipped]
+
+    @property
+    def progress_key(self) -> List[str]:
+        """
+        The granule classes, and the description of ``self.granule_filter`` if there
+        is one, that progress is recorded under in ``self.manifest``, so that a date
+        finished with some filters is not mistaken for finished with others.
+        """
+        if self.granule_filter is None:
+            return self.valid_classes
+        return self.valid_classes + [self.granule_filter.key()]
+
+    async def session_dates(self, dates: List[str]) -> List[str]:
+        """
+        Takes as an input a list of date strings. Leaves out the dates that
+        ``self.granule_filter`` rules out, if there is one. Then, if there is a
+        ``self.calendar``, returns the dates on which a CREC package was issued (see
+        :meth:`.PackageCalendar.session_dates()`), keeping any date in a month that
+        the calendar could not be completed for. Otherwise, returns the dates as they
+        are. Should only be called internally.
+        """
+        if self.granule_filter is not None:
+            dates = [d for d in dates if self.granule_filter.matches_date(d)]
+        if self.calendar is None or not dates:
+            return dates
+
+        async with self.open_client() as client:
+            _, calendar_dates = await self.calendar.session_dates(start_date=min(dates), end_date=max(dates), client=client, logger=self.logger)
+        calendar_dates = set(calendar_dates)
+        session_dates = [d for d in dates if d in calendar_dates or d[:7] not in self.calendar.months]
+        self.logger.log(f'skipping {len(dates) - len(session_dates)} of {len(dates)} dates on which no CREC package was issued')
+        return session_dates
+
     async def get_granule_ids_from_dates(self, dates: List[str], client: GovInfoClient) -> List[str]:
         """
         Takes as an input a list of date strings and a :class:`GovInfoClient`. 
         Then, for each date, calls the :meth:`.get_granule_ids` function to get the 
-        granule identifiers associated with that given day. Also keeps track of whether 
-        all granule identifiers from a particular day were retrieved; if not, that day 
-        will be added to ``self.incomplete_days``.
+        granule identifiers associated with that given day. Dates are requested
+        concurrently, limited by the client's :class:`.RateLimiter`. Also keeps track
+        of whether all granule identifiers from a particular day were retrieved; if
+        not, that day will be added to ``self.incomplete_days``.
         """
         self.incomplete_days = set(dates)
         granule_ids = []
-        for d in dates:
-            got_all_ids, date_granule_ids = await get_granule_ids(date=d, client=client, granule_class_filters=self.valid_classes, logger=self.logger)
+        date_granule_ids = await asyncio.gather(*[get_granule_ids(date=d, client=client, granule_class_filters=self.valid_classes, logger=self.logger, granule_filter=self.granule_filter) for d in dates])
+        for d, (got_all_ids, ids) in zip(dates, date_granule_ids):
             if got_all_ids:
-                granule_ids += date_granule_ids
+                granule_ids += ids
                 self.incomplete_days.remove(d)
+                if self.manifest is not None:
+                    self.manifest.discovered(date=d, granule_ids=ids, classes=self.progress_key)
 
         return granule_ids
 
@@ -260,49 +645,247 @@ class Downloader:
         Takes as an input a list of date strings. Gets the granule identifiers
         associated with those dates using 
         :meth:`.Downloader.get_granule_ids_from_dates`, and passes those along to
-        :meth:`.Downloader.get_granules_from_ids`.
+        :meth:`.Downloader.get_granules_from_ids`. If there is a ``self.manifest``,
+        granules finished by an earlier run are read from disk instead (see
+        :meth:`.Downloader.resume_granules()`).
         """
-        async with self.client as client:
+        async with self.open_client() as client:
             granule_ids = await self.get_granule_ids_from_dates(dates=dates, client=client)
+            listed_ids = granule_ids
+            resumed = []
+            if self.manifest is not None:
+                resumed, granule_ids = await asyncio.get_running_loop().run_in_executor(None, self.resume_granules, granule_ids)
             granules = await self.get_granules_from_ids(granule_ids=granule_ids, client=client)
 
-        return granules
+        return self.in_order(granules=resumed + granules, granule_ids=listed_ids)
+
+    async def plan_dates(self, dates: List[str], client: GovInfoClient) -> Tuple[List[str], List[str]]:
+        """
+        Takes as an input a list of date strings and a :class:`GovInfoClient`. Lists
+        the granules of each date (see :func:`.get_granule_summaries`), and has
+        ``self.planner`` choose whether to request them in a zipped file or one at a
+        time (see :meth:`.Planner.plan_date()`); dates that could not be listed are
+        requested in zipped files. Logs the plan, and returns a tuple consisting of
+        the dates to request in zipped files, and the identifiers of the granules to
+        request one at a time. Should only be called internally.
+        """
+        date_summaries = await asyncio.gather(*[get_granule_summaries(date=d, client=client, logger=self.logger) for d in dates])
+        plans : List[DatePlan] = []
+        for date, (got_all_summaries, summaries) in zip(dates, date_summaries):
+            if not got_all_summaries:
+                plans.append(DatePlan(date=date, zipped=True, ranges=self.ranges, granule_ids=[], requests=1, estimated_bytes=0))
+                continue
+            granule_ids = wanted_granule_ids(summaries=summaries, granule_class_filters=self.valid_classes, granule_filter=self.granule_filter)
+            zip_on_disk = self.zip_directory is not None and zipfile.is_zipfile(os.path.join(self.zip_directory, f'CREC-{date}.zip'))
+            plans.append(self.planner.plan_date(date=date, summaries=summaries, granule_ids=granule_ids, zip_on_disk=zip_on_disk))
+
+        self.logger.log(f'plan: {Planner.report(plans=plans)}')
+        granule_ids = []
+        for plan in plans:
+            if not plan.zipped:
+                granule_ids += plan.granule_ids
+                if self.manifest is not None:
+                    self.manifest.discovered(date=plan.date, granule_ids=plan.granule_ids, classes=self.progress_key)
+        return [p.date for p in plans if p.zipped], granule_ids
+
+    async def get_granules_planned(self, dates: List[str]) -> List[Granule]:
+        """
+        Takes as an input a list of date strings. Plans how to request each date
+        (see :meth:`.Downloader.plan_dates()`), and requests the granules of each
+        date in a zipped file or one at a time accordingly. If there is a
+        ``self.manifest``, granules finished by an earlier run are read from disk
+        instead of being requested one at a time (see
+        :meth:`.Downloader.resume_granules()`).
+        """
+        self.incomplete_days = set()
+        async with self.open_client() as client:
+            zip_dates, granule_ids = await self.plan_dates(dates=dates, client=client)
+            granules = await self.get_granules_from_zips(dates=zip_dates) if zip_dates else []
+            if self.manifest is not None:
+                resumed, granule_ids = await asyncio.get_running_loop().run_in_executor(None, self.resume_granules, granule_ids)
+                granules += resumed
+            if granule_ids:
+                incomplete_granules = self.incomplete_granules
+                granules += await self.get_granules_from_ids(granule_ids=granule_ids, client=client)
+                self.incomplete_granules |= incomplete_granules
+        return sorted(granules, key=lambda g : g.id[5:15])
+
+    async def get_granules_by_date(self, dates: List[str]) -> List[Granule]:
+        """
+        Takes as an input a list of date strings, and gets their granules with
+        :meth:`.Downloader.get_granules_planned()`,
+        :meth:`.Downloader.get_granules_from_zips()`, or
+        :meth:`.Downloader.get_granules_from_dates()`, depending on
+        ``self.zipped``. Should only be called internally.
+        """
+        if self.zipped == 'auto':
+            return await self.get_granules_planned(dates=dates)
+        if self.zipped:
+            return await self.get_granules_from_zips(dates=dates)
+        return await self.get_granules_from_dates(dates=dates)
+
+    async def get_zip(self, date: str, client: GovInfoClient) -> Tuple[bool, Union[Response, None], Union[BinaryIO, None]]:
+        """
+        Takes as an input a date string and a :class:`GovInfoClient`. Gets the zipped
+        file associated with that date: from ``self.zip_directory`` if it was saved
+        there by a previous run, with :meth:`.Downloader.get_zip_members()` if
+        ``self.ranges`` is ``True``, or with :meth:`.Downloader.download_zip()`
+        otherwise (or if reading parts of the zipped file failed, because a part was
+        corrupt or its metadata could not be read). Returns a tuple
+        consisting of a boolean indicating whether or not the request was successful,
+        the response, and the file holding the zipped file (``None`` if the request
+        was unsuccessful). Should only be called internally.
+        """
+        if self.zip_directory is not None:
+            zip_path = os.path.join(self.zip_directory, f'CREC-{date}.zip')
+            if zipfile.is_zipfile(zip_path):
+                return True, None, open(zip_path, 'rb')
+
+        if self.ranges:
+            try:
+                return await self.get_zip_members(date=date, client=client)
+            except (zipfile.BadZipFile, NotImplementedError, ValueError, et.ParseError) as e:
+                self.logger.log(f'could not read parts of the zipped file for {date} ({e!r}); requesting the whole zipped file instead', level='warning')
+
+        return await self.download_zip(date=date, client=client)
+
+    async def download_zip(self, date: str, client: GovInfoClient) -> Tuple[bool, Union[Response, None], Union[BinaryIO, None]]:
+        """
+        Takes as an input a date string and a :class:`GovInfoClient`. Streams the
+        zipped file associated with that date to disk: into ``self.zip_directory`` if
+        it is provided, or into a spooled temporary file otherwise. Returns a tuple
+        like :meth:`.Downloader.get_zip()`. Should only be called internally.
+        """
+        if self.zip_directory is not None:
+            zip_path = os.path.join(self.zip_directory, f'CREC-{date}.zip')
+            zip_file = open(zip_path + '.part', 'w+b')
+        else:
+            zip_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+
+        response_validity, response = await client.get(url=f'content/pkg/CREC-{date}.zip', use_api=False, file=zip_file, defer=self.defer_wait is not False)
+        if response_validity is not True:
+            zip_file.close()
+            if self.zip_directory is not None:
+                os.remove(zip_path + '.part')
+            return response_validity, response, None
+
+        if self.zip_directory is not None:
+            zip_file.close()
+            os.replace(zip_path + '.part', zip_path)
+            zip_file = open(zip_path, 'rb')
+
+        return response_validity, response, zip_file
+
+    async def get_zip_members(self, date: str, client: GovInfoClient) -> Tuple[bool, Union[Response, None], Union[BinaryIO, None]]:
+        """
+        Takes as an input a date string and a :class:`GovInfoClient`. Reads the
+        zipped file associated with that date with HTTP range requests (see
+        :class:`.RemoteZip`): first its metadata, and then the text of the granules
+        that the metadata says are wanted (see :meth:`.Downloader.is_wanted()`).
+        Those files are put in a new zipped file in a spooled temporary file, which
+        can be processed like the whole zipped file. If the server ignores range
+        requests, the whole zipped file is streamed there instead. Returns a tuple
+        like :meth:`.Downloader.get_zip()`. Should only be called internally.
+        """
+        url = f'content/pkg/CREC-{date}.zip'
+        zip_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            response_validity, response, remote_zip = await RemoteZip.open(url=url, client=client, file=zip_file, defer=self.defer_wait is not False)
+            if response_validity is True and remote_zip is None:
+                self.logger.log(f'the server does not support range requests for {url}; got the whole zipped file instead')
+                return response_validity, response, zip_file
+            if response_validity is not True:
+                zip_file.close()
+                return response_validity, response, None
+
+            mods_file_name, htm_file_names = self.index_members(file_names=remote_zip.namelist())
+            response_validity, response, mods_contents = await remote_zip.read_members(names=[mods_file_name])
+            if response_validity is not True:
+                zip_file.close()
+                return response_validity, response, None
+
+            wanted_file_names = await asyncio.get_running_loop().run_in_executor(None, self.wanted_members, mods_contents[mods_file_name], htm_file_names)
+            response_validity, response, htm_contents = await remote_zip.read_members(names=wanted_file_names)
+            if response_validity is not True:
+                zip_file.close()
+                return response_validity, response, None
+        except BaseException:
+            zip_file.close()
+            raise
+
+        with zipfile.ZipFile(zip_file, 'w') as partial_zip:
+            partial_zip.writestr(mods_file_name, mods_contents[mods_file_name])
+            for file_name, content in htm_contents.items():
+                partial_zip.writestr(file_name, content)
+        zip_file.seek(0)
+
+        self.logger.log(f'got {len(htm_contents)} of {len(htm_file_names)} granules from the zipped file for {date} with {remote_zip.requests} range requests ({remote_zip.downloaded_bytes} of {remote_zip.size} bytes)')
+        return True, response, zip_file
+
+    def wanted_members(self, mods_content: bytes, htm_file_names: Dict[str, str]) -> List[str]:
+        """
+        Takes as an input the content of a zipped file's metadata (mods) member, and
+        the mapping from granule identifiers to text (htm) members returned by
+        :meth:`.Downloader.index_members()`. Returns the names of the text members
+        of the granules that are wanted (see :meth:`.Downloader.is_wanted()`).
+        Should only be called internally.
+        """
+        mods_xml = et.fromstring(mods_content)
+        return [htm_file_names[granule_id] for granule_id, related_item in self.constituents(mods_xml=mods_xml) if granule_id in htm_file_names and self.is_wanted(mods=related_item)]
 
     async def get_zips_from_dates_in_batch(self, dates: List[str], client: GovInfoClient) -> List[zipfile.ZipFile]:
         """
         Takes as an input a list of date strings. Returns the zipped files associated
-        with those dates.
+        with those dates. The zipped files are streamed to disk (see
+        :meth:`.Downloader.get_zip()`), so they are never held in memory as a whole.
         """
-        responses : List[Tuple[bool, Response]] = []
+        responses : List[Tuple[bool, Response, BinaryIO]] = []
         zips = []
 
-        batches = [dates[i:i + self.batch_size] for i in range(0, len(dates), self.batch_size)]
-        for i, batch in enumerate(batches):
-            self.logger.log(message=f'getting granules in zipped files in batch {i + 1} of {len(batches)}')
-            tasks = []
-            for date in batch:
-                tasks.append(self._loop_handler.loop.create_task(client.get(url=f'content/pkg/CREC-{date}.zip', use_api=False)))
+        started = time.monotonic()
+        if self.scheduler == 'window':
+            self.logger.log(message=f'getting granules in zipped files for {len(dates)} dates with {self.batch_size} requests in flight')
+            responses = await self.run_in_window(coroutines=(self.get_zip(date=date, client=client) for date in dates), total=len(dates), description='zipped files')
+        else:
+            batches = [dates[i:i + self.batch_size] for i in range(0, len(dates), self.batch_size)]
+            for i, batch in enumerate(batches):
+                self.logger.log(message=f'getting granules in zipped files in batch {i + 1} of {len(batches)}')
+                tasks = []
+                for date in batch:
+                    tasks.append(asyncio.ensure_future(self.get_zip(date=date, client=client)))
 
-            batch_responses = await asyncio.gather(*tasks)
-            responses.extend(batch_responses)
+                batch_responses = await asyncio.gather(*tasks)
+                responses.extend(batch_responses)
 
-            if type(self.batch_wait) == int and i != len(batches) - 1:
-                await asyncio.sleep(self.batch_wait)
+                if type(self.batch_wait) == int and i != len(batches) - 1:
+                    await asyncio.sleep(self.batch_wait)
+
+        date_responses = dict(zip(dates, responses))
+        await self.retry_deferred_zips(date_responses=date_responses, client=client, deferred_at=started)
 
-        for response_validity, response in responses:
+        for date, (response_validity, response, zip_file) in date_responses.items():
             if response_validity is True:
-                zip_bytes = BytesIO(response.read())
-                date_zip = zipfile.ZipFile(zip_bytes)
+                date_zip = zipfile.ZipFile(zip_file)
                 zips.append(date_zip)
             elif response is not None:
-                date = re.search(pattern='\d{4}-\d{2}-\d{2}', string=str(response.url))
-                if date:
-                    self.incomplete_days.add(str(response.url)[date.start():date.end()])
+                self.incomplete_days.add(date)
 
         self.logger.log(f'successfully got zipped files for {len(zips)} of {len(zips) + len(self.incomplete_days)} valid dates; there were {len(self.incomplete_days)} failures')
 
         return zips
 
+    async def retry_deferred_zips(self, date_responses: Dict[str, Tuple[bool, Union[Response, None], Union[BinaryIO, None]]], client: GovInfoClient, deferred_at: float) -> None:
+        """
+        Takes as an input a mapping from date strings to the results of
+        :meth:`.Downloader.get_zip()`, a :class:`GovInfoClient`, and the time at which
+        the zipped files were requested. Requests the zipped files that were set aside
+        again (see :meth:`.Downloader.retry_deferred()`), and updates the mapping with
+        the new results. Should only be called internally.
+        """
+        deferred = [date for date, (response_validity, response, _) in date_responses.items() if client.is_deferred(response_validity, response)]
+        if deferred:
+            date_responses.update(await self.retry_deferred(keys=deferred, get=lambda date : self.get_zip(date=date, client=client), is_deferred=lambda result : client.is_deferred(result[0], result[1]), deferred_at=deferred_at, description='zipped files'))
+
     def granules_from_zips(self, zips: List[zipfile.ZipFile]) -> List[Granule]:
         """
         Takes as an input a set of zipped files. For each zipped file, generates a set
@@ -310,36 +893,7 @@ class Downloader:
         """
         granules = []
         for date_zip in zips:
-            file_names = date_zip.namelist()
-            mods_file_name = list(filter(lambda f : re.match(pattern='CREC-\d+-\d+-\d+\/mods\.xml', string=f), file_names))[0]
-            mods_file = date_zip.read(mods_file_name)
-            mods_xml = et.fromstring(mods_file)
-            
-            for related_item in mods_xml.iter('{http://www.loc.gov/mods/v3}relatedItem'):
-                if related_item.attrib.get('type', None) == 'constituent':
-                    granule_id = related_item.get('ID', None)
-                    if granule_id is None:
-                        continue
-                    if granule_id[:3] == 'id-':
-                        granule_id = granule_id[3:]
-
-                    htm_file_name = list(filter(lambda f : re.search(pattern=f'{granule_id}.htm', string=f), file_names))[0]
-                    htm_file = date_zip.read(htm_file_name)
-                    htm_content = htm_file.decode()
-                    
-                    granule = Granule(granule_id=granule_id)
-                    if self.parse:
-                        granule.parse_responses(xml_response=related_item, htm_response=htm_content)
-                    if self.write:
-                        granule.write_responses(write=self.write, xml_response=related_item, htm_response=htm_content)
-                    if (granule.parsed or not self.parse) and (granule.written or not self.write):
-                        granule.complete = True
-
-                    granule_class = granule.attributes.get('granuleClass', None)
-                    if granule_class is not None and granule_class in self.valid_classes:
-                        granules.append(granule)
-                        if granule.complete is False:
-                            self.incomplete_granules.add(granule.id)
+            granules += self.granules_from_zip(date_zip=date_zip)
 
         if self.parse is True and isinstance(self.write, str):
             action_string = 'got, parsed, and wrote'
@@ -354,30 +908,603 @@ class Downloader:
 
         return granules
 
+    def granules_from_zip(self, date_zip: zipfile.ZipFile) -> List[Granule]:
+        """
+        Takes as an input a single zipped file. Generates a set of :class:`.Granule`
+        objects corresponding to the files within that zip, and parses and writes
+        them (depending on ``self.parse`` and ``self.write``). Granules are checked
+        against their description in the zip's metadata (see
+        :meth:`.Downloader.is_wanted()`) first, so that the text of unwanted granules
+        is never read. Each granule's text is looked up in an index of the zip's
+        members (see :meth:`.Downloader.index_zip()`) and read from the zip only
+        when the granule is processed.
+        """
+        granules = []
+        mods_file_name, htm_file_names = self.index_zip(date_zip=date_zip)
+        mods_file = date_zip.read(mods_file_name)
+        mods_xml = et.fromstring(mods_file)
+
+        def read_granules() -> Iterator[Tuple[Granule, Element, str]]:
+            for granule_id, related_item in self.constituents(mods_xml=mods_xml):
+                if not self.is_wanted(mods=related_item):
+                    continue
+
+                htm_file_name = htm_file_names.get(granule_id, None)
+                if htm_file_name is None:
+                    self.logger.log(f'there is no text for {granule_id} in its zipped file', level='warning')
+                    self.incomplete_granules.add(granule_id)
+                    continue
+                htm_file = date_zip.read(htm_file_name)
+                htm_content = htm_file.decode()
+
+                yield Granule(granule_id=granule_id), related_item, htm_content
+
+        for granule in self.process_granules(jobs=read_granules()):
+            granules.append(granule)
+            if granule.complete is False:
+                self.incomplete_granules.add(granule.id)
+
+        if self.manifest is not None and granules:
+            self.manifest.discovered(date=granules[0].id[5:15], granule_ids=[g.id for g in granules], classes=self.progress_key)
+            self.record_progress(granules=granules)
+
+        return granules
+
+    @staticmethod
+    def constituents(mods_xml: Element) -> Iterator[Tuple[str, Element]]:
+        """
+        Takes as an input the metadata (mods) of a zipped file, and yields the
+        identifier and ``relatedItem`` element of each granule it describes. Should
+        only be called internally.
+        """
+        for related_item in mods_xml.iter(f'{MODS_NAMESPACE}relatedItem'):
+            if related_item.attrib.get('type', None) == 'constituent':
+                granule_id = related_item.get('ID', None)
+                if granule_id is None:
+                    continue
+                if granule_id[:3] == 'id-':
+                    granule_id = granule_id[3:]
+                yield granule_id, related_item
+
+    @staticmethod
+    def index_zip(date_zip: zipfile.ZipFile) -> Tuple[str, Dict[str, str]]:
+        """
+        Takes as an input a single zipped file, and returns a tuple consisting of the
+        name of its metadata (mods) member, and a mapping from granule identifiers to
+        the names of their text (htm) members (see
+        :meth:`.Downloader.index_members()`). Should only be called internally.
+        """
+        return Downloader.index_members(file_names=date_zip.namelist())
+
+    @staticmethod
+    def index_members(file_names: List[str]) -> Tuple[str, Dict[str, str]]:
+        """
+        Takes as an input the names of the members of a zipped file, and returns a
+        tuple consisting of the name of its metadata (mods) member, and a mapping from
+        granule identifiers to the names of their text (htm) members. Built in a
+        single pass over the names, so that each granule's text is found without
+        searching them again. Should only be called internally.
+        """
+        mods_file_name = None
+        htm_file_names = {}
+        for file_name in file_names:
+            if file_name.endswith('.htm'):
+                htm_file_names[file_name.rsplit('/', 1)[-1][:-4]] = file_name
+            elif mods_file_name is None and MODS_MEMBER_PATTERN.match(file_name):
+                mods_file_name = file_name
+        if mods_file_name is None:
+            raise ValueError('there is no mods.xml file in the zipped file')
+        return mods_file_name, htm_file_names
+
+    def process_granules(self, jobs: Iterable[Tuple[Granule, Element, str]]) -> List[Granule]:
+        """
+        Takes as an input an iterable of tuples, each consisting of a
+        :class:`.Granule` object, its metadata (xml), and its text (htm). Parses and
+        writes each granule (depending on ``self.parse`` and ``self.write``), and marks
+        it as complete if that succeeded. If ``self.workers`` is an ``int``, granules
+        are parsed in a pool of worker processes (see :func:`.parse_granule`), with a
+        bounded number of granules waiting to be parsed at a time. Should only be
+        called internally.
+        """
+        granules = []
+        pending = {}
+
+        def collect(return_when: str) -> None:
+            done, _ = concurrent.futures.wait(pending, return_when=return_when)
+            for future in done:
+                granule = pending.pop(future)
+                try:
+                    granule.load_parse_result(future.result())
+                except Exception as e:
+                    granule.parse_exception = e
+
+        for granule, xml_response, htm_response in jobs:
+            granule.valid_responses = True
+            if self.parse and self.workers is not False:
+                pending[self.executor.submit(parse_granule, granule.id, et.tostring(xml_response), htm_response, self.parse_budget)] = granule
+                if len(pending) >= 4*self.workers:
+                    collect(return_when=concurrent.futures.FIRST_COMPLETED)
+            elif self.parse:
+                granule.parse_responses(xml_response=xml_response, htm_response=htm_response, parse_budget=self.parse_budget)
+            if self.write and not granule.written:
+                granule.write_responses(write=self.write, xml_response=xml_response, htm_response=htm_response)
+            granules.append(granule)
+
+        if pending:
+            collect(return_when=concurrent.futures.ALL_COMPLETED)
+
+        for granule in granules:
+            if (granule.parsed or not self.parse) and (granule.written or not self.write):
+                granule.complete = True
+
+        return granules
+
+    @staticmethod
+    def in_order(granules: List[Granule], granule_ids: List[str]) -> List[Granule]:
+        """
+        Returns a list of :class:`.Granule` objects sorted in the order of
+        ``granule_ids``. Should only be called internally.
+        """
+        order = {g_id: i for i, g_id in enumerate(granule_ids)}
+        return sorted(granules, key=lambda g : order.get(g.id, len(order)))
+
+    def in_discovery_order(self, granules: List[Granule]) -> List[Granule]:
+        """
+        Returns a list of :class:`.Granule` objects sorted by date, and then in the
+        order in which ``self.manifest`` says they were discovered, so that granules
+        read from disk and granules that were requested are in the same order as
+        they would be if everything had been requested. Should only be called
+        internally.
+        """
+        order = self.manifest.discovery_order(granule_ids=[g.id for g in granules])
+        return sorted(granules, key=lambda g : (g.id[5:15], order.get(g.id, len(order))))
+
+    def record_progress(self, granules: List[Granule]) -> None:
+        """
+        Records the state of a list of :class:`.Granule` objects in
+        ``self.manifest``, if there is one. Should only be called internally.
+        """
+        if self.manifest is not None:
+            self.manifest.record(granules=granules, write=self.write)
+
+    def resume_granules(self, granule_ids: List[str]) -> Tuple[List[Granule], List[str]]:
+        """
+        Takes as an input a list of granule identifiers. Reads the granules that
+        ``self.manifest`` says were finished by an earlier run from the files they
+        were written to, and parses them (depending on ``self.parse``); they are only
+        written again if ``self.write`` is a different directory. Returns a tuple
+        consisting of the granules that were read, and the identifiers of the
+        granules that still have to be requested. Should only be called internally.
+        """
+        files = self.manifest.finished_files(granule_ids=granule_ids)
+
+        def read_granules() -> Iterator[Tuple[Granule, Element, str]]:
+            for granule_id in granule_ids:
+                if granule_id not in files:
+                    continue
+                xml_path, htm_path = files[granule_id]
+                granule = Granule(granule_id=granule_id)
+                with open(xml_path) as mods_file:
+                    mods = et.fromstring(mods_file.read())
+                with open(htm_path) as htm_file:
+                    htm = htm_file.read()
+                if self.write and granule.write_paths(write=self.write) == (xml_path, htm_path):
+                    granule.written = True
+                yield granule, mods, htm
+
+        granules = [g for g in self.process_granules(jobs=read_granules()) if g.complete]
+        resumed_ids = set(g.id for g in granules)
+        remaining_ids = [g_id for g_id in granule_ids if g_id not in resumed_ids]
+        if granules:
+            self.logger.log(f'resumed {len(granules)} finished granules from {self.manifest.path}; {len(remaining_ids)} granules left to get')
+        return granules, remaining_ids
+
+    def resume_dates(self, dates: List[str]) -> Tuple[List[Granule], List[str], List[str]]:
+        """
+        Takes as an input a list of date strings. For each date that
+        ``self.manifest`` says was finished by an earlier run with the same granule
+        classes and filters, reads its granules with :meth:`.Downloader.resume_granules()`.
+        Returns a tuple consisting of the granules that were read, the dates that
+        still have to be requested, and the identifiers of the granules from
+        finished dates that still have to be requested. Should only be called
+        internally.
+        """
+        granules, remaining_dates, remaining_ids = [], [], []
+        for date in dates:
+            granule_ids = self.manifest.finished_date(date=date, classes=self.progress_key)
+            if granule_ids is None:
+                remaining_dates.append(date)
+                continue
+            date_granules, date_remaining_ids = self.resume_granules(granule_ids=granule_ids)
+            granules += date_granules
+            remaining_ids += date_remaining_ids
+
+        if len(remaining_dates) < len(dates):
+            self.logger.log(f'skipping {len(dates) - len(remaining_dates)} dates that were finished by an earlier run')
+        return granules, remaining_dates, remaining_ids
+
+    @property
+    def executor(self) -> Union[ProcessPoolExecutor, None]:
+        """
+        The pool of worker processes that granules are parsed in, if
+        ``self.workers`` is an ``int``. Created the first time it is used; since it
+        can be first used from several threads at once (the threads that process
+        zipped files, or that prefetch days), it is created under a lock, so that
+        only one pool is ever started.
+        """
+        if self.workers is False:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def close(self) -> None:
+        """
+        Shuts down the pool of worker processes and the event loop thread, if they
+        were started by this downloader, and closes the manifest, if it was opened
+        by this downloader.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        if self._loop_handler is not None and self._owns_loop_handler:
+            self._loop_handler.stop()
+            self._loop_handler = None
+        if self.manifest is not None and self._owns_manifest:
+            self.manifest.close()
+            self.manifest = None
+
+    async def get_granules_from_zips_pipelined(self, dates: List[str], client: GovInfoClient) -> List[Granule]:
+        """
+        Takes as an input a list of date strings and a :class:`GovInfoClient`. Gets
+        and processes the zipped files associated with those dates in two stages that
+        run at the same time: zipped files are downloaded (see
+        :meth:`.Downloader.get_zip()`) and put on a queue that holds at most
+        ``self.pipeline`` files, while the zipped files already on the queue are
+        parsed and written (see :meth:`.Downloader.granules_from_zip()`) in a separate
+        thread. When the queue is full, downloads wait for it to drain, so that
+        memory and disk use stay bounded. Should only be called internally.
+        """
+        self.incomplete_granules = set()
+        queue : asyncio.Queue = asyncio.Queue(maxsize=self.pipeline)
+        date_granules = {}
+        got_dates = set()
+
+        async def download(date: str, last_attempt: bool = False) -> bool:
+            response_validity, response, zip_file = await self.get_zip(date=date, client=client)
+            if response_validity is True:
+                got_dates.add(date)
+                await queue.put((date, zipfile.ZipFile(zip_file)))
+            elif client.is_deferred(response_validity, response) and not last_attempt:
+                return True
+            elif response is not None:
+                self.incomplete_days.add(date)
+            return False
+
+        async def download_all() -> None:
+            try:
+                self.logger.log(message=f'getting granules in zipped files for {len(dates)} dates with {self.batch_size} requests in flight')
+                started = time.monotonic()
+                deferred = await self.run_in_window(coroutines=(download(date=date, last_attempt=self.defer_wait is False) for date in dates), total=len(dates), description='zipped files')
+                deferred_results = await self.retry_deferred(keys=[date for date, d in zip(dates, deferred) if d], get=download, is_deferred=lambda d : d, deferred_at=started, description='zipped files')
+                for date, d in deferred_results.items():
+                    if d:
+                        self.incomplete_days.add(date)
+            finally:
+                await queue.put(None)
+
+        async def process_all() -> None:
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                date, date_zip = item
+                try:
+                    date_granules[date] = await loop.run_in_executor(None, self.granules_from_zip, date_zip)
+                except Exception as e:
+                    self.logger.log(f'could not process the zipped file for {date} ({e!r})', level='warning')
+                    got_dates.discard(date)
+                    self.incomplete_days.add(date)
+                finally:
+                    date_zip.fp.close()
+                    date_zip.close()
+
+        await asyncio.gather(download_all(), process_all())
+
+        self.logger.log(f'successfully got zipped files for {len(got_dates)} of {len(got_dates) + len(self.incomplete_days)} valid dates; there were {len(self.incomplete_days)} failures')
+
+        granules = []
+        for date in dates:
+            granules += date_granules.get(date, [])
+        return self.summarize_granules(granules=granules)
+
     async def get_granules_from_zips(self, dates: List[str]) -> List[Granule]:
         """
         Takes as an input a list of date strings. Returns a set of :class:`.Granule`
         objects from those days, but requests the granules in zip files as opposed to
         one at a time.
         """
-        async with self.client as client:
+        if self.pipeline is not False:
+            async with self.open_client() as client:
+                return await self.get_granules_from_zips_pipelined(dates=dates, client=client)
+
+        async with self.open_client() as client:
             zips = await self.get_zips_from_dates_in_batch(dates=dates, client=client)
             granules = self.granules_from_zips(zips=zips)
+        for date_zip in zips:
+            date_zip.fp.close()
+            date_zip.close()
         return granules
 
-    def get_from_dates(self, dates: List[str] = []) -> List[Granule]:
+    async def get_granules_from_date(self, date: str, client: GovInfoClient, granule_ids: List[str] = None) -> List[Granule]:
         """
-        Takes as an input a list of date strings and executes the 
-        :meth:`.Downloader.get_granules_from_zips()` coroutine if ``self.zipped`` is 
-        ``True`` or the :meth:`.Downloader.get_granules_from_dates()` coroutine if 
-        ``self.zipped`` is ``False``.
+        Takes as an input a single date string, a :class:`GovInfoClient`, and,
+        optionally, the granule identifiers to get from that date. Gets, parses, and
+        writes that day's granules (depending on ``self.parse`` and ``self.write``):
+        in a zipped file if ``self.zipped`` is ``True`` (or if ``self.zipped`` is
+        ``'auto'`` and that is the plan for the day) and no granule identifiers are
+        provided, or individually otherwise. If there is a ``self.manifest``, work
+        finished by an earlier run is skipped. Failures are added to
+        ``self.incomplete_days`` and ``self.incomplete_granules``. Should only be
+        called internally.
         """
-        self.logger.log(f'getting granules with the following classes: {self.valid_classes}; skipping granules with the following classes: {self.invalid_classes}')
-        if self.zipped:
-            future = asyncio.run_coroutine_threadsafe(self.get_granules_from_zips(dates=dates), self._loop_handler.loop)
-            granules = future.result()
+        loop = asyncio.get_running_loop()
+        resumed = []
+        if self.manifest is not None and granule_ids is None:
+            resumed, remaining_dates, remaining_ids = await loop.run_in_executor(None, self.resume_dates, [date])
+            if not remaining_dates:
+                granule_ids = remaining_ids
+
+        if granule_ids is None and self.zipped == 'auto':
+            zip_dates, planned_ids = await self.plan_dates(dates=[date], client=client)
+            if not zip_dates:
+                granule_ids = planned_ids
+                if self.manifest is not None:
+                    date_resumed, granule_ids = await loop.run_in_executor(None, self.resume_granules, granule_ids)
+                    resumed += date_resumed
+
+        if granule_ids is None and self.zipped:
+            granules = await self.get_granules_from_zip_date(date=date, client=client)
+        else:
+            if granule_ids is None:
+                got_all_ids, granule_ids = await get_granule_ids(date=date, client=client, granule_class_filters=self.valid_classes, logger=self.logger, granule_filter=self.granule_filter)
+                if not got_all_ids:
+                    self.incomplete_days.add(date)
+                elif self.manifest is not None:
+                    self.manifest.discovered(date=date, granule_ids=granule_ids, classes=self.progress_key)
+                if self.manifest is not None:
+                    date_resumed, granule_ids = await loop.run_in_executor(None, self.resume_granules, granule_ids)
+                    resumed += date_resumed
+
+            granules = [Granule(granule_id=g_id) for g_id in granule_ids]
+            started = time.monotonic()
+            await self.run_in_window(coroutines=(self.get_granule(granule=g, client=client) for g in granules), total=len(granules), description=f'granules from {date}')
+            await self.retry_deferred_granules(granules=granules, client=client, deferred_at=started)
+            for g in granules:
+                if not g.complete:
+                    self.incomplete_granules.add(g.id)
+            self.record_progress(granules=granules)
+            granules = self.without_skipped(granules=granules)
+
+        if self.manifest is None:
             return granules
+        self.manifest.finish_dates(dates=[date], incomplete_days=self.incomplete_days)
+        return self.in_discovery_order(granules=resumed + granules)
+
+    async def get_granules_from_zip_date(self, date: str, client: GovInfoClient) -> List[Granule]:
+        """
+        Takes as an input a single date string and a :class:`GovInfoClient`. Gets the
+        zipped file associated with that date, and processes it in a separate thread
+        (see :meth:`.Downloader.granules_from_zip()`). Should only be called
+        internally.
+        """
+        started = time.monotonic()
+        date_responses = {date: await self.get_zip(date=date, client=client)}
+        await self.retry_deferred_zips(date_responses=date_responses, client=client, deferred_at=started)
+        response_validity, response, zip_file = date_responses[date]
+        if response_validity is not True:
+            if response is not None:
+                self.incomplete_days.add(date)
+            return []
+
+        date_zip = zipfile.ZipFile(zip_file)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, self.granules_from_zip, date_zip)
+        except Exception as e:
+            self.logger.log(f'could not process the zipped file for {date} ({e!r})', level='warning')
+            self.incomplete_days.add(date)
+            return []
+        finally:
+            date_zip.fp.close()
+            date_zip.close()
+
+    async def aiter_granules(self, dates: List[str] = None, granule_ids: List[str] = None, prefetch: int = 1) -> AsyncIterator[Granule]:
+        """
+        Takes as an input a list of date strings or a list of granule identifiers
+        (which are grouped by date). Asynchronously yields :class:`.Granule` objects
+        one day at a time, in order, while up to ``prefetch`` later days are retrieved
+        in the background on the running event loop (see
+        :meth:`.Downloader.get_granules_from_date()`). Nothing is kept once it has
+        been yielded.
+        """
+        if granule_ids is not None:
+            date_granule_ids = defaultdict(list)
+            for g_id in granule_ids:
+                date_granule_ids[g_id[5:15]].append(g_id)
+            days = list(date_granule_ids.items())
+            if self.granule_filter is not None:
+                self.logger.log("Since you've passed in your own granule ids, granule filters are being ignored", level='warning')
+                self.granule_filter = None
         else:
-            future = asyncio.run_coroutine_threadsafe(self.get_granules_from_dates(dates=dates), self._loop_handler.loop)
-            granules = future.result()
-            return granules
\ No newline at end of file
+            self.logger.log(f'getting granules with the following classes: {self.valid_classes}; skipping granules with the following classes: {self.invalid_classes}')
+            if self.granule_filter is not None:
+                self.logger.log(f'only getting granules that pass {self.granule_filter}')
+            days = None
+
+        self.incomplete_days = set()
+        self.incomplete_granules = set()
+
+        async with self.open_client() as client:
+            if days is None:
+                days = [(date, None) for date in await self.session_dates(dates=dates)]
+            tasks = deque()
+            days = iter(days)
+            try:
+                while True:
+                    while len(tasks) <= prefetch:
+                        day = next(days, None)
+                        if day is None:
+                            break
+                        date, date_granule_ids = day
+                        tasks.append(asyncio.ensure_future(self.get_granules_from_date(date=date, client=client, granule_ids=date_granule_ids)))
+
+                    if not tasks:
+                        break
+
+                    granules = deque(await tasks.popleft())
+                    while granules:
+                        yield granules.popleft()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.logger.log(f'finished streaming granules; {len(self.incomplete_days)} days and {len(self.incomplete_granules)} granules were incomplete')
+        self.log_client_report()
+
+    def iter_granules(self, dates: List[str] = None, granule_ids: List[str] = None, prefetch: int = 1) -> Iterator[Granule]:
+        """
+        Takes as an input a list of date strings or a list of granule identifiers,
+        and yields the :class:`.Granule` objects from
+        :meth:`.Downloader.aiter_granules()`, which runs on the event loop of
+        ``self.loop_handler``.
+        """
+        granules = self.aiter_granules(dates=dates, granule_ids=granule_ids, prefetch=prefetch)
+
+        async def next_granule() -> Tuple[bool, Union[Granule, None]]:
+            try:
+                return True, await granules.__anext__()
+            except StopAsyncIteration:
+                return False, None
+
+        async def close() -> None:
+            await granules.aclose()
+
+        try:
+            while True:
+                got_granule, granule = self.run(next_granule())
+                if not got_granule:
+                    break
+                yield granule
+        finally:
+            self.run(close())
+
+    async def async_get_from_dates(self, dates: List[str] = []) -> List[Granule]:
+        """
+        Takes as an input a list of date strings and awaits the
+        :meth:`.Downloader.get_granules_by_date()` coroutine on the running event
+        loop.
+        """
+        self.logger.log(f'getting granules with the following classes: {self.valid_classes}; skipping granules with the following classes: {self.invalid_classes}')
+        if self.granule_filter is not None:
+            self.logger.log(f'only getting granules that pass {self.granule_filter}')
+        async with self.open_client() as client:
+            dates = await self.session_dates(dates=dates)
+            if self.manifest is None:
+                granules = await self.get_granules_by_date(dates=dates)
+                self.log_client_report()
+                return granules
+
+            resumed, remaining_dates, remaining_ids = await asyncio.get_running_loop().run_in_executor(None, self.resume_dates, dates)
+            granules = await self.get_granules_by_date(dates=remaining_dates) if remaining_dates else []
+            if remaining_ids:
+                incomplete_granules = self.incomplete_granules
+                granules += await self.get_granules_from_ids(granule_ids=remaining_ids, client=client)
+                self.incomplete_granules |= incomplete_granules
+
+        self.manifest.finish_dates(dates=dates, incomplete_days=self.incomplete_days)
+        self.logger.log(f'manifest: {self.manifest.report()}')
+        self.log_client_report()
+        return self.in_discovery_order(granules=resumed + granules)
+
+    def get_from_dates(self, dates: List[str] = []) -> List[Granule]:
+        """
+        Takes as an input a list of date strings and runs
+        :meth:`.Downloader.async_get_from_dates()` on the event loop of
+        ``self.loop_handler``.
+        """
+        return self.run(self.async_get_from_dates(dates=dates))
+
+    async def get_changed_dates(self, since: Union[str, None], dates: List[str] = None) -> Tuple[bool, List[str]]:
+        """
+        Takes as an input a timestamp and, optionally, a list of date strings. Returns
+        a tuple consisting of a boolean indicating whether the whole listing was
+        retrieved, and the dates of the CREC packages that were added or modified
+        since the timestamp (see :func:`.get_modified_packages`). If ``dates`` are
+        provided, only packages issued between the first and last of them are
+        included (see :func:`.get_published_packages`), and ``since`` can be ``None``
+        to include all of them.
+        """
+        async with self.open_client() as client:
+            if dates:
+                got_all_packages, packages = await get_published_packages(start_date=min(dates), end_date=max(dates), client=client, logger=self.logger, modified_since=since)
+            else:
+                got_all_packages, packages = await get_modified_packages(since=since, client=client, logger=self.logger)
+        return got_all_packages, package_dates(packages=packages)
+
+    def forget_dates(self, dates: List[str]) -> None:
+        """
+        Takes as an input a list of date strings whose content has changed, and
+        removes everything that was kept about them from earlier runs: their cached
+        responses, their zipped files in ``self.zip_directory``, and their progress in
+        ``self.manifest``, so that they are requested again.
+        """
+        for date in dates:
+            if self.client.cache is not None:
+                self.client.cache.remove_matching(text=f'CREC-{date}')
+            if self.zip_directory is not None:
+                zip_path = os.path.join(self.zip_directory, f'CREC-{date}.zip')
+                if os.path.exists(zip_path):
+                    os.remove(zip_path)
+        if self.manifest is not None:
+            self.manifest.invalidate(dates=dates)
+
+    async def async_sync(self, watermark_path: str, dates: List[str] = None) -> List[Granule]:
+        """
+        Takes as an input the path of a watermark file and, optionally, a list of
+        date strings. Gets the granules of the dates whose CREC packages were added or
+        modified since the watermark (see :meth:`.Downloader.get_changed_dates()`),
+        after forgetting what earlier runs kept about them (see
+        :meth:`.Downloader.forget_dates()`). If everything was retrieved, the
+        watermark is moved to the time at which this sync started; otherwise it is
+        left as it was, so that the next sync tries again.
+        """
+        since = read_watermark(path=watermark_path)
+        if since is None and not dates:
+            raise ValueError(f'There is no watermark at {watermark_path} yet; the first sync must specify a start date and an end date or a list of dates')
+
+        watermark = current_watermark()
+        async with self.open_client():
+            got_all_packages, changed_dates = await self.get_changed_dates(since=since, dates=dates)
+            self.logger.log(f'{len(changed_dates)} dates have been added or modified since {since if since is not None else "the beginning"}')
+            if since is not None:
+                self.forget_dates(dates=changed_dates)
+            granules = await self.async_get_from_dates(dates=changed_dates) if changed_dates else []
+
+        if got_all_packages and not self.incomplete_days and not self.incomplete_granules:
+            write_watermark(path=watermark_path, watermark=watermark)
+            self.logger.log(f'moved the sync watermark to {watermark}')
+        else:
+            self.logger.log(f'not everything was retrieved; the sync watermark was left at {since}', level='warning')
+        return granules
+
+    def sync(self, watermark_path: str, dates: List[str] = None) -> List[Granule]:
+        """
+        Takes as an input the path of a watermark file and, optionally, a list of
+        date strings, and runs :meth:`.Downloader.async_sync()` on the event loop of
+        ``self.loop_handler``.
+        """
+        return self.run(self.async_sync(watermark_path=watermark_path, dates=dates))
@@ -0,0 +1,110 @@
+from typing import List, Tuple, Any
+import importlib
+import importlib.util
+import os
+import re
+import weakref
+
+from crec.constants import REGEX_ENGINES
+
+# the engine that patterns are compiled with; since it is kept in the environment,
+# worker processes that are spawned (rather than forked) compile their patterns with
+# the same engine as the process that started them
+ENGINE_VARIABLE = 'CREC_REGEX_ENGINE'
+
+# every EnginePattern that is still in use, so that set_engine can compile it again
+_patterns : 'weakref.WeakSet[EnginePattern]' = weakref.WeakSet()
+
+
+def available_engines() -> List[str]:
+    """
+    Returns the regular expression engines (see :data:`.constants.REGEX_ENGINES`)
+    that are installed: :mod:`re` always is, while ``regex`` and ``re2`` are
+    optional.
+    """
+    return [engine for engine in REGEX_ENGINES if engine == 're' or importlib.util.find_spec(engine) is not None]
+
+
+def current_engine() -> str:
+    """
+    Returns the engine that patterns are compiled with: the one named by the
+    ``CREC_REGEX_ENGINE`` environment variable, or ``'re'`` if it is not set.
+    """
+    engine = os.environ.get(ENGINE_VARIABLE, 're')
+    if engine not in REGEX_ENGINES:
+        raise ValueError(f'{ENGINE_VARIABLE} must be one of {REGEX_ENGINES}')
+    return engine
+
+
+def compile_pattern(pattern: str, engine: str) -> Tuple[Any, str]:
+    """
+    Takes as an input a pattern and the name of an engine, and compiles the pattern
+    with that engine. If the engine is not installed, or cannot compile the pattern
+    (``re2``, for instance, has no lookarounds), the pattern is compiled with
+    :mod:`re` instead. Returns a tuple consisting of the compiled pattern and the
+    name of the engine that compiled it.
+    """
+    if engine not in REGEX_ENGINES:
+        raise ValueError(f'engine must be one of {REGEX_ENGINES}')
+    if engine != 're':
+        try:
+            return importlib.import_module(engine).compile(pattern), engine
+        except Exception:
+            pass
+    return re.compile(pattern), 're'
+
+
+def set_engine(engine: str) -> None:
+    """
+    Compiles every pattern crec uses with ``engine`` from now on (see
+    :data:`.constants.REGEX_ENGINES`), including the patterns that are already
+    compiled. Patterns that ``engine`` cannot compile, or every pattern if it is not
+    installed, are compiled with :mod:`re` (see :func:`.engine.compile_pattern`).
+    """
+    if engine not in REGEX_ENGINES:
+        raise ValueError(f'engine must be one of {REGEX_ENGINES}')
+    os.environ[ENGINE_VARIABLE] = engine
+    for pattern in list(_patterns):
+        pattern.compile(engine=engine)
+
+
+class EnginePattern:
+    """
+    A pattern compiled with the current engine (see :func:`.engine.current_engine`),
+    which is compiled again whenever the engine is changed with
+    :func:`.engine.set_engine`. Its matching methods are those of the compiled
+    pattern itself, so calling them costs no more than calling the compiled
+    pattern's.
+
+    Parameters
+    ----------
+    pattern : str
+        The pattern.
+
+    Attributes
+    ----------
+    engine : str
+        The engine that actually compiled the pattern, which is ``'re'`` if the one
+        that was asked for could not.
+    """
+    def __init__(self, pattern: str) -> None:
+        self.pattern = pattern
+        self.compile(engine=current_engine())
+        _patterns.add(self)
+
+    def __repr__(self) -> str:
+        return f'EnginePattern (pattern: {self.pattern!r}, engine: {self.engine})'
+
+    def compile(self, engine: str) -> None:
+        """
+        Compiles the pattern with ``engine``, falling back to :mod:`re` (see
+        :func:`.engine.compile_pattern`).
+        """
+        self.compiled, self.engine = compile_pattern(pattern=self.pattern, engine=engine)
+        self.groupindex = self.compiled.groupindex
+        self.search = self.compiled.search
+        self.match = self.compiled.match
+        self.finditer = self.compiled.finditer
+        self.findall = self.compiled.findall
+        self.sub = self.compiled.sub
+        self.split = self.compiled.split
@@ -0,0 +1,114 @@
+from typing import List
+from xml.etree.ElementTree import Element
+
+MODS_NAMESPACE = '{http://www.loc.gov/mods/v3}'
+
+
+class GranuleFilter:
+    """
+    Describes which granules should be retrieved, beyond their class (see the
+    ``granule_class_filter`` parameter of :class:`.Record`). Filters are checked as
+    early as possible, so that granules that are left out cost as little as
+    possible: dates are checked before anything is requested, granule titles are
+    checked against GovInfo's ``/granules`` listing before a granule is requested,
+    and everything is checked against a granule's metadata (its MODS) before its
+    text is read or parsed.
+
+    A granule is kept only if it passes every filter that is provided.
+
+    Parameters
+    ----------
+    start_date : str = None
+        If provided, granules issued before ``start_date`` (in ``YYYY-mm-dd``
+        format) are left out.
+    end_date : str = None
+        If provided, granules issued after ``end_date`` (in ``YYYY-mm-dd`` format)
+        are left out.
+    chambers : List[str] = None
+        If provided, only granules from one of these chambers (``SENATE`` or
+        ``HOUSE``) are kept.
+    bioguide_ids : List[str] = None
+        If provided, only granules in which a Congress Member with one of these
+        bioGuideIds spoke are kept.
+    title_keywords : List[str] = None
+        If provided, only granules whose title contains one of these keywords
+        (ignoring case) are kept.
+    """
+    def __init__(self, start_date: str = None, end_date: str = None, chambers: List[str] = None, bioguide_ids: List[str] = None, title_keywords: List[str] = None) -> None:
+        self.start_date = start_date
+        self.end_date = end_date
+        self.chambers = [c.upper() for c in chambers] if chambers is not None else None
+        self.bioguide_ids = bioguide_ids
+        self.title_keywords = [k.lower() for k in title_keywords] if title_keywords is not None else None
+
+    def __repr__(self) -> str:
+        return f'GranuleFilter ({self.key()})'
+
+    def key(self) -> str:
+        """
+        Returns a string that describes the filter, so that runs with different
+        filters can be told apart.
+        """
+        return f'start_date={self.start_date};end_date={self.end_date};chambers={self.chambers};bioguide_ids={self.bioguide_ids};title_keywords={self.title_keywords}'
+
+    @property
+    def needs_mods(self) -> bool:
+        """
+        Whether the filter has to see a granule's metadata (its MODS), because it
+        cannot be decided from GovInfo's ``/granules`` listing alone.
+        """
+        return self.chambers is not None or self.bioguide_ids is not None
+
+    def matches_date(self, date: str) -> bool:
+        """
+        Returns whether a date string is within the filter's date range.
+        """
+        if self.start_date is not None and date < self.start_date:
+            return False
+        if self.end_date is not None and date > self.end_date:
+            return False
+        return True
+
+    def matches_title(self, title: str) -> bool:
+        """
+        Returns whether a granule title contains one of the filter's keywords.
+        """
+        if self.title_keywords is None:
+            return True
+        title = (title or '').lower()
+        return any(k in title for k in self.title_keywords)
+
+    def matches_summary(self, summary: dict) -> bool:
+        """
+        Returns whether a granule, as described by an entry of GovInfo's
+        ``/granules`` listing, might be kept. Filters that need the granule's
+        metadata are not checked.
+        """
+        return self.matches_date(summary['granuleId'][5:15]) and self.matches_title(summary.get('title', None))
+
+    def matches_mods(self, mods: Element) -> bool:
+        """
+        Returns whether a granule should be kept, according to its metadata: either
+        its own MODS document, or the ``relatedItem`` element that describes it in
+        the MODS document of its package.
+        """
+        granule_date = mods.find(f'.//{MODS_NAMESPACE}granuleDate')
+        if granule_date is not None and granule_date.text and not self.matches_date(granule_date.text[:10]):
+            return False
+
+        if self.title_keywords is not None:
+            search_title = mods.find(f'.//{MODS_NAMESPACE}searchTitle')
+            if not self.matches_title(search_title.text if search_title is not None else None):
+                return False
+
+        if self.chambers is not None:
+            chamber = mods.find(f'.//{MODS_NAMESPACE}chamber')
+            if chamber is None or (chamber.text or '').upper() not in self.chambers:
+                return False
+
+        if self.bioguide_ids is not None:
+            speakers = set(m.attrib.get('bioGuideId', None) for m in mods.iter(f'{MODS_NAMESPACE}congMember') if m.attrib.get('role', None) == 'SPEAKING')
+            if not any(b in speakers for b in self.bioguide_ids):
+                return False
+
+        return True
@@ -1,59 +1,109 @@
 from xml.etree import ElementTree as et
 from xml.etree.ElementTree import Element
-import re
 import httpx
 from typing import List, Dict, Tuple, Union
 import os
 import math
+import time
 import functools
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 
 from crec.api import GovInfoClient
+from crec.filters import GranuleFilter
 from crec.speaker import Speaker, UNKNOWN_SPEAKER
-from crec.constants import TITLES, GRANULE_ATTRIBUTES
+from crec.constants import GRANULE_ATTRIBUTES
+from crec.patterns import LEGISLATION, find_titles, speaker_matcher
+from crec.cleaner import clean_htm_lines
 from crec.text import Passage, PassageCollection, ParagraphCollection
 from crec.logger import Logger
 
-async def get_granule_ids(date: str, client: GovInfoClient, granule_class_filters: List[str], logger: Logger) -> Tuple[bool, List[str]]:
+async def get_granule_summaries(date: str, client: GovInfoClient, logger: Logger, page_size: int = 1000) -> Tuple[bool, List[dict]]:
     """
-    A function to retrieve the granule identifiers associated with a specific day.
-    Takes as an input a date string, a :class:`.GovInfoClient` object, a list of 
-    granule_class_filters, and a :class:`.Logger` object.
-    
-    This function reaches the ``/granules`` endpoint of the GovInfo API which returns these
-    identifiers. If provided, only granules with a class listed in 
-    ``granule_class_filter`` will be retrieved. Otherwise, all granules are included.
+    A function to retrieve the listing of the granules associated with a specific
+    day. Takes as an input a date string, a :class:`.GovInfoClient` object, a
+    :class:`.Logger` object, and the number of granules to request per page (GovInfo
+    allows up to 1000).
+
+    This function reaches the ``/granules`` endpoint of the GovInfo API, which
+    returns a summary of each granule (its identifier, class, and title). The number
+    of pages is worked out from the first response, and the remaining pages are
+    requested concurrently. Returns a tuple consisting of a boolean indicating
+    whether every page was retrieved, and the summaries that were.
     """
     logger.log(f'getting granule ids from {date}')
-    got_all_ids = False
 
     granules_url = f'packages/CREC-{date}/granules'
 
-    granules_resp_validity, granules_resp = await client.get(granules_url, params={'offset': '0', 'pageSize': '100'})
-    if granules_resp_validity:
-        got_all_ids = True
-    else:
-        return []
+    granules_resp_validity, granules_resp = await client.get(granules_url, params={'offset': '0', 'pageSize': f'{page_size}'})
+    if not granules_resp_validity:
+        return False, []
     
     granules_json = granules_resp.json()
     
     granules_count = granules_json['count']
-    granule_ids = [g['granuleId'] for g in granules_json['granules'] if g['granuleClass'] in granule_class_filters]
-
-    if granules_count > 100:
-        got_all_ids = False
-        remaining_pages = math.ceil((granules_count - 100)/100)
-        for p in range(1, remaining_pages + 1):
-            offset = 100*p
-            next_granules_resp_validity, next_granules_resp = await client.get(granules_url, params={'offset': f'{offset}', 'pageSize': '100'})
-            if next_granules_resp_validity:
-                pass
-            else:
-                break
-            next_granules_json = next_granules_resp.json()
-            granule_ids += [g['granuleId'] for g in next_granules_json['granules'] if g['granuleClass'] in granule_class_filters]
-        got_all_ids = True
+    summaries = list(granules_json['granules'])
+
+    remaining_pages = math.ceil(max(granules_count - page_size, 0)/page_size)
+    page_responses = await asyncio.gather(*[client.get(granules_url, params={'offset': f'{page_size*p}', 'pageSize': f'{page_size}'}) for p in range(1, remaining_pages + 1)])
+
+    got_all_summaries = True
+    for next_granules_resp_validity, next_granules_resp in page_responses:
+        if not next_granules_resp_validity:
+            got_all_summaries = False
+            continue
+        next_granules_json = next_granules_resp.json()
+        summaries += next_granules_json['granules']
     
-    return got_all_ids, granule_ids
+    return got_all_summaries, summaries
+
+
+def wanted_granule_ids(summaries: List[dict], granule_class_filters: List[str], granule_filter: GranuleFilter = None) -> List[str]:
+    """
+    Takes as an input a list of granule summaries from the ``/granules`` endpoint of
+    the GovInfo API, a list of granule_class_filters, and, optionally, a
+    :class:`.GranuleFilter` object. Returns the identifiers of the granules with a
+    class listed in ``granule_class_filters`` that ``granule_filter`` does not rule
+    out based on their summary (see :meth:`.GranuleFilter.matches_summary()`).
+    """
+    return [g['granuleId'] for g in summaries if g['granuleClass'] in granule_class_filters and (granule_filter is None or granule_filter.matches_summary(g))]
+
+
+async def get_granule_ids(date: str, client: GovInfoClient, granule_class_filters: List[str], logger: Logger, page_size: int = 1000, granule_filter: GranuleFilter = None) -> Tuple[bool, List[str]]:
+    """
+    A function to retrieve the granule identifiers associated with a specific day.
+    Takes as an input a date string, a :class:`.GovInfoClient` object, a list of 
+    granule_class_filters, a :class:`.Logger` object, the number of granules to
+    request per page (GovInfo allows up to 1000), and, optionally, a
+    :class:`.GranuleFilter` object.
+    
+    The granules are listed with :func:`.get_granule_summaries`. If provided, only
+    granules with a class listed in ``granule_class_filter`` will be retrieved.
+    Otherwise, all granules are included. If a ``granule_filter`` is provided,
+    granules that it rules out based on their listing are left out as well.
+    """
+    got_all_ids, summaries = await get_granule_summaries(date=date, client=client, logger=logger, page_size=page_size)
+    return got_all_ids, wanted_granule_ids(summaries=summaries, granule_class_filters=granule_class_filters, granule_filter=granule_filter)
+
+
+class ParseTimeoutError(TimeoutError):
+    """
+    Assigned to :attr:`.Granule.parse_exception` when parsing a granule takes longer
+    than its time budget (see :meth:`.Granule.parse_responses()`).
+    """
+
+
+def parse_granule(granule_id: str, xml_content: bytes, htm_text: str, parse_budget: Union[bool, float] = False) -> dict:
+    """
+    Parses a granule's metadata (xml) and text (htm) and returns the compact parse
+    result described in :meth:`.Granule.to_parse_result()`. Meant to be run in a
+    worker process of a :class:`concurrent.futures.ProcessPoolExecutor`, which is why
+    it takes and returns only plain, picklable data. ``parse_budget`` is passed on to
+    :meth:`.Granule.parse_responses()`.
+    """
+    granule = Granule(granule_id=granule_id)
+    granule.parse_responses(xml_response=et.fromstring(xml_content), htm_response=htm_text, parse_budget=parse_budget)
+    return granule.to_parse_result()
 
 
 class Granule:
@@ -102,6 +152,14 @@ class Granule:
     written : bool
         A boolean that indicates whether the metadata and text of the granule 
         were successfully written to disk.
+    deferred : bool
+        A boolean that indicates whether GovInfo said that the granule's metadata or
+        text was still being generated the last time it was requested, in which case
+        it can be requested again later.
+    skipped : bool
+        A boolean that indicates whether the granule was ruled out by a
+        :class:`.GranuleFilter` once its metadata was retrieved, in which case its
+        text is never requested.
     complete : bool
         A boolean that indicates whether the desired behavior (parsing and writing)
         was achieved. If both ``parse`` and ``write`` are ``True``, then ``parsed``
@@ -134,10 +192,13 @@ class Granule:
         self.speakers : Dict[str, Speaker] = {}
 
         self._passage_collection = PassageCollection()
+        self._parse_deadline = None
 
         self.valid_responses = False
         self.parsed = False
         self.written = False
+        self.skipped = False
+        self.deferred = False
         self.complete = False
 
         self.parse_exception = None
@@ -146,22 +207,71 @@ class Granule:
     def __repr__(self) -> str:
         return f'Granule (id: {self.id})'
 
-    async def async_get(self, client: GovInfoClient, parse: bool, write: Union[bool, str]) -> None:
+    async def async_get(self, client: GovInfoClient, parse: bool, write: Union[bool, str], fail_fast: bool = False, executor: ProcessPoolExecutor = None, granule_filter: GranuleFilter = None, defer: bool = False, parse_budget: Union[bool, float] = False) -> None:
         """
         Takes as an input a :class:`.GovInfoClient` object, and booleans indicating
         whether the granule's data should be parsed and/or written to disk. Requests
-        the granule's metadata and text, and proceeds from there.
+        the granule's metadata and text concurrently, and proceeds from there.
+        Parsing and writing run in a separate thread, so that they do not block the
+        event loop while other requests are in flight; if a process pool ``executor``
+        is provided, parsing runs there instead (see :func:`.parse_granule`). If
+        ``fail_fast`` is ``True``, then as soon as one of the two requests has failed
+        for good, the other one is cancelled.
+
+        If a ``granule_filter`` that has to see the granule's metadata is provided
+        (see :attr:`.GranuleFilter.needs_mods`), the metadata is requested first, and
+        the text is only requested if the filter keeps the granule; otherwise, the
+        granule is marked as ``skipped`` (and ``complete``).
+
+        If ``defer`` is ``True`` and GovInfo says that the metadata or text is still
+        being generated, the granule is marked as ``deferred`` instead of waiting
+        for it, so that it can be requested again later. ``parse_budget`` is passed on
+        to :meth:`.Granule.parse_responses()`.
         """
-        xml_response_validity, xml_response = await client.get(self.xml_url)
-        htm_response_validity, htm_response = await client.get(self.htm_url)
+        self.deferred = False
+        xml_task = asyncio.ensure_future(client.get(self.xml_url, defer=defer))
+        if granule_filter is not None and granule_filter.needs_mods:
+            xml_response_validity, xml_response = await xml_task
+            if not xml_response_validity:
+                self.deferred = client.is_deferred(xml_response_validity, xml_response)
+                return
+            if not granule_filter.matches_mods(et.fromstring(xml_response.content)):
+                self.skipped = True
+                self.complete = True
+                return
+        htm_task = asyncio.ensure_future(client.get(self.htm_url, defer=defer))
+        tasks = [xml_task, htm_task]
+        try:
+            if fail_fast:
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    if any(task.result()[0] is False for task in done):
+                        break
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        xml_response_validity, xml_response = xml_task.result() if xml_task.done() and not xml_task.cancelled() else (False, None)
+        htm_response_validity, htm_response = htm_task.result() if htm_task.done() and not htm_task.cancelled() else (False, None)
+        self.deferred = client.is_deferred(xml_response_validity, xml_response) or client.is_deferred(htm_response_validity, htm_response)
 
         if xml_response_validity and htm_response_validity: 
             self.valid_responses = True
-            if parse:
-                self.parse_responses(xml_response=xml_response, htm_response=htm_response)
+            loop = asyncio.get_running_loop()
+            if parse and executor is not None:
+                try:
+                    self.load_parse_result(await loop.run_in_executor(executor, parse_granule, self.id, xml_response.content, htm_response.text, parse_budget))
+                except Exception as e:
+                    self.parse_exception = e
+            elif parse:
+                await loop.run_in_executor(None, functools.partial(self.parse_responses, xml_response=xml_response, htm_response=htm_response, parse_budget=parse_budget))
 
             if isinstance(write, str):
-                self.write_responses(write=write, xml_response=xml_response, htm_response=htm_response)
+                await loop.run_in_executor(None, functools.partial(self.write_responses, write=write, xml_response=xml_response, htm_response=htm_response))
 
         if parse is True and isinstance(write, str):
             if self.parsed and self.written:
@@ -175,13 +285,23 @@ class Granule:
         else:
             self.complete = True
             
-    def parse_responses(self, xml_response: Union[httpx.Response, Element], htm_response: Union[httpx.Response, str]) -> None:
+    def parse_responses(self, xml_response: Union[httpx.Response, Element], htm_response: Union[httpx.Response, str], parse_budget: Union[bool, float] = False) -> None:
         """
         Takes both the metadata (xml) and text (htm) responses return from the
         :class:`.GovInfoClient` object. Tries to parse both of them. In the case of an
         error, saves the error to either the :attr:`.Granule.parse_exception`
         attribute.
+
+        If ``parse_budget`` is a number, parsing is abandoned once it has taken more
+        than ``parse_budget`` seconds, and a :class:`.ParseTimeoutError` is saved to
+        :attr:`.Granule.parse_exception`. The budget is only checked between the steps
+        of the parse (see :meth:`.Granule.check_parse_budget()`): a step that is
+        running, such as a single regular expression search, is not interrupted, and
+        the parse is abandoned once it finishes. It is a budget for the parse as a
+        whole, which bounds the time spent on a granule because each step takes time
+        linear in the length of the text.
         """
+        self._parse_deadline = time.monotonic() + parse_budget if parse_budget is not False else None
         try:
             if isinstance(xml_response, httpx.Response):
                 xml_content = xml_response.content
@@ -199,6 +319,69 @@ class Granule:
             self.parsed = True
         except Exception as e:
             self.parse_exception = e
+        finally:
+            self._parse_deadline = None
+
+    def check_parse_budget(self) -> None:
+        """
+        Raises a :class:`.ParseTimeoutError` if the granule is being parsed with a
+        time budget (see :meth:`.Granule.parse_responses()`), and it has run out.
+        """
+        if self._parse_deadline is not None and time.monotonic() > self._parse_deadline:
+            raise ParseTimeoutError(f'parsing {self.id} took longer than its time budget')
+
+    def to_parse_result(self) -> dict:
+        """
+        Returns a compact, picklable summary of the granule's parse: its attributes,
+        its speakers, its raw and clean text, and the text of each paragraph of each
+        passage (along with the identifier of the passage's speaker). The granule can
+        be rebuilt from this summary with :meth:`.Granule.load_parse_result()`.
+        """
+        speaker_ids = {id(s): s_id for s_id, s in self.speakers.items()}
+        return {
+            'attributes': self.attributes,
+            'speakers': [(s_id, s.attributes, s.names, s.titled) for s_id, s in self.speakers.items()],
+            'raw_text': self.raw_text,
+            'clean_text': self.clean_text,
+            'passages': [(p.passage_id, speaker_ids.get(id(p.speaker), None), [paragraph.text for paragraph in p.paragraphs]) for p in self.passages],
+            'parsed': self.parsed,
+            'parse_exception': self.parse_exception
+        }
+
+    def load_parse_result(self, result: dict) -> None:
+        """
+        Rebuilds the granule's attributes, speakers, text, and :class:`.Passage` and
+        :class:`.Paragraph` objects from the output of
+        :meth:`.Granule.to_parse_result()`.
+        """
+        self.attributes = result['attributes']
+        self.speakers = {s_id: Speaker(attributes=attributes, names=names, titled=titled) for s_id, attributes, names, titled in result['speakers']}
+        self.raw_text = result['raw_text']
+        self.clean_text = result['clean_text']
+
+        self._passage_collection = PassageCollection()
+        for passage_id, s_id, paragraph_texts in result['passages']:
+            speaker = self.speakers[s_id] if s_id is not None else UNKNOWN_SPEAKER
+            passage = Passage(granule_attributes=self.attributes, passage_id=passage_id, speaker=speaker, text='\n\n'.join(paragraph_texts))
+            self._passage_collection.add(passage=passage)
+
+        self.parsed = result['parsed']
+        self.parse_exception = result['parse_exception']
+
+    def write_paths(self, write: str) -> Tuple[str, str]:
+        """
+        Takes a ``write`` path, and returns the paths that the granule's metadata (xml)
+        and text (htm) are written to.
+        """
+        granule_id = self.attributes['granuleId']
+        wd = os.getcwd()
+        if not os.path.isabs(write):
+            xml_path = os.path.join(wd, f'{write}/{granule_id}.xml')
+            htm_path = os.path.join(wd, f'{write}/{granule_id}.htm')
+        else:
+            xml_path = f'{write}/{granule_id}.xml'
+            htm_path = f'{write}/{granule_id}.htm'
+        return xml_path, htm_path
 
     def write_responses(self, write: str, xml_response: Union[httpx.Response, Element], htm_response: Union[httpx.Response, str]) -> None:
         """
@@ -208,14 +391,7 @@ class Granule:
         attribute.
         """
         try:
-            granule_id = self.attributes['granuleId']
-            wd = os.getcwd()
-            if not os.path.isabs(write):
-                xml_path = os.path.join(wd, f'{write}/{granule_id}.xml')
-                htm_path = os.path.join(wd, f'{write}/{granule_id}.htm')
-            else:
-                xml_path = f'{write}/{granule_id}.xml'
-                htm_path = f'{write}/{granule_id}.htm'
+            xml_path, htm_path = self.write_paths(write=write)
 
             if isinstance(xml_response, httpx.Response):
                 xml_text = xml_response.text
@@ -262,49 +438,17 @@ class Granule:
     def parse_htm(self, raw_text) -> None:
         """
         Parses the text response. Starts by removing common non-speech elements:
-        the title, the footer, page numbers, and times. Then, it calls the
+        the title, the footer, page numbers, and times (see
+        :func:`.cleaner.clean_htm_lines`). Then, it calls the
         :meth:`.Granule.find_titled_speakers()` and :meth:`.Granule.find_passages()`
         functions.
         """
         self.raw_text = raw_text
-        text = raw_text
-
-        # remove bullets
-        text = re.sub(r'<bullet>', ' ', text)
-
-        # remove title block
-        title_block_match = re.search(r'(?<!\s)\n\n(  )(?!\s)', text)
-        if title_block_match is not None:
-            text = '\n  ' + text[title_block_match.end():]
-
-        # remove footer
-        footer_match = re.search(r'(\n| )+____________________\n+', text)
-        if footer_match is not None:
-            text = text[:footer_match.start()]
-
-        # remove inline page numbers
-        text = re.sub('\n\n\[\[Page .+\]\n\n(?=[a-zA-Z0-9])', ' ', text)
-
-        # remove other page numbers
-        text = re.sub('\[\[Page .+\]\]', '', text)
-
-        # remove times
-        text = re.sub('\{time\}\s+\d+', '', text)
-
-        # remove notes
-        text = re.sub('\n+ =+ NOTE =+(.|\n)+ END NOTE =+', '\n  ', text)
-
-        # remove bottom html
-        bottom_html_match = re.search('\n+<\/pre><\/body>\n<\/html>', text)
-        if bottom_html_match is not None:
-            text = text[:bottom_html_match.start() + 1]
-
-        spoken_paragraphs = re.finditer('((?<=(\n  ))|(?<=(\n   )))(?P<text>[^\s\(\[][\s\S]*?)(?=(\n  )|(\Z))', text)
-        text = '\n\n'.join([p.group('text') for p in spoken_paragraphs])
-
-        self.clean_text = text
+        self.clean_text = clean_htm_lines(raw_text)
+        self.check_parse_budget()
 
         self.find_titled_speakers()
+        self.check_parse_budget()
         self.find_passages()
 
     def find_titled_speakers(self) -> None:
@@ -314,15 +458,16 @@ class Granule:
         Examples of this type of speaker include The PRESIDING OFFICER and
         The CHIEF JUSTICE. For each titled speaker, it creates a new :class:`.Speaker`
         object, and a unique speaker identifier, and adds those to the granule's
-        mapping of speakers.
+        mapping of speakers. The titles are found with precompiled patterns (see
+        :func:`.patterns.find_titles`).
         """
         titled_speakers = set()
-        for t in TITLES:
-            for match in re.findall(t, self.clean_text):
-                if match not in titled_speakers:
-                    titled_speakers.add(match)
-                    s = Speaker.from_title(title=match)
-                    self.speakers[f's{len(self.speakers)}'] = s
+        for match in find_titles(self.clean_text):
+            if match not in titled_speakers:
+                titled_speakers.add(match)
+                s = Speaker.from_title(title=match)
+                self.speakers[f's{len(self.speakers)}'] = s
+                self.check_parse_budget()
 
     def find_passages(self) -> None:
         """
@@ -378,9 +523,10 @@ class Granule:
         :meth:`.Granule.find_titled_speakers()` is called.
         
         These parsed names are used to construct a regex search string that can 
-        identify new speakers at the beginning of paragraphs. The function splits the 
-        cleaned text up at these new-speaker-matches, and assigns each piece of text to
-        a :class:`.Passage` object attributed to the corresponding speaker.
+        identify new speakers at the beginning of paragraphs (see
+        :func:`.patterns.speaker_matcher`). The function splits the cleaned text up at
+        these new-speaker-matches, and assigns each piece of text to a
+        :class:`.Passage` object attributed to the corresponding speaker.
         """
         passage_id = 1
         if len(self.speakers) == 0:
@@ -388,12 +534,13 @@ class Granule:
             passage = Passage(granule_attributes=self.attributes, passage_id=passage_id, speaker=s, text=self.clean_text)
             self._passage_collection.add(passage=passage)
         else:
-            sorted_speakers = sorted(self.speakers.items(), key=lambda p : len(p[1].parsed_name), reverse=True)
-            speaker_search_str = '(' + '|'.join([f'(?P<{s_id}>{s.re_search}(\.| led the Pledge of Allegiance as follows:| \(for [\s\S]+\):)( |))' for s_id, s in sorted_speakers]) + ')'
-            new_speaker_matches = list(re.finditer(speaker_search_str, self.clean_text))
+            sorted_speakers = sorted(self.speakers.values(), key=lambda s : len(s.parsed_name), reverse=True)
+            matcher = speaker_matcher(tuple(s.re_search for s in sorted_speakers))
+            speakers_by_group = {f's{i}': s for i, s in enumerate(sorted_speakers)}
+            new_speaker_matches = matcher.find(self.clean_text)
 
-            if len(new_speaker_matches) == 0 or new_speaker_matches[0].start() > 3:
-                if re.match('(^SA \d+\.)|(^S. \d+\.)', self.clean_text):
+            if len(new_speaker_matches) == 0 or new_speaker_matches[0][0] > 3:
+                if LEGISLATION.match(self.clean_text):
                     if len(new_speaker_matches) == 0:
                         return
                     else:
@@ -403,21 +550,20 @@ class Granule:
                         s = list(self.speakers.values())[0]
                     else:
                         s = UNKNOWN_SPEAKER
-                    end = None if len(new_speaker_matches) == 0 else new_speaker_matches[0].start()
+                    end = None if len(new_speaker_matches) == 0 else new_speaker_matches[0][0]
 
                     passage = Passage(granule_attributes=self.attributes, passage_id=passage_id, speaker=s, text=self.clean_text[0:end])
                     passage_id += 1
                     self._passage_collection.add(passage=passage)
 
-            for i, match in enumerate(new_speaker_matches):
-                s_id = [k for k, v in match.groupdict().items() if v != None][0]
-                speaker = self.speakers[s_id]
-                start = match.end()
-                end = new_speaker_matches[i + 1].start() if i < len(new_speaker_matches) - 1 else None
+            for i, (_, start, group) in enumerate(new_speaker_matches):
+                speaker = speakers_by_group[group]
+                end = new_speaker_matches[i + 1][0] if i < len(new_speaker_matches) - 1 else None
 
                 passage = Passage(granule_attributes=self.attributes, passage_id=passage_id, speaker=speaker, text=self.clean_text[start:end])
                 passage_id += 1
                 self._passage_collection.add(passage=passage)
+                self.check_parse_budget()
 
     @property
     def passages(self) -> PassageCollection:
@@ -73,7 +73,8 @@ class Logger:
         self.logger = logging.getLogger()
         self.logger.addHandler(self.queue_handler)
         self.logger.setLevel(logging.INFO)
-        self.logger.addFilter(DuplicateFilter(rate_limit_wait=rate_limit_wait))
+        self.duplicate_filter = DuplicateFilter(rate_limit_wait=rate_limit_wait)
+        self.logger.addFilter(self.duplicate_filter)
 
         self.formatter = logging.Formatter(fmt='%(levelname)s:%(asctime)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -95,6 +96,20 @@ class Logger:
         self.listener = QueueListener(self.log_queue, *handlers)
         
         self.listener.start()
+        self.closed = False
+
+    def close(self) -> None:
+        """
+        Outputs any logs that are still queued, stops the logging thread, and
+        detaches this logger from the root logger. Does nothing if the logger is
+        already closed.
+        """
+        if self.closed:
+            return
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        self.logger.removeFilter(self.duplicate_filter)
+        self.closed = True
 
     def log(self, message: str, level: str = 'info') -> None:
         """
@@ -0,0 +1,186 @@
+from typing import List, Dict, Tuple, Union
+import hashlib
+import sqlite3
+import threading
+import time
+import os
+
+from crec.granule import Granule
+
+
+def file_digest(path: str) -> Union[str, None]:
+    """
+    Returns the SHA-256 digest of a file, or ``None`` if it does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda : f.read(2**20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class Manifest:
+    """
+    A persistent record of the progress of a run, kept in a SQLite database, so that a
+    run that crashed or was interrupted can be resumed without redoing finished work.
+
+    For each date, the manifest records whether its granule identifiers were
+    discovered, for which granule classes, and whether all of its granules were
+    finished. For each granule, it records whether it was discovered, whether it is
+    one of the granules of its date for the granule classes the date was last
+    discovered for, whether it was downloaded, parsed, and written, whether it was complete (see :attr:`.Granule.complete`), and
+    the path and SHA-256 digest of each file that was written. A granule is only
+    considered finished if it was complete and its files are still on disk with the
+    same digests, since finished granules are read back from those files instead of
+    being requested again.
+
+    Parameters
+    ----------
+    path : str
+        The file to keep the manifest in. Created if it does not exist.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS dates (date TEXT PRIMARY KEY, classes TEXT, state TEXT, updated_at REAL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS granules (granule_id TEXT PRIMARY KEY, date TEXT, listed INTEGER, downloaded INTEGER, parsed INTEGER, written INTEGER, complete INTEGER, xml_path TEXT, xml_sha256 TEXT, htm_path TEXT, htm_sha256 TEXT, updated_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS granules_date ON granules (date)')
+        self._db.commit()
+
+    def __repr__(self) -> str:
+        return f'Manifest (path: {self.path})'
+
+    def report(self) -> str:
+        """
+        Returns a summary of how many dates and granules have been finished.
+        """
+        with self._lock:
+            dates = self._db.execute("SELECT COUNT(*), SUM(state = 'complete') FROM dates").fetchone()
+            granules = self._db.execute('SELECT COUNT(*), SUM(complete) FROM granules WHERE listed = 1').fetchone()
+        return f'{dates[1] or 0} of {dates[0]} dates and {granules[1] or 0} of {granules[0]} granules finished'
+
+    @staticmethod
+    def classes_key(classes: List[str]) -> str:
+        """
+        Returns the string that a list of granule classes is stored as.
+        """
+        return ','.join(sorted(classes))
+
+    def discovered(self, date: str, granule_ids: List[str], classes: List[str]) -> None:
+        """
+        Records that all of the granule identifiers of a date with the given granule
+        classes were discovered. If they were discovered for other classes before,
+        the date has to be finished again. Only these granules are listed for the
+        date from now on: the other granules of the date that are in the manifest
+        (from an earlier run with other classes) keep their state and files, but are
+        no longer part of the date.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT classes FROM dates WHERE date = ?', (date,)).fetchone()
+            if row is None or row[0] != self.classes_key(classes):
+                self._db.execute("INSERT OR REPLACE INTO dates VALUES (?, ?, 'discovered', ?)", (date, self.classes_key(classes), now))
+            self._db.execute('UPDATE granules SET listed = 0 WHERE date = ?', (date,))
+            self._db.executemany('INSERT INTO granules (granule_id, date, listed, downloaded, parsed, written, complete, updated_at) VALUES (?, ?, 1, 0, 0, 0, 0, ?) ON CONFLICT (granule_id) DO UPDATE SET listed = 1', [(g_id, date, now) for g_id in granule_ids])
+            self._db.commit()
+
+    def record(self, granules: List[Granule], write: Union[bool, str]) -> None:
+        """
+        Records the state of a list of :class:`.Granule` objects that were just
+        processed, along with the paths and digests of the files that were written
+        for them.
+        """
+        now = time.time()
+        rows = []
+        for granule in granules:
+            xml_path, xml_sha256, htm_path, htm_sha256 = None, None, None, None
+            if granule.written and isinstance(write, str):
+                xml_path, htm_path = granule.write_paths(write=write)
+                xml_sha256, htm_sha256 = file_digest(xml_path), file_digest(htm_path)
+            rows.append((granule.id, granule.id[5:15], int(granule.valid_responses), int(granule.parsed), int(granule.written), int(granule.complete), xml_path, xml_sha256, htm_path, htm_sha256, now))
+
+        with self._lock:
+            self._db.executemany('INSERT INTO granules VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (granule_id) DO UPDATE SET downloaded = excluded.downloaded, parsed = excluded.parsed, written = excluded.written, complete = excluded.complete, xml_path = excluded.xml_path, xml_sha256 = excluded.xml_sha256, htm_path = excluded.htm_path, htm_sha256 = excluded.htm_sha256, updated_at = excluded.updated_at', rows)
+            self._db.commit()
+
+    def finish_dates(self, dates: List[str], incomplete_days: set) -> None:
+        """
+        Marks each date that was discovered, is not in ``incomplete_days``, and has no
+        incomplete granules listed as finished.
+        """
+        now = time.time()
+        with self._lock:
+            for date in dates:
+                if date in incomplete_days:
+                    continue
+                row = self._db.execute('SELECT COUNT(*) FROM granules WHERE date = ? AND listed = 1 AND complete = 0', (date,)).fetchone()
+                if row[0] == 0:
+                    self._db.execute("UPDATE dates SET state = 'complete', updated_at = ? WHERE date = ?", (now, date))
+            self._db.commit()
+
+    def invalidate(self, dates: List[str]) -> None:
+        """
+        Records that the content of some dates has changed since it was finished, so
+        that those dates and their granules are no longer considered finished.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE dates SET state = 'discovered', updated_at = ? WHERE date = ?", [(now, date) for date in dates])
+            self._db.executemany('UPDATE granules SET complete = 0, updated_at = ? WHERE date = ?', [(now, date) for date in dates])
+            self._db.commit()
+
+    def finished_date(self, date: str, classes: List[str]) -> Union[List[str], None]:
+        """
+        Returns the identifiers of the granules listed for a date if the date was
+        finished for the given granule classes, or ``None`` otherwise.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT classes, state FROM dates WHERE date = ?', (date,)).fetchone()
+            if row is None or row[0] != self.classes_key(classes) or row[1] != 'complete':
+                return None
+            return [r[0] for r in self._db.execute('SELECT granule_id FROM granules WHERE date = ? AND listed = 1 ORDER BY rowid', (date,))]
+
+    def discovery_order(self, granule_ids: List[str]) -> Dict[str, int]:
+        """
+        Takes as an input a list of granule identifiers, and returns a mapping from
+        each of them that is in the manifest to its position in the order in which
+        granules were discovered.
+        """
+        with self._lock:
+            rows = []
+            for i in range(0, len(granule_ids), 500):
+                chunk = granule_ids[i:i + 500]
+                rows += self._db.execute(f"SELECT granule_id, rowid FROM granules WHERE granule_id IN ({','.join('?'*len(chunk))})", chunk).fetchall()
+        return dict(rows)
+
+    def finished_files(self, granule_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """
+        Takes as an input a list of granule identifiers, and returns a mapping from
+        the identifiers of the finished granules among them to the paths of their
+        metadata (xml) and text (htm) files. Granules whose files are missing or
+        have changed are left out.
+        """
+        with self._lock:
+            rows = []
+            for i in range(0, len(granule_ids), 500):
+                chunk = granule_ids[i:i + 500]
+                rows += self._db.execute(f"SELECT granule_id, xml_path, xml_sha256, htm_path, htm_sha256 FROM granules WHERE complete = 1 AND written = 1 AND granule_id IN ({','.join('?'*len(chunk))})", chunk).fetchall()
+
+        files = {}
+        for granule_id, xml_path, xml_sha256, htm_path, htm_sha256 in rows:
+            if file_digest(xml_path) == xml_sha256 and file_digest(htm_path) == htm_sha256:
+                files[granule_id] = (xml_path, htm_path)
+        return files
+
+    def close(self) -> None:
+        """
+        Closes the manifest's database.
+        """
+        with self._lock:
+            self._db.close()
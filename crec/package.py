@@ -0,0 +1,210 @@
+from typing import List, Tuple, Union
+import datetime
+import httpx
+import json
+import os
+import time
+
+from crec.api import GovInfoClient
+from crec.logger import Logger
+
+async def get_packages(url: str, params: dict, client: GovInfoClient, logger: Logger, page_size: int = 1000) -> Tuple[bool, List[dict]]:
+    """
+    A function to retrieve a listing of packages from one of the GovInfo API's
+    package listing endpoints (``/collections`` or ``/published``). Takes as an input
+    the endpoint's URL and query parameters, a :class:`.GovInfoClient` object, a
+    :class:`.Logger` object, and the number of packages to request per page (GovInfo
+    allows up to 1000).
+
+    These endpoints are paged with a cursor: each page links to the next one with an
+    ``offsetMark``, so pages are requested one after another. Listings change over
+    time, so they are never served from or stored in the client's cache. Returns a
+    tuple consisting of a boolean indicating whether every page was retrieved, and
+    the packages that were.
+    """
+    packages = []
+    offset_mark = '*'
+    while offset_mark is not None:
+        page_params = dict(params, offsetMark=offset_mark, pageSize=f'{page_size}')
+        packages_resp_validity, packages_resp = await client.get(url, params=page_params, use_cache=False)
+        if not packages_resp_validity:
+            logger.log(f'could not get every page of {url}', level='warning')
+            return False, packages
+
+        packages_json = packages_resp.json()
+        packages += packages_json.get('packages', [])
+
+        next_page = packages_json.get('nextPage', None)
+        offset_mark = httpx.URL(next_page).params.get('offsetMark', None) if next_page else None
+
+    return True, packages
+
+
+async def get_modified_packages(since: str, client: GovInfoClient, logger: Logger) -> Tuple[bool, List[dict]]:
+    """
+    A function to retrieve the CREC packages that were added or modified since a
+    timestamp (in ``YYYY-mm-ddTHH:MM:SSZ`` format), using the ``/collections``
+    endpoint of the GovInfo API.
+    """
+    logger.log(f'getting packages modified since {since}')
+    return await get_packages(url=f'collections/CREC/{since}', params={}, client=client, logger=logger)
+
+
+async def get_published_packages(start_date: str, end_date: str, client: GovInfoClient, logger: Logger, modified_since: str = None) -> Tuple[bool, List[dict]]:
+    """
+    A function to retrieve the CREC packages that were issued between two dates (in
+    ``YYYY-mm-dd`` format), using the ``/published`` endpoint of the GovInfo API. If
+    ``modified_since`` is provided, only packages that were added or modified since
+    that timestamp are included.
+    """
+    logger.log(f'getting packages issued between {start_date} and {end_date}')
+    params = {'collection': 'CREC'}
+    if modified_since is not None:
+        params['modifiedSince'] = modified_since
+    return await get_packages(url=f'published/{start_date}/{end_date}', params=params, client=client, logger=logger)
+
+
+def package_dates(packages: List[dict]) -> List[str]:
+    """
+    Takes as an input a list of CREC packages, and returns the sorted, distinct
+    dates they were issued on.
+    """
+    return sorted(set(p['packageId'][5:15] for p in packages if p.get('packageId', '').startswith('CREC-')))
+
+
+def current_watermark() -> str:
+    """
+    Returns the current time in the ``YYYY-mm-ddTHH:MM:SSZ`` format that the
+    GovInfo API uses for modification timestamps.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def read_watermark(path: str) -> Union[str, None]:
+    """
+    Returns the watermark stored in the file at ``path``: the time at which the last
+    successful sync started. Returns ``None`` if there has not been one.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as watermark_file:
+        return json.load(watermark_file)['watermark']
+
+
+def write_watermark(path: str, watermark: str) -> None:
+    """
+    Stores a watermark in the file at ``path``, replacing the previous one at once so
+    that an interrupted write never leaves a broken file behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'w') as watermark_file:
+        json.dump({'watermark': watermark}, watermark_file)
+    os.replace(path + '.tmp', path)
+
+
+class PackageCalendar:
+    """
+    A calendar of the days on which a CREC package was issued (that is, the days on
+    which Congress was in session), built from the ``/published`` endpoint of the
+    GovInfo API. Consulting it before requesting a date range means that no requests
+    are wasted on recesses or holidays, and that the rare weekend sessions are not
+    missed.
+
+    The calendar is kept one month at a time. If ``path`` is provided, it is stored
+    in a JSON file there and reused across runs; each month is listed again once it
+    is older than ``max_age`` seconds, since packages for recent days may still be
+    being published.
+
+    Parameters
+    ----------
+    path : str = None
+        A file to store the calendar in. Created if it does not exist. If ``path`` is
+        ``None``, the calendar is only kept in memory.
+    max_age : int = 86400
+        The number of seconds a month of the calendar is used for before it is listed
+        again.
+    """
+    def __init__(self, path: str = None, max_age: int = 86400) -> None:
+        self.path = path
+        self.max_age = max_age
+
+        self.months = {}
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path) as calendar_file:
+                self.months = json.load(calendar_file)['months']
+
+    def __repr__(self) -> str:
+        return f'PackageCalendar (path: {self.path})'
+
+    @staticmethod
+    def month_range(start_date: str, end_date: str) -> List[str]:
+        """
+        Returns the months (in ``YYYY-mm`` format) between two date strings.
+        """
+        year, month = int(start_date[:4]), int(start_date[5:7])
+        months = []
+        while f'{year:04d}-{month:02d}' <= end_date[:7]:
+            months.append(f'{year:04d}-{month:02d}')
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
+
+    def is_fresh(self, month: str) -> bool:
+        """
+        Returns whether a month of the calendar can be used without listing it again.
+        """
+        return month in self.months and time.time() - self.months[month]['fetched_at'] < self.max_age
+
+    async def session_dates(self, start_date: str, end_date: str, client: GovInfoClient, logger: Logger) -> Tuple[bool, List[str]]:
+        """
+        Takes as an input two date strings, a :class:`.GovInfoClient` object, and a
+        :class:`.Logger` object. Returns a tuple consisting of a boolean indicating
+        whether the calendar covers the whole range, and the dates between
+        ``start_date`` and ``end_date`` on which a CREC package was issued. Months
+        that are missing or stale are listed with :func:`.get_published_packages`,
+        consecutive months in a single listing.
+        """
+        months = self.month_range(start_date=start_date, end_date=end_date)
+        stale_runs = []
+        for i, month in enumerate(months):
+            if self.is_fresh(month):
+                continue
+            if stale_runs and i > 0 and stale_runs[-1][-1] == months[i - 1]:
+                stale_runs[-1].append(month)
+            else:
+                stale_runs.append([month])
+
+        got_all_months = True
+        for run in stale_runs:
+            run_end = datetime.date(int(run[-1][:4]), int(run[-1][5:7]), 1) + datetime.timedelta(days=31)
+            run_end = run_end.replace(day=1) - datetime.timedelta(days=1)
+            got_all_packages, packages = await get_published_packages(start_date=f'{run[0]}-01', end_date=run_end.strftime('%Y-%m-%d'), client=client, logger=logger)
+            if not got_all_packages:
+                got_all_months = False
+                continue
+
+            fetched_at = time.time()
+            dates = package_dates(packages=packages)
+            for month in run:
+                self.months[month] = {'fetched_at': fetched_at, 'dates': [d for d in dates if d[:7] == month]}
+
+        if stale_runs:
+            self.save()
+
+        dates = []
+        for month in months:
+            if month in self.months:
+                dates += [d for d in self.months[month]['dates'] if start_date <= d <= end_date]
+        return got_all_months, dates
+
+    def save(self) -> None:
+        """
+        Stores the calendar in the file at ``self.path``, if there is one.
+        """
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.tmp', 'w') as calendar_file:
+            json.dump({'months': self.months}, calendar_file)
+        os.replace(self.path + '.tmp', self.path)
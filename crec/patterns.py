@@ -0,0 +1,110 @@
+from typing import List, Tuple, Union
+import functools
+
+from crec.constants import TITLES
+from crec.engine import EnginePattern
+
+# patterns used to clean the text of a granule (see cleaner.clean_htm); runs of
+# newlines or spaces are only matched from their start, so that a search does not
+# retry a pattern at every position of a long run. Every pattern is compiled with the
+# current regular expression engine (see engine.set_engine)
+BULLET = EnginePattern(r'<bullet>')
+TITLE_BLOCK = EnginePattern(r'(?<!\s)\n\n(  )(?!\s)')
+FOOTER = EnginePattern(r'(?<![\n ])[\n ]+____________________\n+')
+INLINE_PAGE_NUMBER = EnginePattern(r'\n\n\[\[Page .+\]\n\n(?=[a-zA-Z0-9])')
+PAGE_NUMBER = EnginePattern(r'\[\[Page .+\]\]')
+TIME = EnginePattern(r'\{time\}\s+\d+')
+NOTE = EnginePattern(r'(?<!\n)\n+ =+ NOTE =+[\s\S]+ END NOTE =+')
+BOTTOM_HTML = EnginePattern(r'(?<!\n)\n+<\/pre><\/body>\n<\/html>')
+SPOKEN_PARAGRAPH = EnginePattern(r'((?<=(\n  ))|(?<=(\n   )))(?P<text>[^\s\(\[][\s\S]*?)(?=(\n  )|(\Z))')
+
+# patterns used to split the text of a granule into passages and paragraphs; the
+# people a speaker speaks for run to the last '):' of the text. After that '):', a
+# ' (for ' can no longer be closed, so speakers are found there without it;
+# otherwise every unclosed ' (for ' would be scanned to the end of the text
+SPEAKER_SUFFIX = r'(\.| led the Pledge of Allegiance as follows:| \(for [\s\S]+\):)( |)'
+UNCLOSED_SPEAKER_SUFFIX = r'(\.| led the Pledge of Allegiance as follows:)( |)'
+LEGISLATION = EnginePattern(r'(^SA \d+\.)|(^S. \d+\.)')
+PARAGRAPH_BREAK = EnginePattern(r'\n\n')
+
+
+class SpeakerMatcher:
+    """
+    Finds where any of a granule's speakers begins speaking (see
+    :func:`.patterns.speaker_matcher`).
+
+    Parameters
+    ----------
+    names : Tuple[str, ...]
+        The search strings of the speakers (see :attr:`.Speaker.re_search`), in the
+        order they should be tried.
+
+    Attributes
+    ----------
+    pattern : :class:`.EnginePattern`
+        Matches any of the speakers, followed by ``SPEAKER_SUFFIX``. The speaker
+        that matched is the pattern's last group, named after its position in
+        ``names`` (``s0``, ``s1``, ...).
+    unclosed : :class:`.EnginePattern`
+        The same, followed by ``UNCLOSED_SPEAKER_SUFFIX``.
+    """
+    def __init__(self, names: Tuple[str, ...]) -> None:
+        self.pattern = EnginePattern('|'.join(f'(?P<s{i}>{name}{SPEAKER_SUFFIX})' for i, name in enumerate(names)))
+        self.unclosed = EnginePattern('|'.join(f'(?P<s{i}>{name}{UNCLOSED_SPEAKER_SUFFIX})' for i, name in enumerate(names)))
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Returns a tuple for each place in ``text`` where a speaker begins speaking,
+        consisting of where the match starts, where it ends, and the name of the
+        speaker's group. The matches are the same as those of
+        :meth:`re.Pattern.finditer` with ``self.pattern``, but the text after its
+        last ``'):'`` is searched with ``self.unclosed``, so that finding speakers
+        takes time linear in the length of the text.
+        """
+        last_close = text.rfind('):')
+        boundary = last_close + 2 if last_close >= 0 else 0
+        matches = []
+        for match in self.pattern.finditer(text, 0, boundary):
+            end = match.end()
+            # the space that would follow the '):' is past the boundary
+            if end == boundary and text.startswith(' ', end):
+                end += 1
+            matches.append((match.start(), end, match.lastgroup))
+        tail_start = matches[-1][1] if matches and matches[-1][1] > boundary else boundary
+        matches += [(match.start(), match.end(), match.lastgroup) for match in self.unclosed.finditer(text, tail_start)]
+        return matches
+
+
+@functools.lru_cache(maxsize=256)
+def speaker_matcher(names: Tuple[str, ...]) -> SpeakerMatcher:
+    """
+    Takes as an input the search strings of a granule's speakers (see
+    :attr:`.Speaker.re_search`), in the order they should be tried, and returns a
+    :class:`.SpeakerMatcher` that finds where any of them begins speaking.
+
+    Matchers are cached by ``names``, so granules with the same speakers (such as
+    the granules of a chamber on a given day) share one.
+    """
+    return SpeakerMatcher(names=names)
+
+
+TITLE_PATTERNS = [EnginePattern(t) for t in TITLES]
+
+# after the last ')' of a text, no title's parenthetical can be closed, so there the
+# parentheticals stop at the next '(' instead (which does not change what matches);
+# otherwise every unclosed parenthetical would be scanned to the end of the text
+UNCLOSED_TITLE_PATTERNS = [EnginePattern(t.replace('[^)]*', '[^()]*')) for t in TITLES]
+
+
+def find_titles(text: str) -> List[Union[str, Tuple[str, ...]]]:
+    """
+    Finds the titles of titled speakers (see :data:`.constants.TITLES`) in a text.
+    Returns the same matches, in the same order, as calling :func:`re.findall` with
+    each title in turn, with patterns that are compiled once (see
+    ``TITLE_PATTERNS``) instead of on every call. The text after its last closing
+    parenthesis, where no parenthetical can be closed, is searched with
+    ``UNCLOSED_TITLE_PATTERNS``, so that finding titles takes time linear in the
+    length of the text.
+    """
+    last_close = text.rfind(')') + 1
+    return [match for pattern, unclosed in zip(TITLE_PATTERNS, UNCLOSED_TITLE_PATTERNS) for match in pattern.findall(text, 0, last_close) + unclosed.findall(text, last_close)]
@@ -0,0 +1,120 @@
+from typing import List
+import math
+
+from crec.constants import GRANULE_SIZES, MODS_SIZE, ZIPPED_GRANULE_SIZE, ZIPPED_MODS_SIZE, DIRECTORY_ENTRY_SIZE, SUMMARY_SIZE, LISTING_PAGE_SIZE, ZIP_TAIL_SIZE, REQUEST_COST
+
+
+class DatePlan:
+    """
+    The plan for retrieving the granules of a single date, made by a
+    :class:`.Planner`.
+
+    Attributes
+    ----------
+    date : str
+        The date the plan is for.
+    zipped : bool
+        Whether the date's granules are to be requested in its zipped file, as
+        opposed to one at a time.
+    ranges : bool
+        Whether only the needed parts of the date's zipped file are to be requested,
+        with HTTP range requests. Only ``True`` if ``zipped`` is.
+    granule_ids : List[str]
+        The identifiers of the granules that are wanted from the date.
+    requests : int
+        The estimated number of requests the plan takes, including those that
+        listed the date's granules.
+    estimated_bytes : int
+        The estimated number of bytes the plan downloads, including the listing of
+        the date's granules.
+    """
+    def __init__(self, date: str, zipped: bool, granule_ids: List[str], requests: int, estimated_bytes: int, ranges: bool = False) -> None:
+        self.date = date
+        self.zipped = zipped
+        self.ranges = ranges
+        self.granule_ids = granule_ids
+        self.requests = requests
+        self.estimated_bytes = estimated_bytes
+
+    def __repr__(self) -> str:
+        return f'DatePlan (date: {self.date}, zipped: {self.zipped}, ranges: {self.ranges}, requests: {self.requests}, estimated bytes: {self.estimated_bytes})'
+
+
+class Planner:
+    """
+    Chooses, for each date, whether to request its granules in a zipped file or one
+    at a time, whichever is estimated to cost less. A zipped file takes a single
+    request, but holds every granule of the date, wanted or not; requesting
+    granules one at a time takes two requests (metadata and text) per wanted
+    granule, but nothing else is downloaded. The cost of a plan is the number of
+    bytes it downloads plus ``request_cost`` bytes for each request it makes, so
+    that a narrow filter (only ``DAILYDIGEST`` granules, say) favors individual
+    requests, and a broad one favors zipped files. The size of each granule is
+    estimated from its class, since GovInfo does not list sizes.
+
+    If ``ranges`` is ``True``, zipped files are read with HTTP range requests (see
+    :class:`.RemoteZip`), so a zipped file costs a request for the end of the file
+    (and one more for its listing of files, if it is too long to fit in the end), a
+    request for its metadata, and a request for each run of wanted granules that
+    are next to each other, but only the wanted granules are downloaded. Either way,
+    the plan includes the requests that listed the date's granules, which every
+    option has already paid for.
+
+    Parameters
+    ----------
+    request_cost : int = 50000
+        The number of bytes that one request is considered to be worth. Raise it to
+        save API requests; lower it to save bandwidth.
+    ranges : bool = False
+        Whether zipped files are read with HTTP range requests.
+    """
+    def __init__(self, request_cost: int = REQUEST_COST, ranges: bool = False) -> None:
+        self.request_cost = request_cost
+        self.ranges = ranges
+
+    def __repr__(self) -> str:
+        return f'Planner (request cost: {self.request_cost}, ranges: {self.ranges})'
+
+    def plan_date(self, date: str, summaries: List[dict], granule_ids: List[str], zip_on_disk: bool = False) -> DatePlan:
+        """
+        Takes as an input a date string, the summaries of all of the date's granules
+        from the ``/granules`` endpoint of the GovInfo API, the identifiers of the
+        granules that are wanted, and whether the date's zipped file was already
+        saved by an earlier run. Returns the cheaper :class:`.DatePlan`.
+        """
+        wanted = set(granule_ids)
+        listing_requests = max(math.ceil(len(summaries)/LISTING_PAGE_SIZE), 1)
+        listing_bytes = len(summaries)*SUMMARY_SIZE
+
+        text_bytes = sum(GRANULE_SIZES.get(g['granuleClass'], ZIPPED_GRANULE_SIZE) for g in summaries if g['granuleId'] in wanted)
+        individual_requests = 2*len(granule_ids)
+        individual_bytes = len(granule_ids)*MODS_SIZE + text_bytes
+
+        ranges = self.ranges and not zip_on_disk
+        if zip_on_disk:
+            zipped_requests, zipped_bytes = 0, 0
+        elif ranges:
+            runs = sum(1 for i, g in enumerate(summaries) if g['granuleId'] in wanted and (i == 0 or summaries[i - 1]['granuleId'] not in wanted))
+            directory_requests = 1 if len(summaries)*DIRECTORY_ENTRY_SIZE > ZIP_TAIL_SIZE else 0
+            zipped_requests = 2 + directory_requests + runs
+            zipped_bytes = ZIP_TAIL_SIZE + directory_requests*len(summaries)*DIRECTORY_ENTRY_SIZE + len(summaries)*ZIPPED_MODS_SIZE + text_bytes
+        else:
+            zipped_requests, zipped_bytes = 1, len(summaries)*ZIPPED_GRANULE_SIZE
+
+        if zipped_requests*self.request_cost + zipped_bytes <= individual_requests*self.request_cost + individual_bytes and granule_ids:
+            return DatePlan(date=date, zipped=True, ranges=ranges, granule_ids=granule_ids, requests=listing_requests + zipped_requests, estimated_bytes=listing_bytes + zipped_bytes)
+        return DatePlan(date=date, zipped=False, granule_ids=granule_ids, requests=listing_requests + individual_requests, estimated_bytes=listing_bytes + individual_bytes)
+
+    @staticmethod
+    def report(plans: List[DatePlan]) -> str:
+        """
+        Returns a summary of a list of :class:`.DatePlan` objects: how many dates
+        are requested in zipped files (and how many of those with range requests)
+        and how many one granule at a time, and the estimated number of requests and
+        bytes.
+        """
+        zipped_dates = sum(p.zipped for p in plans)
+        ranged_dates = sum(p.ranges for p in plans)
+        requests = sum(p.requests for p in plans)
+        estimated_megabytes = sum(p.estimated_bytes for p in plans)/2**20
+        return f'{zipped_dates} dates in zipped files ({ranged_dates} with range requests) and {len(plans) - zipped_dates} dates one granule at a time; about {requests} requests and {estimated_megabytes:.1f} MB'
@@ -1,13 +1,20 @@
-from typing import List, Set, Union
+from typing import List, Set, Union, Iterator, AsyncIterator
 import datetime
 import functools
+import asyncio
 
 # TODO: add jupyter notebook tutorial/guide
 
+from crec.api import GovInfoClient
 from crec.granule import Granule
 from crec.downloader import Downloader
+from crec.filters import GranuleFilter
 from crec.logger import Logger
-from crec.text import PassageCollection, ParagraphCollection
+from crec.cache import ResponseCache
+from crec.manifest import Manifest
+from crec.package import PackageCalendar
+from crec.session import Session
+from crec.text import Passage, PassageCollection, ParagraphCollection
 
 def validate_date(date, param_name):
     if isinstance(date, str):
@@ -22,7 +29,7 @@ def validate_date(date, param_name):
     
     return date.strftime('%Y-%m-%d')
 
-def generate_date_range(start_date: str, end_date: str) -> List[str]:
+def generate_date_range(start_date: str, end_date: str, skip_weekends: bool = True) -> List[str]:
     dates = []
     start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d')
     end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d')
@@ -30,7 +37,7 @@ def generate_date_range(start_date: str, end_date: str) -> List[str]:
 
     for i in range(delta.days + 1):
         day = start_date + datetime.timedelta(days=i)
-        if day.weekday() not in [5, 6]:
+        if not skip_weekends or day.weekday() not in [5, 6]:
             dates += [datetime.datetime.strftime(day, '%Y-%m-%d')]
 
     return dates
@@ -65,6 +72,12 @@ class Record:
         * ``EXTENSIONS``
         * ``DAILYDIGEST``
     
+    granule_filter : :class:`.GranuleFilter` = None
+        If provided, only granules that pass ``granule_filter`` (by date, chamber,
+        speaker, or title) will be retrieved. The filter is checked as early as
+        possible: before a granule's text is requested, read from a zipped file, or
+        parsed. Like ``granule_class_filter``, it is ignored when granule
+        identifiers are requested directly.
     parse : bool = True
         A boolean that indicates whether or not the text of granules should be parsed.
         See :meth:`.Granule.parse_htm()` for more information.
@@ -72,10 +85,48 @@ class Record:
         If ``write`` is ``False``, then granule text (htm files) and metadata (xml files)
         will not be written to disk. Otherwise, ``write`` should be a path where those
         files should be written to.
-    zipped : bool = True
+    zipped : Union[bool, str] = True
         Determines if granules should be requested individually or in zips. Only applies
         to calls where dates are used; if you are requesting individual granule
-        identifiers, granules are always requested individually.
+        identifiers, granules are always requested individually. If ``zipped`` is
+        ``'auto'``, each date's granules are listed first, and a :class:`.Planner`
+        chooses whichever is estimated to cost less for that date, given the
+        granule class filter and granule filter; the plan is logged before it is
+        carried out.
+    zip_directory : str = None
+        Only applies when granules are requested in zips. If provided, zipped files
+        are saved to this directory, and zipped files that were saved in a previous
+        run are reused instead of being requested again. Otherwise, zipped files are
+        streamed to temporary files that are deleted once they have been read.
+    ranges : bool = False
+        Only applies when granules are requested in zips. If ``ranges`` is ``True``,
+        only the parts of each zipped file that are needed are requested, with HTTP
+        range requests: the listing of its files, its metadata, and the text of the
+        granules that pass the granule class filter and granule filter. The parts
+        are not saved to ``zip_directory``. If the server does not support range
+        requests, the whole zipped file is requested instead. If ``zipped`` is
+        ``'auto'``, the planner prices zipped files as range requests. Otherwise,
+        ``ranges`` should be ``False``, and whole zipped files are requested.
+    pipeline : Union[bool, int] = False
+        Only applies when granules are requested in zips. If ``pipeline`` is an
+        ``int``, zipped files are downloaded while earlier ones are parsed and
+        written, with at most ``pipeline`` downloaded files waiting to be processed
+        at a time; downloads are scheduled as if ``scheduler`` were ``'window'``.
+        Otherwise, ``pipeline`` should be ``False``, and all zipped files are
+        downloaded before any of them are processed.
+    workers : Union[bool, int] = False
+        If ``workers`` is an ``int``, granules are parsed in a pool of ``workers``
+        processes, so that parsing can use several CPU cores. As with any use of
+        :mod:`multiprocessing`, scripts that set ``workers`` should do so under an
+        ``if __name__ == '__main__':`` guard. Otherwise, ``workers`` should be
+        ``False``, and granules are parsed in this process.
+    parse_budget : Union[bool, float] = False
+        If ``parse_budget`` is a number, parsing a single granule is abandoned at the
+        first check after it has taken ``parse_budget`` seconds, and its
+        ``parse_exception`` is set to a :class:`.ParseTimeoutError`. The budget is
+        checked between the steps of a parse, so a step that runs past it finishes
+        first (see :meth:`.Granule.parse_responses()`). Otherwise, ``parse_budget``
+        should be ``False``, and granules are parsed for as long as it takes.
     batch_size: int = 3
         The number of request to asynchronously send at the same time. Too high of a 
         number will result in frequent rate limit issues. When requesting zip files,
@@ -88,6 +139,16 @@ class Record:
         after each batch. When requesting zip files, a ``batch_wait`` is not necessary.
         When requesting files individually, the ``batch_wait`` should be around 2-5
         seconds.
+    scheduler : str = 'batch'
+        Determines how requests are scheduled. If ``scheduler`` is ``'batch'``,
+        requests are sent in batches of size ``batch_size``, and each batch must
+        finish before the next one starts. If ``scheduler`` is ``'window'``,
+        ``batch_size`` requests are kept in flight at all times, and a new request is
+        started as soon as any other finishes; ``batch_wait`` is ignored.
+    fail_fast : bool = False
+        Only applies when granules are requested individually. If ``fail_fast`` is
+        ``True``, then as soon as either the metadata or the text request for a
+        granule has failed for good, the other request is cancelled.
     rate_limit_wait : Union[int, bool] = 300
         If ``rate_limit_wait`` is an ``int``, then exceeding the GovInfo rate limit 
         will cause the program to halt for ``rate_limit_wait`` seconds. Otherwise, 
@@ -97,9 +158,70 @@ class Record:
         If ``retry_limit`` is an ``int``, then the program will attempt to request
         URLs up to ``retry_limit`` times before moving on. Otherwise, ``retry_limit``
         should be ``False``, and URLs will only be tried once.
-    api_key : str = None
+    defer_wait : Union[bool, int] = 30
+        If ``defer_wait`` is an ``int``, granules and zipped files that GovInfo is
+        still generating (it answers ``503`` while it does) are set aside instead of
+        holding up a request slot, and requested again once the others are finished,
+        no sooner than ``defer_wait`` seconds after they were set aside (up to
+        ``retry_limit`` times). Otherwise, ``defer_wait`` should be ``False``, and
+        requests wait for them in place.
+    cache : Union[bool, str, :class:`.ResponseCache`] = False
+        If ``cache`` is a path, responses from GovInfo are cached on disk in that
+        directory, and reused in later runs instead of being requested again. For more
+        control (a size limit, revalidation, or offline use), ``cache`` can also be a
+        :class:`.ResponseCache` object. Otherwise, ``cache`` should be ``False``, and
+        nothing is cached.
+    calendar : Union[bool, str, :class:`.PackageCalendar`] = False
+        If ``calendar`` is ``True`` or a path, a :class:`.PackageCalendar` of the days
+        on which a CREC package was issued is consulted before any date is requested,
+        and dates without a package are skipped; if it is a path, the calendar is
+        stored there and reused across runs. A range from ``start_date`` to
+        ``end_date`` then includes weekends, so that weekend sessions are not missed.
+        ``calendar`` can also be a :class:`.PackageCalendar` object. Otherwise,
+        ``calendar`` should be ``False``, and every weekday in a range is requested.
+    resume : Union[bool, str, :class:`.Manifest`] = False
+        If ``resume`` is a path, the progress of the run is recorded in a
+        :class:`.Manifest` at that path, and work that was finished by an earlier run
+        with the same manifest is skipped: finished granules whose files are still in
+        the directory they were written to are read from there instead of being
+        requested again, and finished dates are not requested at all. Only granules
+        that were written to disk can be skipped. ``resume`` can also be a
+        :class:`.Manifest` object. Otherwise, ``resume`` should be ``False``.
+    api_key : Union[str, List[str]] = None
         API key from GovInfo. Can be obtained by visiting 
-        https://www.govinfo.gov/api-signup
+        https://www.govinfo.gov/api-signup. If a list of keys is provided, requests
+        are spread across them, and each key's rate limit is tracked on its own (see
+        :class:`.KeyPool`).
+    client : :class:`.GovInfoClient` = None
+        If provided, requests are made with ``client`` instead of a new
+        :class:`.GovInfoClient`, and ``rate_limit_wait``, ``retry_limit``, ``cache``,
+        and ``api_key`` are ignored. The client is never closed by the record.
+        Meant to be used with :func:`.fetch` and :func:`.aiter_granules`, which run
+        on the caller's event loop.
+    session : :class:`.Session` = None
+        If provided, the record borrows the client, event loop thread, and logger of
+        ``session`` instead of creating its own, and leaves them open once it is
+        done with them. ``rate_limit_wait``, ``retry_limit``, ``cache``, ``api_key``,
+        ``print_logs``, ``write_logs``, and ``write_path`` are then ignored.
+    sync : str = None
+        If provided, the record only contains the dates whose CREC packages were
+        added or modified since the last sync, according to GovInfo, and ``sync`` is
+        the path of the file that the time of the last successful sync (the
+        watermark) is kept in. If dates are also provided, only packages issued
+        between the first and last of them are included, weekends included; the
+        first sync, when there is no watermark yet, must provide dates, and includes
+        every package issued between them. What earlier runs kept about changed dates
+        (cached responses, zipped files, and progress in the ``resume`` manifest) is
+        discarded before they are requested again. The watermark only moves forward
+        if everything was retrieved. Does not apply to granule identifiers, to
+        ``read_directory``, or to streaming.
+    stream : bool = False
+        If ``stream`` is ``True``, nothing is retrieved when the record is created.
+        Instead, granules are retrieved day by day as they are consumed from
+        :meth:`.Record.iter_granules()` or :meth:`.Record.iter_passages()` (or their
+        asynchronous counterparts), and are not kept by the record, so that memory
+        use does not grow with the length of the date range. Only applies to dates
+        and granule identifiers.
     print_logs : bool
         A boolean that determines whether or not logs are printed to stdout.
     write_logs : bool
@@ -123,26 +245,43 @@ class Record:
         granule_ids: List[str] = None,
         read_directory : str = None,
         granule_class_filter: List[str] = None,
+        granule_filter: GranuleFilter = None,
         parse: bool = True,
         write: Union[bool, str] = False,
-        zipped: bool = True,
+        zipped: Union[bool, str] = True,
+        zip_directory: str = None,
+        ranges: bool = False,
+        pipeline: Union[bool, int] = False,
+        workers: Union[bool, int] = False,
+        parse_budget: Union[bool, float] = False,
         batch_size: int = 3,
         batch_wait: Union[int, bool] = False,
+        scheduler: str = 'batch',
+        fail_fast: bool = False,
         rate_limit_wait: Union[int, bool] = 30,
         retry_limit: Union[bool, int] = 5,
-        api_key: str = None,
+        defer_wait: Union[bool, int] = 30,
+        cache: Union[bool, str, ResponseCache] = False,
+        calendar: Union[bool, str, PackageCalendar] = False,
+        resume: Union[bool, str, Manifest] = False,
+        api_key: Union[str, List[str]] = None,
+        client: GovInfoClient = None,
+        session: Session = None,
+        sync: str = None,
+        stream: bool = False,
         print_logs: bool = True,
         write_logs: bool = False,
         write_path: str = None
     ) -> None:
-        self.logger = Logger(rate_limit_wait=rate_limit_wait, print_logs=print_logs, write_logs=write_logs, write_path=write_path)
-        self.downloader = Downloader(granule_class_filter=granule_class_filter, parse=parse, write=write, zipped=zipped, batch_size=batch_size, batch_wait=batch_wait, rate_limit_wait=rate_limit_wait, retry_limit=retry_limit, api_key=api_key, logger=self.logger)
+        if sync is not None and (granule_ids is not None or read_directory is not None):
+            raise ValueError("sync only applies to dates")
+        self._sync = sync
 
         if start_date is not None or end_date is not None or dates is not None:
             if start_date is not None and end_date is not None and dates is None:
                 start_date = validate_date(date=start_date, param_name='start date')
                 end_date = validate_date(date=end_date, param_name='end date')
-                dates = generate_date_range(start_date=start_date, end_date=end_date)
+                dates = generate_date_range(start_date=start_date, end_date=end_date, skip_weekends=calendar is False)
 
             elif start_date is None and end_date is None and dates is not None:
                 dates = [validate_date(date=d, param_name='each date in dates') for d in dates]
@@ -150,24 +289,175 @@ class Record:
             else:
                 raise ValueError("Must specify a start date and an end date or a list of dates")
 
-            self.granules = self.downloader.get_from_dates(dates=dates)
+            self._dates, self._granule_ids = dates, None
             
         elif granule_ids is not None:
-            self.granules = self.downloader.get_from_ids(granule_ids=granule_ids)
+            self._dates, self._granule_ids = None, granule_ids
 
         elif read_directory is not None:
-            self.granules = self.downloader.get_from_directory(directory=read_directory)
+            if stream:
+                raise ValueError("stream only applies to dates and granule ids")
+            self._dates, self._granule_ids = None, None
+
+        elif sync is not None:
+            self._dates, self._granule_ids = None, None
 
         else:
             raise ValueError("Must specify a start date and an end date or a list of dates or a list of granule ids or a path to a directory")
 
+        self.session = session
+        if self.session is not None:
+            if client is not None:
+                raise ValueError("Must specify a client or a session, not both")
+            if self.session.closed:
+                raise ValueError("Cannot borrow a session that is closed")
+            self.logger = self.session.logger
+            client, loop_handler = self.session.client, self.session.loop_handler
+        else:
+            self.logger = Logger(rate_limit_wait=rate_limit_wait, print_logs=print_logs, write_logs=write_logs, write_path=write_path)
+            loop_handler = None
+
+        self.granules = []
         self._passage_collection = PassageCollection()
+        self.stream = stream
+
+        self.downloader = None
+        try:
+            self.downloader = Downloader(granule_class_filter=granule_class_filter, granule_filter=granule_filter, parse=parse, write=write, zipped=zipped, batch_size=batch_size, batch_wait=batch_wait, rate_limit_wait=rate_limit_wait, retry_limit=retry_limit, api_key=api_key, logger=self.logger, scheduler=scheduler, fail_fast=fail_fast, defer_wait=defer_wait, cache=cache, zip_directory=zip_directory, ranges=ranges, pipeline=pipeline, workers=workers, parse_budget=parse_budget, calendar=calendar, resume=resume, client=client, loop_handler=loop_handler)
+            if not self.stream:
+                if self._sync is not None:
+                    granules = self.downloader.sync(watermark_path=self._sync, dates=self._dates)
+                elif self._dates is not None:
+                    granules = self.downloader.get_from_dates(dates=self._dates)
+                elif self._granule_ids is not None:
+                    granules = self.downloader.get_from_ids(granule_ids=self._granule_ids)
+                else:
+                    granules = self.downloader.get_from_directory(directory=read_directory)
+                self._set_granules(granules=granules)
+        except BaseException:
+            # nothing that was started for the record is left running
+            self.close()
+            raise
+
+    async def _async_get(self) -> None:
+        """
+        Retrieves the granules of a record that was created with ``stream=True`` on
+        the running event loop, and keeps them as if the record had been created with
+        ``stream=False``. Used by :func:`.fetch`.
+        """
+        if self._sync is not None:
+            granules = await self.downloader.async_sync(watermark_path=self._sync, dates=self._dates)
+        elif self._dates is not None:
+            granules = await self.downloader.async_get_from_dates(dates=self._dates)
+        else:
+            granules = await self.downloader.async_get_from_ids(granule_ids=self._granule_ids)
+        self.stream = False
+        self._set_granules(granules=granules)
+
+    def _set_granules(self, granules: List[Granule]) -> None:
+        """
+        Keeps the retrieved granules and their passages, then closes the record.
+        """
+        self.granules = granules
+        for g in self.granules:
+            self._passage_collection.merge(g.passages)
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the threads and processes used to retrieve granules: the downloader's
+        worker processes and event loop thread, if they were started, and the logging
+        thread. Anything borrowed from a :class:`.Session` is left open. Called
+        automatically once all granules have been retrieved, or once a streaming
+        record has been iterated over.
+        """
+        if self.downloader is not None:
+            self.downloader.close()
+        if self.session is None:
+            self.logger.close()
+
+    def iter_granules(self, prefetch: int = 1) -> Iterator[Granule]:
+        """
+        Yields the record's :class:`.Granule` objects. If the record was created with
+        ``stream=True``, granules are retrieved one day at a time, and each day's
+        granules are yielded as soon as that day is finished, while the next
+        ``prefetch`` days are retrieved in the background. Granules are not kept by
+        the record once they have been yielded. A streaming record can only be
+        iterated over once.
+
+        Parameters
+        ----------
+        prefetch : int = 1
+            The number of days to retrieve ahead of the day being consumed.
+        """
+        if not self.stream:
+            yield from self.granules
+            return
+        if self._sync is not None:
+            raise ValueError("sync does not apply to streaming records")
+
+        try:
+            yield from self.downloader.iter_granules(dates=self._dates, granule_ids=self._granule_ids, prefetch=prefetch)
+        finally:
+            self.close()
+
+    async def aiter_granules(self, prefetch: int = 1) -> AsyncIterator[Granule]:
+        """
+        The asynchronous counterpart of :meth:`.Record.iter_granules()`. Granules are
+        retrieved on the running event loop instead of in a separate thread.
+
+        Parameters
+        ----------
+        prefetch : int = 1
+            The number of days to retrieve ahead of the day being consumed.
+        """
+        if not self.stream:
+            for granule in self.granules:
+                yield granule
+            return
+        if self._sync is not None:
+            raise ValueError("sync does not apply to streaming records")
+        if self.session is not None:
+            raise ValueError("A streaming record that borrows a session can only be iterated over with iter_granules()")
 
-        if self.granules is not None:
-            for g in self.granules:
-                self._passage_collection.merge(g.passages)
+        granules = self.downloader.aiter_granules(dates=self._dates, granule_ids=self._granule_ids, prefetch=prefetch)
+        try:
+            async for granule in granules:
+                yield granule
+        finally:
+            await granules.aclose()
+            self.close()
+
+    def iter_passages(self, prefetch: int = 1) -> Iterator[Passage]:
+        """
+        Yields the :class:`.Passage` objects of each granule from
+        :meth:`.Record.iter_granules()`.
 
-        self.logger.listener.stop()
+        Parameters
+        ----------
+        prefetch : int = 1
+            The number of days to retrieve ahead of the day being consumed.
+        """
+        for granule in self.iter_granules(prefetch=prefetch):
+            yield from granule.passages
+
+    async def aiter_passages(self, prefetch: int = 1) -> AsyncIterator[Passage]:
+        """
+        Asynchronously yields the :class:`.Passage` objects of each granule from
+        :meth:`.Record.aiter_granules()`.
+
+        Parameters
+        ----------
+        prefetch : int = 1
+            The number of days to retrieve ahead of the day being consumed.
+        """
+        granules = self.aiter_granules(prefetch=prefetch)
+        try:
+            async for granule in granules:
+                for passage in granule.passages:
+                    yield passage
+        finally:
+            await granules.aclose()
 
     @property
     def incomplete_days(self) -> Set[str]:
@@ -207,4 +497,62 @@ class Record:
 
     @property
     def paragraphs(self) -> ParagraphCollection:
-        return self._passage_collection.paragraphs
\ No newline at end of file
+        return self._passage_collection.paragraphs
+
+
+async def fetch(client: GovInfoClient = None, **kwargs) -> Record:
+    """
+    The asynchronous counterpart of creating a :class:`.Record`: takes the same
+    parameters, and returns a record whose granules have been retrieved. Requests run
+    on the caller's event loop, so no thread is started, and can share the caller's
+    ``client``, which is left open. If a ``session`` is provided instead, requests run
+    on the session's event loop, and are awaited from the caller's. Granules read
+    from a ``read_directory`` are read in a separate thread.
+
+    Parameters
+    ----------
+    client : :class:`.GovInfoClient` = None
+        If provided, requests are made with ``client`` instead of a new
+        :class:`.GovInfoClient`.
+    **kwargs
+        Any other parameters of :class:`.Record`, except ``stream``.
+    """
+    if kwargs.get('read_directory', None) is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(Record, client=client, **kwargs))
+
+    record = Record(client=client, stream=True, **kwargs)
+    try:
+        if record.session is not None:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(record._async_get(), record.session.loop_handler.loop))
+        else:
+            await record._async_get()
+    except BaseException:
+        record.close()
+        raise
+    return record
+
+
+async def aiter_granules(client: GovInfoClient = None, prefetch: int = 1, **kwargs) -> AsyncIterator[Granule]:
+    """
+    Asynchronously yields :class:`.Granule` objects one day at a time, as
+    :meth:`.Record.aiter_granules()` does for a record created with ``stream=True``.
+    Requests run on the caller's event loop and can share the caller's ``client``.
+
+    Parameters
+    ----------
+    client : :class:`.GovInfoClient` = None
+        If provided, requests are made with ``client`` instead of a new
+        :class:`.GovInfoClient`.
+    prefetch : int = 1
+        The number of days to retrieve ahead of the day being consumed.
+    **kwargs
+        Any other parameters of :class:`.Record`, except ``stream``,
+        ``read_directory``, and ``session``.
+    """
+    record = Record(client=client, stream=True, **kwargs)
+    granules = record.aiter_granules(prefetch=prefetch)
+    try:
+        async for granule in granules:
+            yield granule
+    finally:
+        await granules.aclose()
@@ -0,0 +1,297 @@
+from typing import List, Dict, Tuple, Union, BinaryIO
+import asyncio
+import struct
+import zipfile
+import zlib
+import httpx
+
+from crec.api import GovInfoClient
+from crec.constants import ZIP_TAIL_SIZE
+
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4sHHHHIIH')
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct('<4sIQI')
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4sQHHIIQQQQ')
+CENTRAL_DIRECTORY_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+LOCAL_FILE_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+
+class RemoteMember:
+    """
+    A member of a :class:`.RemoteZip`, as described by the zip's central directory.
+
+    Attributes
+    ----------
+    name : str
+        The member's name.
+    method : int
+        The member's compression method (``0`` for stored, ``8`` for deflated).
+    crc : int
+        The CRC-32 of the member's uncompressed content.
+    compressed_size : int
+        The size of the member's compressed content, in bytes.
+    size : int
+        The size of the member's uncompressed content, in bytes.
+    offset : int
+        The offset of the member's local file header within the zip.
+    """
+    def __init__(self, name: str, method: int, crc: int, compressed_size: int, size: int, offset: int, header_size: int) -> None:
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compressed_size = compressed_size
+        self.size = size
+        self.offset = offset
+        self._header_size = header_size
+
+    def __repr__(self) -> str:
+        return f'RemoteMember (name: {self.name})'
+
+    @property
+    def end(self) -> int:
+        """
+        An upper bound on the offset just past the member's compressed content,
+        assuming its local header is no larger than its central directory entry.
+        """
+        return self.offset + self._header_size + self.compressed_size
+
+
+class RemoteZip:
+    """
+    Reads individual members of a zipped file on a server that supports HTTP range
+    requests, without downloading the rest of it. The end of the zip is requested
+    first, to find its central directory (the listing of its members, which is
+    requested as well if it did not fit in the end); after that, each member is
+    requested on its own, and members that are close together are requested in a
+    single range. Members can be stored or deflated, and their CRC-32 is checked.
+
+    A :class:`.RemoteZip` should be created with :meth:`.RemoteZip.open()`, which
+    falls back to a full download if the server ignores range requests.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the zipped file, relative to GovInfo's non-API root.
+    client : :class:`.GovInfoClient`
+        The client that ranges are requested with.
+    size : int
+        The size of the zipped file, in bytes.
+    members : List[:class:`.RemoteMember`]
+        The members listed in the zip's central directory.
+    """
+    def __init__(self, url: str, client: GovInfoClient, size: int, members: List[RemoteMember]) -> None:
+        self.url = url
+        self.client = client
+        self.size = size
+        self.members = {m.name: m for m in members}
+        self.requests = 0
+        self.downloaded_bytes = 0
+
+    def __repr__(self) -> str:
+        return f'RemoteZip (url: {self.url}, members: {len(self.members)})'
+
+    def namelist(self) -> List[str]:
+        """
+        Returns the names of the zip's members, like :meth:`zipfile.ZipFile.namelist()`.
+        """
+        return list(self.members)
+
+    @classmethod
+    async def open(cls, url: str, client: GovInfoClient, file: BinaryIO, tail_size: int = ZIP_TAIL_SIZE, defer: bool = False) -> Tuple[bool, Union[httpx.Response, None], Union['RemoteZip', None]]:
+        """
+        Takes as an input the URL of a zipped file (relative to GovInfo's non-API
+        root), a :class:`.GovInfoClient`, a binary ``file``, and the number of bytes
+        to request from the end of the zip at first. Returns a tuple consisting of a
+        boolean indicating whether or not the requests were successful, the last
+        response, and a :class:`.RemoteZip` object. If the server ignores the range
+        request and sends the whole zip instead, it is streamed into ``file`` and
+        ``None`` is returned in place of the :class:`.RemoteZip` object. ``defer`` is
+        passed on to :meth:`.GovInfoClient.get()`.
+
+        Raises :class:`zipfile.BadZipFile` if the zip's central directory cannot be
+        read, including when a response is too short to hold it.
+        """
+        response_validity, response = await client.get(url=url, use_api=False, file=file, use_cache=False, headers={'Range': f'bytes=-{tail_size}'}, defer=defer)
+        if response_validity is not True or response.status_code != 206:
+            return response_validity, response, None
+
+        size = cls.total_size(response=response)
+        tail = response.content
+        tail_offset = size - len(tail)
+        remote_zip = cls(url=url, client=client, size=size, members=[])
+        remote_zip.requests, remote_zip.downloaded_bytes = 1, len(tail)
+
+        eocd_index = tail.rfind(b'PK\x05\x06')
+        if eocd_index < 0 or eocd_index + END_OF_CENTRAL_DIRECTORY.size > len(tail):
+            raise zipfile.BadZipFile(f'could not find the end of the central directory of {url}')
+        _, _, _, _, entries, cd_size, cd_offset, _ = END_OF_CENTRAL_DIRECTORY.unpack_from(tail, eocd_index)
+
+        if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF or entries == 0xFFFF:
+            locator_index = eocd_index - ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.size
+            if locator_index < 0:
+                raise zipfile.BadZipFile(f'could not find the zip64 end of the central directory of {url}')
+            signature, _, zip64_eocd_offset, _ = ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.unpack_from(tail, locator_index)
+            if signature != b'PK\x06\x07' or zip64_eocd_offset < tail_offset:
+                raise zipfile.BadZipFile(f'could not find the zip64 end of the central directory of {url}')
+            try:
+                _, _, _, _, _, _, _, entries, cd_size, cd_offset = ZIP64_END_OF_CENTRAL_DIRECTORY.unpack_from(tail, zip64_eocd_offset - tail_offset)
+            except struct.error as e:
+                raise zipfile.BadZipFile(f'could not read the zip64 end of the central directory of {url}: {e}')
+
+        if cd_offset >= tail_offset:
+            central_directory = tail[cd_offset - tail_offset:cd_offset - tail_offset + cd_size]
+        else:
+            response_validity, response, central_directory = await remote_zip.get_range(start=cd_offset, end=cd_offset + cd_size)
+            if response_validity is not True:
+                return response_validity, response, None
+
+        for member in cls.parse_central_directory(central_directory=central_directory, entries=entries):
+            remote_zip.members[member.name] = member
+        return True, response, remote_zip
+
+    @staticmethod
+    def total_size(response: httpx.Response) -> int:
+        """
+        Returns the size of the whole file that a partial (``206``) response is part
+        of, from its ``Content-Range`` header.
+        """
+        content_range = response.headers.get('content-range', '')
+        try:
+            return int(content_range.rsplit('/', 1)[1])
+        except (IndexError, ValueError):
+            raise zipfile.BadZipFile(f'could not read the size of the zipped file from Content-Range: {content_range!r}')
+
+    @staticmethod
+    def parse_central_directory(central_directory: bytes, entries: int) -> List[RemoteMember]:
+        """
+        Parses the central directory of a zip, and returns a :class:`.RemoteMember`
+        for each of its ``entries``. Raises :class:`zipfile.BadZipFile` if the central
+        directory is truncated or corrupt.
+        """
+        try:
+            return RemoteZip._parse_central_directory(central_directory=central_directory, entries=entries)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise zipfile.BadZipFile(f'bad central directory: {e}')
+
+    @staticmethod
+    def _parse_central_directory(central_directory: bytes, entries: int) -> List[RemoteMember]:
+        members = []
+        position = 0
+        for _ in range(entries):
+            (signature, _, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length, comment_length, _, _, _, offset) = CENTRAL_DIRECTORY_HEADER.unpack_from(central_directory, position)
+            if signature != b'PK\x01\x02':
+                raise zipfile.BadZipFile('bad central directory entry')
+            name_start = position + CENTRAL_DIRECTORY_HEADER.size
+            name = central_directory[name_start:name_start + name_length].decode('utf-8' if flags & 0x800 else 'cp437')
+            extra = central_directory[name_start + name_length:name_start + name_length + extra_length]
+
+            if 0xFFFFFFFF in (compressed_size, size, offset):
+                size, compressed_size, offset = RemoteZip.parse_zip64_extra(extra=extra, size=size, compressed_size=compressed_size, offset=offset)
+
+            members.append(RemoteMember(name=name, method=method, crc=crc, compressed_size=compressed_size, size=size, offset=offset, header_size=LOCAL_FILE_HEADER.size + name_length + extra_length))
+            position = name_start + name_length + extra_length + comment_length
+        return members
+
+    @staticmethod
+    def parse_zip64_extra(extra: bytes, size: int, compressed_size: int, offset: int) -> Tuple[int, int, int]:
+        """
+        Reads the sizes and offset of a member that do not fit in its central
+        directory entry from the entry's zip64 extra field.
+        """
+        position = 0
+        while position + 4 <= len(extra):
+            field_id, field_length = struct.unpack_from('<HH', extra, position)
+            if field_id == 0x0001:
+                values = iter(struct.unpack_from(f'<{field_length // 8}Q', extra, position + 4))
+                if size == 0xFFFFFFFF:
+                    size = next(values)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values)
+                if offset == 0xFFFFFFFF:
+                    offset = next(values)
+                break
+            position += 4 + field_length
+        return size, compressed_size, offset
+
+    async def get_range(self, start: int, end: int) -> Tuple[bool, Union[httpx.Response, None], bytes]:
+        """
+        Requests the bytes of the zip from ``start`` up to (but not including)
+        ``end``. Returns a tuple consisting of a boolean indicating whether or not the
+        request was successful, the response, and the bytes.
+        """
+        response_validity, response = await self.client.get(url=self.url, use_api=False, use_cache=False, headers={'Range': f'bytes={start}-{end - 1}'})
+        self.requests += 1
+        if response_validity is not True:
+            return response_validity, response, b''
+        if response.status_code != 206:
+            raise zipfile.BadZipFile(f'the server stopped honoring range requests for {self.url}')
+        self.downloaded_bytes += len(response.content)
+        return True, response, response.content
+
+    def extract(self, member: RemoteMember, data: bytes) -> bytes:
+        """
+        Takes as an input a member and the bytes of the zip starting at its local
+        file header, and returns the member's uncompressed content. Raises
+        :class:`zipfile.BadZipFile` if the member is truncated or corrupt.
+        """
+        try:
+            signature, _, _, method, _, _, _, _, _, name_length, extra_length = LOCAL_FILE_HEADER.unpack_from(data, 0)
+        except struct.error as e:
+            raise zipfile.BadZipFile(f'bad local file header for {member.name}: {e}')
+        if signature != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f'bad local file header for {member.name}')
+        start = LOCAL_FILE_HEADER.size + name_length + extra_length
+        compressed = data[start:start + member.compressed_size]
+        if len(compressed) < member.compressed_size:
+            raise zipfile.BadZipFile(f'{member.name} is truncated')
+
+        if method == zipfile.ZIP_STORED:
+            content = compressed
+        elif method == zipfile.ZIP_DEFLATED:
+            try:
+                content = zlib.decompressobj(-zlib.MAX_WBITS).decompress(compressed)
+            except zlib.error as e:
+                raise zipfile.BadZipFile(f'could not decompress {member.name}: {e}')
+        else:
+            raise NotImplementedError(f'{member.name} uses an unsupported compression method ({method})')
+
+        if zlib.crc32(content) != member.crc:
+            raise zipfile.BadZipFile(f'bad CRC-32 for {member.name}')
+        return content
+
+    async def read_members(self, names: List[str], max_gap: int = 2**14) -> Tuple[bool, Union[httpx.Response, None], Dict[str, bytes]]:
+        """
+        Takes as an input a list of member names, and requests those members. Members
+        that are at most ``max_gap`` bytes apart are requested in a single range, and
+        the ranges are requested concurrently, as many at a time as the client's rate
+        limiter allows. Returns a tuple consisting of a boolean indicating whether or
+        not every request was successful, the last response, and a mapping from each
+        name to the member's uncompressed content.
+        """
+        members = sorted((self.members[name] for name in set(names)), key=lambda m : m.offset)
+        spans : List[List[RemoteMember]] = []
+        for member in members:
+            if spans and member.offset - spans[-1][-1].end <= max_gap:
+                spans[-1].append(member)
+            else:
+                spans.append([member])
+
+        # local headers can have a few more extra bytes than the central directory says
+        bounds = [(span[0].offset, min(max(m.end for m in span) + 1024, self.size)) for span in spans]
+        tasks = [asyncio.ensure_future(self.get_range(start=start, end=end)) for start, end in bounds]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # a range that is not honored raises, so the other ranges are no use
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        contents = {}
+        response = None
+        for span, (start, _), (response_validity, response, data) in zip(spans, bounds, results):
+            if response_validity is not True:
+                return response_validity, response, contents
+            for member in span:
+                contents[member.name] = self.extract(member=member, data=data[member.offset - start:])
+        return True, response, contents
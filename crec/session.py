@@ -0,0 +1,132 @@
+from typing import Union, List, Any, Coroutine
+import asyncio
+import importlib.util
+import httpx
+
+from crec.api import GovInfoClient
+from crec.cache import ResponseCache
+from crec.downloader import AsyncLoopHandler
+from crec.logger import Logger
+
+
+class Session:
+    """
+    A long-lived set of resources that many :class:`.Record` objects can share: one
+    :class:`.GovInfoClient` (and so one pool of connections to GovInfo, one
+    :class:`.RateLimiter`, and one :class:`.ResponseCache`), one thread running an
+    event loop, and one :class:`.Logger`. Records created with ``session=`` borrow
+    these instead of creating and tearing down their own, so that connections are
+    reused across records instead of being set up again for each one.
+
+    A session should be closed once it is no longer needed, either by calling
+    :meth:`.Session.close()` or by using it as a context manager:
+
+    >>> with Session(api_key=api_key) as session:
+    ...     r = Record(dates=["2019-01-03"], session=session)
+
+    Parameters
+    ----------
+    rate_limit_wait : Union[int, bool] = 30
+        If ``rate_limit_wait`` is an ``int``, then exceeding the GovInfo rate limit
+        will cause the program to halt for ``rate_limit_wait`` seconds. Otherwise,
+        ``rate_limit_wait`` should be ``False``, and exceeding the rate limit will
+        throw an uncaught exception.
+    retry_limit : Union[bool, int] = 5
+        If ``retry_limit`` is an ``int``, then the program will attempt to request
+        URLs up to ``retry_limit`` times before moving on. Otherwise, ``retry_limit``
+        should be ``False``, and URLs will only be tried once.
+    cache : Union[bool, str, :class:`.ResponseCache`] = False
+        If ``cache`` is a path, responses from GovInfo are cached on disk in that
+        directory, and reused in later runs instead of being requested again. For more
+        control (a size limit, revalidation, or offline use), ``cache`` can also be a
+        :class:`.ResponseCache` object. Otherwise, ``cache`` should be ``False``, and
+        nothing is cached.
+    api_key : Union[str, List[str]] = None
+        API key from GovInfo. Can be obtained by visiting
+        https://www.govinfo.gov/api-signup. If a list of keys is provided, requests
+        are spread across them, and each key's rate limit is tracked on its own (see
+        :class:`.KeyPool`).
+    http2 : bool = None
+        Whether to use HTTP/2, which lets many requests share one connection. If
+        ``http2`` is ``None``, HTTP/2 is used if the ``h2`` package is installed.
+    max_connections : int = 100
+        The largest number of connections to GovInfo that can be open at once.
+    max_keepalive_connections : int = 20
+        The largest number of idle connections that are kept open to be reused.
+    keepalive_expiry : float = 60
+        The number of seconds an idle connection is kept open for.
+    print_logs : bool = True
+        A boolean that determines whether or not logs are printed to stdout.
+    write_logs : bool = False
+        A boolean that determines whether or not logs are written to disk.
+    write_path : str = None
+        A filename to write logs to. Must be provided if ``write_logs`` is ``True``.
+
+    Attributes
+    ----------
+    client : :class:`.GovInfoClient`
+        The client that records borrowing this session make requests with. It is
+        opened when the session is created, on the session's event loop.
+    loop_handler : :class:`.AsyncLoopHandler`
+        The thread that runs the session's event loop.
+    logger : :class:`.Logger`
+        The logger that records borrowing this session output logs with.
+    """
+    def __init__(
+        self,
+        rate_limit_wait: Union[int, bool] = 30,
+        retry_limit: Union[bool, int] = 5,
+        cache: Union[bool, str, ResponseCache] = False,
+        api_key: Union[str, List[str]] = None,
+        http2: bool = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60,
+        print_logs: bool = True,
+        write_logs: bool = False,
+        write_path: str = None
+    ) -> None:
+        if http2 is None:
+            http2 = importlib.util.find_spec('h2') is not None
+        if isinstance(cache, str):
+            cache = ResponseCache(directory=cache)
+
+        self.logger = Logger(rate_limit_wait=rate_limit_wait, print_logs=print_logs, write_logs=write_logs, write_path=write_path)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections, keepalive_expiry=keepalive_expiry)
+        self.client = GovInfoClient(rate_limit_wait=rate_limit_wait, retry_limit=retry_limit, logger=self.logger, api_key=api_key, cache=cache if isinstance(cache, ResponseCache) else None, http2=http2, limits=limits)
+
+        self.loop_handler = AsyncLoopHandler()
+        self.loop_handler.start()
+        self.run(self.client.__aenter__())
+        self.closed = False
+
+    def __repr__(self) -> str:
+        return f'Session (closed: {self.closed})'
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+        Runs a coroutine on the session's event loop and blocks until it has
+        finished.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop_handler.loop).result()
+
+    def close(self) -> None:
+        """
+        Closes the client and its connections, stops the event loop thread, closes
+        the cache (if there is one), and stops the logger. Does nothing if the
+        session is already closed.
+        """
+        if self.closed:
+            return
+        self.run(self.client.__aexit__(None, None, None))
+        self.loop_handler.stop()
+        if self.client.cache is not None:
+            self.client.cache.close()
+        self.logger.close()
+        self.closed = True
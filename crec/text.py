@@ -1,9 +1,9 @@
 from typing import List, Union, Iterable
-import re
 import pandas as pd
 import functools
 
 from crec.speaker import Speaker, UNKNOWN_SPEAKER
+from crec.patterns import PARAGRAPH_BREAK
 
 
 class Paragraph:
@@ -86,7 +86,7 @@ class Passage:
         Splits the passage's text into :class:`.Paragraph` objects.
         """
         tmp_text = f'\n\n{text}'
-        p_breaks = list(re.finditer(r'\n\n', tmp_text))
+        p_breaks = list(PARAGRAPH_BREAK.finditer(tmp_text))
         for i, match in enumerate(p_breaks):
             p_start = match.end()
             p_end = p_breaks[i + 1].start() if i < len(p_breaks) - 1 else None
@@ -0,0 +1,24 @@
+from unittest import TestCase, main
+from httpx import Response
+
+from crec.api import Backoff, GovInfoClient
+
+
+class BackoffTest(TestCase):
+    def test_delay(self):
+        backoff = Backoff(base=1, cap=8)
+        for attempt in range(1, 10):
+            delay = backoff.delay(attempt=attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(8, 2**(attempt - 1)))
+
+        self.assertEqual(backoff.delay(attempt=1, response=Response(503, headers={'Retry-After': '42'})), 42)
+
+    def test_is_deferred(self):
+        self.assertTrue(GovInfoClient.is_deferred(False, Response(503)))
+        self.assertFalse(GovInfoClient.is_deferred(False, Response(404)))
+        self.assertFalse(GovInfoClient.is_deferred(False, None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from httpx import Response, Request
+import asyncio
+import tempfile
+import threading
+import time
+
+from crec.api import GovInfoClient
+from crec.cache import ResponseCache
+from crec.logger import Logger
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        body = self.path.encode()*1000
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class CacheTest(TestCase):
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory, max_size=15)
+
+            key = cache.key('https://api.govinfo.gov/packages/CREC-2018-01-04/granules', {'offset': '0', 'api_key': 'a'})
+            self.assertEqual(key, cache.key('https://api.govinfo.gov/packages/CREC-2018-01-04/granules', {'api_key': 'b', 'offset': '0'}))
+
+            url = 'https://www.govinfo.gov/content/pkg/CREC-2018-01-04.zip'
+            cache.store(key=key, url=url, response=Response(200, content=b'0123456789', headers={'etag': '"a"'}, request=Request('GET', url)))
+            entry = cache.lookup(key)
+            self.assertTrue(cache.is_fresh(entry))
+            self.assertEqual(cache.conditional_headers(entry), {'If-None-Match': '"a"'})
+            response_validity, response = cache.response(entry)
+            self.assertEqual(response_validity, True)
+            self.assertEqual(response.content, b'0123456789')
+            self.assertEqual(str(response.url), url)
+
+            time.sleep(0.01)
+            cache.store(key='other', url=url, response=Response(200, content=b'abcdefghij', request=Request('GET', url)))
+            self.assertIsNone(cache.lookup(key))
+            self.assertEqual(cache.size, 10)
+
+            cache.store(key='missing', url=url, response=None)
+            self.assertEqual(cache.response(cache.lookup('missing')), (False, None))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory, max_size=100)
+            url = 'https://www.govinfo.gov/content/pkg/CREC-2018-01-04.zip'
+            for i in range(50):
+                cache.store(key=str(i), url=url, response=Response(200, content=f'{i:010}'.encode(), request=Request('GET', url)))
+                self.assertLessEqual(cache.size, 100)
+            # storing the same body again, under the same key or another one, takes no more space
+            cache.store(key='49', url=url, response=Response(200, content=f'{49:010}'.encode(), request=Request('GET', url)))
+            cache.store(key='copy', url=url, response=Response(200, content=f'{49:010}'.encode(), request=Request('GET', url)))
+            self.assertEqual(cache.size, 100)
+            self.assertIsNone(cache.lookup('0'))
+            self.assertIsNotNone(cache.lookup('49'))
+            cache.remove('49')
+            self.assertEqual(cache.size, 100)
+            cache.remove('copy')
+            self.assertEqual(cache.size, 90)
+            cache.close()
+
+            self.assertEqual(ResponseCache(directory=directory, max_size=100).size, 90)
+
+    def test_client(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), BodyHandler)
+        server.requests = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory)
+            client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=logger, api_key=None, cache=cache)
+            client.non_api_root = f'http://127.0.0.1:{server.server_address[1]}/'
+
+            async def get():
+                async with client:
+                    responses = await asyncio.gather(*[client.get(url=f'content/{i % 3}', use_api=False) for i in range(6)])
+                    requests = server.requests
+                    file = tempfile.TemporaryFile()
+                    await client.get(url='content/0', use_api=False, file=file)
+                    return responses, requests, file.read()
+
+            responses, requests, file_content = asyncio.run(get())
+            self.assertTrue(all(validity for validity, _ in responses))
+            self.assertEqual([r.content for _, r in responses], [f'/content/{i % 3}'.encode()*1000 for i in range(6)])
+            self.assertEqual(file_content, b'/content/0'*1000)
+            self.assertLessEqual(requests, 6)
+            self.assertEqual(server.requests, requests)
+            self.assertEqual(cache.size, 3*len(b'/content/0')*1000)
+            cache.close()
+        server.shutdown()
+        server.server_close()
+        logger.close()
+
+
+if __name__ == "__main__":
+    main()
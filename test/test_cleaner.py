@@ -0,0 +1,72 @@
+from unittest import TestCase, main
+import random
+
+from crec.cleaner import clean_htm, clean_htm_lines
+
+HEAD = '''<html>
+<head>
+<title>Congressional Record, Volume 164 Issue 3</title>
+</head>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+[Senate]
+[Pages S27-S28]
+From the Congressional Record Online through the Government Publishing Office [www.gpo.gov]
+
+
+
+
+                        MORNING BUSINESS
+
+'''
+
+BODY = '''  The PRESIDING OFFICER. The Senator from Kentucky.
+  Mr. McCONNELL. Mr. President, I ask unanimous consent that the Senate
+be in a period of morning business, with Senators permitted to speak
+
+[[Page S28]]
+
+therein for up to 10 minutes each.
+  <bullet> Within the bill, there are provisions.
+   The PRESIDING OFFICER. Without objection, it is so ordered.
+                          {time}  1415
+  (a) In General.--Section 2 is amended.
+  Mr. SCHUMER. I thank the leader. [[Page S29]] We will continue.
+ =========================== NOTE =========================== 
+
+  Page S28 was missing.
+
+ =========================== END NOTE =========================== 
+  Ms. COLLINS. The amendment is at the desk.
+  SA 1234. Mr. KING submitted an amendment.'''
+
+FOOT = '''
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+
+PIECES = ['', '  ', '   ', ' ', 'Mr. KING. Yes.', '(a) text', '[Roll No. 12]', '<bullet> ', '[[Page S123]]', '{time}  1415', '{time}', '1415',
+          ' =========================== NOTE =========================== ', ' =========================== END NOTE ============',
+          '                          ____________________', '</pre></body>', '</html>', 'words and more words', '\t']
+
+
+class CleanerTest(TestCase):
+    def test_clean_htm_lines(self):
+        texts = [HEAD + BODY + FOOT, HEAD + BODY, BODY + FOOT, BODY, HEAD + FOOT, HEAD, '', '\n', '  text', 'x\n\n  ____________________\n']
+        for text in texts:
+            self.assertEqual(clean_htm_lines(text), clean_htm(text))
+
+    def test_clean_htm_lines_fuzz(self):
+        r = random.Random(0)
+        for _ in range(2000):
+            text = '\n'.join(r.choice(PIECES) for _ in range(r.randint(0, 20)))
+            if r.random() < 0.5:
+                text = HEAD + text
+            self.assertEqual(clean_htm_lines(text), clean_htm(text), repr(text))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import tempfile
+import threading
+import random
+import httpx
+
+from crec.api import GovInfoClient, RateLimitError
+from crec.logger import Logger
+
+# a binary body that happens to contain GovInfo's rate limit code
+ZIP = b'PK\x03\x04' + random.Random(0).getrandbits(2**23).to_bytes(2**20, 'little') + b'OVER_RATE_LIMIT' + random.Random(1).getrandbits(2**13).to_bytes(2**10, 'little')
+RATE_LIMITED = b'{"error": {"code": "OVER_RATE_LIMIT", "message": "You have exceeded your rate limit."}}'
+
+
+class UnscannedResponse(httpx.Response):
+    """
+    A response whose body must not be looked at.
+    """
+    @property
+    def content(self) -> bytes:
+        raise AssertionError('the body was scanned')
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /<content type>/<zip or rate-limited>
+        _, content_type, kind = self.path.split('?')[0].split('/', 2)
+        body = ZIP if kind == 'zip' else RATE_LIMITED
+        self.send_response(200)
+        self.send_header('Content-Type', content_type.replace('_', '/'))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RateLimitedTest(TestCase):
+    def test_status(self):
+        self.assertTrue(GovInfoClient.is_rate_limited(httpx.Response(429)))
+        self.assertTrue(GovInfoClient.is_rate_limited(UnscannedResponse(429, headers={'Content-Type': 'application/zip'})))
+
+    def test_textual_bodies(self):
+        for content_type in ['application/json', 'text/html; charset=utf-8', 'text/plain', 'application/xml', '']:
+            with self.subTest(content_type=content_type):
+                headers = {'Content-Type': content_type} if content_type else {}
+                self.assertTrue(GovInfoClient.is_rate_limited(httpx.Response(200, headers=headers, content=RATE_LIMITED)))
+                self.assertFalse(GovInfoClient.is_rate_limited(httpx.Response(200, headers=headers, content=b'{"count": 0}')))
+
+    def test_binary_bodies(self):
+        for content_type in ['application/zip', 'application/pdf', 'application/octet-stream']:
+            with self.subTest(content_type=content_type):
+                self.assertFalse(GovInfoClient.is_rate_limited(UnscannedResponse(200, headers={'Content-Type': content_type}, content=ZIP)))
+
+    def test_unread_bodies(self):
+        async def stream():
+            yield RATE_LIMITED
+
+        self.assertFalse(GovInfoClient.is_rate_limited(httpx.Response(200, headers={'Content-Type': 'application/json'}, content=stream())))
+
+
+class StreamToFileTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), BodyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.logger.close()
+
+    def get(self, url: str, file=None):
+        async def run():
+            client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=self.logger, api_key=None)
+            client.non_api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+            async with client:
+                return await client.get(url=url, use_api=False, file=file, use_cache=False)
+
+        return asyncio.run(run())
+
+    def test_stream_to_file(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(b'left over from an earlier download')
+            response_validity, response = self.get(url='application_zip/zip', file=file)
+            self.assertTrue(response_validity)
+            self.assertEqual(file.tell(), 0)
+            self.assertEqual(file.read(), ZIP)
+        # the body went to the file instead of memory
+        with self.assertRaises(httpx.ResponseNotRead):
+            response.content
+
+    def test_binary_body(self):
+        # the rate limit code inside a zip is not mistaken for GovInfo's response
+        response_validity, response = self.get(url='application_zip/zip')
+        self.assertTrue(response_validity)
+        self.assertEqual(response.content, ZIP)
+
+    def test_rate_limited_body(self):
+        for content_type in ['application_json', 'text_html', 'application_xml']:
+            with self.subTest(content_type=content_type):
+                with self.assertRaises(RateLimitError):
+                    self.get(url=f'{content_type}/rate-limited')
+
+
+if __name__ == '__main__':
+    main()
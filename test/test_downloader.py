@@ -0,0 +1,268 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.etree import ElementTree as et
+import threading
+import asyncio
+import tempfile
+import zipfile
+import io
+import os
+
+from crec.api import GovInfoClient
+from crec.downloader import Downloader
+from crec.granule import Granule
+from crec.logger import Logger
+
+GRANULE_IDS = [f'CREC-2018-01-04-pt1-PgS{i}' for i in range(1, 13)]
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgS{page}</granuleId>
+<congMember role="SPEAKING" bioGuideId="M000355"><name type="parsed">Mr. McCONNELL</name><name type="authority-fnf">Mitch McConnell</name></congMember>
+<congMember role="SPEAKING" bioGuideId="K000362"><name type="parsed">Mr. KING of Iowa</name><name type="authority-fnf">Steve King</name></congMember>
+</extension></mods>'''
+HTM = '''<html>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+
+
+
+                        MORNING BUSINESS
+
+  The PRESIDING OFFICER. The Senator from Kentucky.
+  Mr. McCONNELL. Mr. President, I ask unanimous consent that the Senate
+be in a period of morning business.
+
+  The PRESIDING OFFICER (Mr. SULLIVAN). Without objection, it is so ordered.
+  Mr. KING of Iowa. Mr. President, I suggest the absence of a quorum.
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+
+
+def make_zip(date: str = '2018-01-04') -> zipfile.ZipFile:
+    granule_ids = [g_id.replace('2018-01-04', date) for g_id in GRANULE_IDS]
+    related_items = ''.join(f'<relatedItem type="constituent" ID="id-{g_id}"><extension><granuleClass>SENATE</granuleClass></extension></relatedItem>' for g_id in granule_ids)
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(zip_bytes, 'w') as date_zip:
+        date_zip.writestr(f'CREC-{date}/mods.xml', f'<mods xmlns="http://www.loc.gov/mods/v3">{related_items}</mods>')
+        for g_id in reversed(granule_ids):
+            date_zip.writestr(f'CREC-{date}/html/{g_id}.htm', f'<pre>{g_id}</pre>')
+    return zipfile.ZipFile(zip_bytes)
+
+
+class WindowHandler(BaseHTTPRequestHandler):
+    # PgS1 is held until every other granule that can finish has finished, PgS2 does not
+    # exist, and PgS3 is still being generated the first time it is requested
+    def do_GET(self) -> None:
+        server = self.server
+        granule_id, kind = self.path.split('?')[0].strip('/').split('/')[3:5]
+        with server.lock:
+            server.active[granule_id] = server.active.get(granule_id, 0) + 1
+            server.most_active = max(server.most_active, len(server.active))
+            first_request = (granule_id, kind) not in server.requested
+            server.requested.add((granule_id, kind))
+        if granule_id.endswith('PgS1'):
+            server.others_finished.wait(timeout=10)
+        if granule_id.endswith('PgS2'):
+            status, body = 400, b'granule does not exist'
+        elif granule_id.endswith('PgS3') and first_request:
+            status, body = 503, b''
+        else:
+            status, body = 200, (MODS.format(page=granule_id.split('PgS')[1]) if kind == 'mods' else HTM).encode()
+        with server.lock:
+            if status == 200 and kind == 'htm':
+                server.served.add(granule_id)
+            server.active[granule_id] -= 1
+            if server.active[granule_id] == 0:
+                del server.active[granule_id]
+                if granule_id in server.served and granule_id not in server.finished:
+                    server.finished.append(granule_id)
+                    if len(server.finished) == len(GRANULE_IDS) - 3:
+                        server.others_finished.set()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class ZipHandler(BaseHTTPRequestHandler):
+    # /content/pkg/CREC-<date>.zip
+    def do_GET(self) -> None:
+        date = self.path.split('?')[0].rsplit('/', 1)[-1][len('CREC-'):-len('.zip')]
+        body = make_zip(date=date).fp.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class DownloaderTest(TestCase):
+    def test_index_zip(self):
+        mods_file_name, htm_file_names = Downloader.index_zip(date_zip=make_zip())
+        self.assertEqual(mods_file_name, 'CREC-2018-01-04/mods.xml')
+        self.assertEqual(htm_file_names['CREC-2018-01-04-pt1-PgS1'], 'CREC-2018-01-04/html/CREC-2018-01-04-pt1-PgS1.htm')
+        self.assertEqual(len(htm_file_names), len(GRANULE_IDS))
+
+    def test_granules_from_zip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+            downloader = Downloader(granule_class_filter=None, parse=False, write=directory, zipped=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=False, api_key=None, logger=logger)
+            granules = downloader.granules_from_zip(date_zip=make_zip())
+            self.assertEqual([g.id for g in granules], GRANULE_IDS)
+            self.assertTrue(all(g.complete for g in granules))
+            with open(os.path.join(directory, 'CREC-2018-01-04-pt1-PgS1.htm')) as htm_file:
+                self.assertEqual(htm_file.read(), '<pre>CREC-2018-01-04-pt1-PgS1</pre>')
+            downloader.close()
+            logger.close()
+
+    def test_process_granules_in_workers(self):
+        # the last granule has no text, so that its parse fails
+        jobs = [(f'CREC-2018-01-04-pt1-PgS{page}', et.fromstring(MODS.format(page=page)), HTM if page < 6 else None) for page in range(1, 7)]
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        results = []
+        for workers in [False, 2]:
+            downloader = Downloader(granule_class_filter=None, parse=True, write=False, zipped=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=False, api_key=None, logger=logger, workers=workers)
+            granules = downloader.process_granules(jobs=((Granule(granule_id=g_id), xml, htm) for g_id, xml, htm in jobs))
+            downloader.close()
+            results.append([(
+                g.id,
+                g.complete,
+                {s_id: (s.attributes, s.names, s.titled) for s_id, s in g.speakers.items()},
+                [(p.passage_id, p.speaker.attributes, [paragraph.text for paragraph in p.paragraphs]) for p in g.passages],
+                repr(g.parse_exception)
+            ) for g in granules])
+        logger.close()
+
+        in_process, in_workers = results
+        self.assertEqual(in_workers, in_process)
+        self.assertEqual([r[1] for r in in_workers], [True]*5 + [False])
+        self.assertEqual(len(in_workers[0][3]), 4)
+        self.assertIn('TypeError', in_workers[-1][4])
+
+    def test_run_in_window(self):
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        downloader = Downloader(granule_class_filter=None, parse=True, write=False, zipped=False, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=False, api_key=None, logger=logger, scheduler='window')
+        running, most_running, finished = 0, 0, []
+
+        async def job(i):
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0.5 if i == 0 else 0.01)
+            running -= 1
+            finished.append(i)
+            return i * 2
+
+        results = asyncio.run(downloader.run_in_window(coroutines=(job(i) for i in range(20)), total=20, description='jobs'))
+        self.assertEqual(results, [i * 2 for i in range(20)])
+        self.assertEqual(most_running, 3)
+        # the slow job only ever holds one of the slots
+        self.assertEqual(finished[-1], 0)
+        downloader.close()
+        logger.close()
+
+    def test_get_granules_in_window(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), WindowHandler)
+        server.lock, server.active, server.most_active, server.requested, server.served, server.finished, server.others_finished = threading.Lock(), {}, 0, set(), set(), [], threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=logger, api_key=None)
+        client.api_root = f'http://127.0.0.1:{server.server_address[1]}/'
+        downloader = Downloader(granule_class_filter=None, parse=True, write=False, zipped=False, batch_size=2, batch_wait=False, rate_limit_wait=False, retry_limit=1, api_key=None, logger=logger, scheduler='window', defer_wait=0, client=client)
+
+        async def run():
+            async with client:
+                return await downloader.get_granules_in_window(granules=[Granule(granule_id=g_id) for g_id in GRANULE_IDS], client=client)
+
+        granules = asyncio.run(run())
+        downloader.close()
+        server.shutdown()
+        server.server_close()
+        logger.close()
+
+        self.assertEqual([g.id for g in granules], GRANULE_IDS)
+        self.assertEqual(downloader.incomplete_granules, {'CREC-2018-01-04-pt1-PgS2'})
+        self.assertTrue(all(g.complete for g in granules if not g.id.endswith('PgS2')))
+        self.assertLessEqual(server.most_active, 2)
+        # the slow granule held one slot while every other granule went through the other,
+        # and the granule that was set aside was requested again once the window emptied
+        self.assertEqual(server.finished[-2:], ['CREC-2018-01-04-pt1-PgS1', 'CREC-2018-01-04-pt1-PgS3'])
+        self.assertEqual(len(server.finished), len(GRANULE_IDS) - 1)
+
+    def test_executor_threads(self):
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        downloader = Downloader(granule_class_filter=None, parse=True, write=False, zipped=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=False, api_key=None, logger=logger, workers=1)
+        barrier = threading.Barrier(8)
+        executors = []
+
+        def get_executor():
+            barrier.wait()
+            executors.append(downloader.executor)
+
+        threads = [threading.Thread(target=get_executor) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # one pool is started, however many threads ask for it first
+        self.assertEqual(len(set(map(id, executors))), 1)
+        downloader.close()
+        self.assertIsNone(downloader._executor)
+        logger.close()
+
+    def test_process_granules_bounded(self):
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        downloader = Downloader(granule_class_filter=None, parse=True, write=False, zipped=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=False, api_key=None, logger=logger, workers=1)
+        submitted, most_pending = [], 0
+
+        def jobs():
+            nonlocal most_pending
+            for page in range(1, 31):
+                # every granule before this one has been submitted; those not loaded yet are pending
+                most_pending = max(most_pending, sum(not g.parsed for g in submitted))
+                granule = Granule(granule_id=f'CREC-2018-01-04-pt1-PgS{page}')
+                submitted.append(granule)
+                yield granule, et.fromstring(MODS.format(page=page)), HTM
+
+        granules = downloader.process_granules(jobs=jobs())
+        downloader.close()
+        logger.close()
+        self.assertEqual(len(granules), 30)
+        self.assertTrue(all(g.complete for g in granules))
+        self.assertLessEqual(most_pending, 4)
+
+    def test_pipelined(self):
+        dates = ['2018-01-03', '2018-01-04', '2018-01-05', '2018-01-08']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ZipHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+        results = []
+        for pipeline, workers in [(False, False), (1, False), (2, 2)]:
+            with tempfile.TemporaryDirectory() as directory:
+                client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=logger, api_key=None)
+                client.non_api_root = f'http://127.0.0.1:{server.server_address[1]}/'
+                downloader = Downloader(granule_class_filter=None, parse=True, write=directory, zipped=True, batch_size=2, batch_wait=False, rate_limit_wait=False, retry_limit=1, api_key=None, logger=logger, pipeline=pipeline, workers=workers, client=client)
+                granules = asyncio.run(downloader.get_granules_from_zips(dates=dates))
+                downloader.close()
+                results.append(([(g.id, g.complete, g.parsed, g.clean_text, [p.text for p in g.passages]) for g in granules], sorted(os.listdir(directory)), downloader.incomplete_days, downloader.incomplete_granules))
+        server.shutdown()
+        server.server_close()
+        logger.close()
+
+        self.assertEqual(len(results[0][0]), len(dates) * len(GRANULE_IDS))
+        self.assertEqual([g[0] for g in results[0][0]], [g_id.replace('2018-01-04', date) for date in dates for g_id in GRANULE_IDS])
+        self.assertTrue(all(g[1] for g in results[0][0]))
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(results[2], results[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+from unittest import TestCase, main
+from xml.etree import ElementTree as et
+
+from crec.constants import REGEX_ENGINES
+from crec.engine import EnginePattern, available_engines, compile_pattern, current_engine, set_engine
+from crec.granule import Granule
+
+HEAD = '<html>\n<body><pre>\n[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]\n\n\n\n                        MORNING BUSINESS\n\n'
+BODY = '''  The PRESIDING OFFICER. The Senator from Kentucky.
+  Mr. McCONNELL. Mr. President, I ask unanimous consent that the Senate
+be in a period of morning business, with Senators permitted to speak
+
+[[Page S28]]
+
+therein for up to 10 minutes each.
+
+  The PRESIDING OFFICER (Mr. SULLIVAN). Without objection, it is so ordered.
+                          {time}  1415
+  Mr. KING of Iowa (for himself and Ms. COLLINS): The amendment is at the desk.
+  (a) In General.--Section 2 is amended.
+ =========================== NOTE =========================== 
+
+  Page S28 was missing.
+
+ =========================== END NOTE =========================== 
+  Mr. Manager RASKIN. Thank you. Mr. McCONNELL. led the Pledge of Allegiance as follows:
+  SA 1234. Mr. KING of Iowa submitted an amendment.
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgS27</granuleId>
+<congMember role="SPEAKING" bioGuideId="M000355"><name type="parsed">Mr. McCONNELL</name><name type="authority-fnf">Mitch McConnell</name></congMember>
+<congMember role="SPEAKING" bioGuideId="K000362"><name type="parsed">Mr. KING of Iowa</name><name type="authority-fnf">Steve King</name></congMember>
+</extension></mods>'''
+
+
+def parse(text):
+    granule = Granule(granule_id='CREC-2018-01-04-pt1-PgS27')
+    granule.parse_responses(xml_response=et.fromstring(MODS), htm_response=text)
+    return granule.clean_text, [(p.speaker.parsed_name, [paragraph.text for paragraph in p.paragraphs]) for p in granule.passages]
+
+
+class EngineTest(TestCase):
+    def tearDown(self):
+        set_engine('re')
+
+    def test_compile_pattern(self):
+        # re2 has no lookbehinds, so this pattern is always compiled with re
+        self.assertEqual(compile_pattern(pattern=r'(?<!\s)\n\n', engine='re2')[1], 're')
+        self.assertEqual(compile_pattern(pattern=r'(?<!\s)\n\n', engine='regex')[1], 'regex' if 'regex' in available_engines() else 're')
+        self.assertEqual(compile_pattern(pattern=r'\n\n', engine='re')[1], 're')
+        with self.assertRaises(ValueError):
+            compile_pattern(pattern=r'\n\n', engine='pcre')
+
+    def test_set_engine(self):
+        pattern = EnginePattern(r'\{time\}\s+\d+')
+        for engine in REGEX_ENGINES:
+            set_engine(engine)
+            self.assertEqual(current_engine(), engine)
+            self.assertEqual(pattern.engine, engine if engine in available_engines() else 're')
+            self.assertEqual(pattern.sub('', 'a {time}  1415 b'), 'a  b')
+
+    def test_conformance(self):
+        texts = [HEAD + BODY, BODY, HEAD + BODY.replace('\n', '\n\n'), HEAD + BODY*20]
+        expected = [parse(text) for text in texts]
+        self.assertGreater(len(expected[0][1]), 3)
+        for engine in REGEX_ENGINES:
+            set_engine(engine)
+            for text, result in zip(texts, expected):
+                self.assertEqual(parse(text), result, engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import threading
+import time
+
+from crec.api import GovInfoClient, APIKeyError
+from crec.logger import Logger
+from crec.record import Record, fetch, aiter_granules
+
+GRANULE_IDS = [f'CREC-2018-01-04-pt1-PgS{i}' for i in range(1, 7)]
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>{granule_id}</granuleId><granuleClass>SENATE</granuleClass>
+<congMember role="SPEAKING" bioGuideId="M000355"><name type="parsed">Mr. McCONNELL</name><name type="authority-fnf">Mitch McConnell</name></congMember>
+</extension></mods>'''
+HTM = '''<html>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+
+
+
+                        MORNING BUSINESS
+
+  Mr. McCONNELL. Mr. President, I ask unanimous consent that the Senate
+be in a period of morning business.
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+
+
+class GranuleHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /packages/CREC-2018-01-04/granules/<granule id>/<mods or htm>
+        parts = self.path.split('?')[0].strip('/').split('/')
+        time.sleep(0.05)
+        if self.server.unauthorized:
+            self.send_response(401)
+            self.end_headers()
+            return
+        if len(parts) == 5 and parts[4] == 'mods':
+            body, content_type = MODS.format(granule_id=parts[3]).encode(), 'application/xml'
+        elif len(parts) == 5 and parts[4] == 'htm':
+            body, content_type = HTM.encode(), 'text/html'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class FetchTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), GranuleHandler)
+        self.server.unauthorized = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.logger.close()
+
+    def client(self) -> GovInfoClient:
+        client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=self.logger, api_key=None)
+        client.api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        return client
+
+    def test_fetch(self):
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            client = self.client()
+            async with client:
+                record = await fetch(client=client, granule_ids=GRANULE_IDS, batch_size=2, print_logs=False)
+                # the caller's client is left open
+                self.assertFalse(client.is_closed)
+            ticker.cancel()
+            return record, ticks
+
+        record, ticks = asyncio.run(run())
+        self.assertIsInstance(record, Record)
+        self.assertEqual([g.id for g in record.granules], GRANULE_IDS)
+        self.assertTrue(all(g.complete for g in record.granules))
+        self.assertEqual(len(record.passages), len(GRANULE_IDS))
+        self.assertEqual(record.incomplete_granules, set())
+        # the requests ran on the caller's loop, without a thread of their own, and
+        # without blocking the caller's other tasks
+        self.assertIsNone(record.downloader._loop_handler)
+        self.assertGreater(ticks, 0)
+
+    def test_caller_client(self):
+        async def run():
+            # a client that the caller has not opened is not closed for them either
+            client = self.client()
+            records = [await fetch(client=client, granule_ids=GRANULE_IDS[:3], print_logs=False)]
+            self.assertFalse(client.is_closed)
+            records.append(await fetch(client=client, granule_ids=GRANULE_IDS[3:], print_logs=False))
+            granule_ids = [g.id async for g in aiter_granules(client=client, granule_ids=GRANULE_IDS, print_logs=False)]
+            self.assertFalse(client.is_closed)
+            await client.aclose()
+            return records, granule_ids
+
+        records, granule_ids = asyncio.run(run())
+        self.assertEqual([g.id for record in records for g in record.granules], GRANULE_IDS)
+        self.assertEqual(granule_ids, GRANULE_IDS)
+
+    def test_failed_retrieval(self):
+        records = []
+
+        class ClosingRecord(Record):
+            def close(self) -> None:
+                records.append(self)
+                super().close()
+
+        self.server.unauthorized = True
+        with self.assertRaises(APIKeyError):
+            ClosingRecord(granule_ids=GRANULE_IDS, zipped=False, client=self.client(), print_logs=False)
+        # the record's event loop thread and logging thread were stopped
+        (record,) = records
+        self.assertIsNone(record.downloader._loop_handler)
+        self.assertNotIn(record.logger.queue_handler, record.logger.logger.handlers)
+
+    def test_aiter_granules(self):
+        async def run():
+            client = self.client()
+            async with client:
+                return [(g.id, g.complete) async for g in aiter_granules(client=client, granule_ids=GRANULE_IDS, batch_size=2, print_logs=False)]
+
+        self.assertEqual(asyncio.run(run()), [(g_id, True) for g_id in GRANULE_IDS])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+from unittest import TestCase, main
+from xml.etree import ElementTree as et
+
+from crec.filters import GranuleFilter
+
+RELATED_ITEM = '''<relatedItem xmlns="http://www.loc.gov/mods/v3" type="constituent" ID="id-CREC-2018-01-04-pt1-PgS27-3">
+    <extension>
+        <granuleDate>2018-01-04</granuleDate>
+        <searchTitle>NOMINATION OF ALEX M. AZAR II</searchTitle>
+        <granuleClass>SENATE</granuleClass>
+        <chamber>SENATE</chamber>
+        <congMember bioGuideId="M000355" role="SPEAKING"><name type="parsed">Mr. McCONNELL</name></congMember>
+        <congMember bioGuideId="S000148" role="VOTING"><name type="parsed">Mr. SCHUMER</name></congMember>
+    </extension>
+</relatedItem>'''
+
+
+class FilterTest(TestCase):
+    def test_summary(self):
+        summary = {'granuleId': 'CREC-2018-01-04-pt1-PgS27-3', 'granuleClass': 'SENATE', 'title': 'Nomination of Alex M. Azar II'}
+        self.assertTrue(GranuleFilter().matches_summary(summary))
+        self.assertTrue(GranuleFilter(title_keywords=['budget', 'NOMINATION']).matches_summary(summary))
+        self.assertFalse(GranuleFilter(title_keywords=['budget']).matches_summary(summary))
+        self.assertFalse(GranuleFilter(start_date='2018-01-05').matches_summary(summary))
+        self.assertTrue(GranuleFilter(chambers=['HOUSE']).matches_summary(summary))
+
+    def test_mods(self):
+        related_item = et.fromstring(RELATED_ITEM)
+        self.assertTrue(GranuleFilter(chambers=['senate'], bioguide_ids=['M000355'], title_keywords=['azar']).matches_mods(related_item))
+        self.assertFalse(GranuleFilter(chambers=['HOUSE']).matches_mods(related_item))
+        self.assertFalse(GranuleFilter(bioguide_ids=['S000148']).matches_mods(related_item))
+        self.assertFalse(GranuleFilter(end_date='2018-01-03').matches_mods(related_item))
+        self.assertTrue(GranuleFilter(bioguide_ids=['M000355']).needs_mods)
+        self.assertFalse(GranuleFilter(title_keywords=['azar']).needs_mods)
+
+
+if __name__ == '__main__':
+    main()
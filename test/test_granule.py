@@ -0,0 +1,179 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import json
+import threading
+import time
+
+from crec.api import GovInfoClient
+from crec.granule import Granule, get_granule_summaries, get_granule_ids
+from crec.logger import Logger
+
+GRANULE_ID = 'CREC-2018-01-04-pt1-PgS1'
+SUMMARIES = [{'granuleId': f'CREC-2018-01-04-pt1-PgS{i}', 'granuleClass': ['HOUSE', 'SENATE'][i % 2], 'title': f'Title {i}'} for i in range(2500)]
+
+
+class GranuleHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /packages/CREC-2018-01-04/granules/<granule id>/<mods or htm>
+        kind = self.path.split('?')[0].strip('/').split('/')[-1]
+        time.sleep(self.server.delays[kind])
+        if kind == 'mods':
+            body = b'the granule does not exist'
+            self.send_response(400)
+        else:
+            body = b'<html><body><pre></pre></body></html>'
+            self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class ListingHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /packages/CREC-2018-01-04/granules?offset=<offset>&pageSize=<page size>
+        query = parse_qs(urlsplit(self.path).query)
+        offset, page_size = int(query['offset'][0]), int(query['pageSize'][0])
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        # later pages are served sooner, so that they finish out of order
+        time.sleep(0.4 - offset / 10000)
+        with self.server.lock:
+            self.server.in_flight -= 1
+            self.server.offsets.append(offset)
+        if offset in self.server.failing_offsets:
+            body = b'the page does not exist'
+            self.send_response(400)
+        else:
+            body = json.dumps({'count': len(SUMMARIES), 'granules': SUMMARIES[offset:offset + page_size]}).encode()
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RecordingClient(GovInfoClient):
+    """
+    Records how each request it was given ended: its response validity, or
+    ``'cancelled'``.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.outcomes = {}
+
+    async def get(self, url: str, *args, **kwargs):
+        kind = url.split('/')[-1]
+        try:
+            response_validity, response = await super().get(url, *args, **kwargs)
+        except asyncio.CancelledError:
+            self.outcomes[kind] = 'cancelled'
+            raise
+        self.outcomes[kind] = response_validity
+        return response_validity, response
+
+
+class AsyncGetTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), GranuleHandler)
+        # the metadata fails for good quickly, while the text is slow
+        self.server.delays = {'mods': 0.05, 'htm': 1}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.logger.close()
+
+    def get(self, fail_fast: bool):
+        async def run():
+            client = RecordingClient(rate_limit_wait=False, retry_limit=1, logger=self.logger, api_key=None)
+            client.api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+            granule = Granule(granule_id=GRANULE_ID)
+            async with client:
+                start = time.monotonic()
+                await granule.async_get(client=client, parse=True, write=False, fail_fast=fail_fast)
+                return granule, client.outcomes, time.monotonic() - start
+
+        return asyncio.run(run())
+
+    def test_fail_fast(self):
+        granule, outcomes, elapsed = self.get(fail_fast=True)
+        # the failed metadata request cancelled the text request
+        self.assertEqual(outcomes, {'mods': False, 'htm': 'cancelled'})
+        self.assertLess(elapsed, 0.5)
+        self.assertFalse(granule.valid_responses)
+        self.assertFalse(granule.complete)
+
+    def test_no_fail_fast(self):
+        granule, outcomes, elapsed = self.get(fail_fast=False)
+        # the text request was still awaited after the metadata request failed
+        self.assertEqual(outcomes, {'mods': False, 'htm': True})
+        self.assertGreaterEqual(elapsed, 1)
+        self.assertFalse(granule.valid_responses)
+        self.assertFalse(granule.complete)
+
+
+class ListingTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ListingHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = self.server.max_in_flight = 0
+        self.server.offsets = []
+        self.server.failing_offsets = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.logger.close()
+
+    def run_listing(self, listing, **kwargs):
+        async def run():
+            client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=self.logger, api_key=None)
+            client.api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+            async with client:
+                return await listing(date='2018-01-04', client=client, logger=self.logger, **kwargs)
+
+        return asyncio.run(run())
+
+    def test_summaries(self):
+        got_all_summaries, summaries = self.run_listing(get_granule_summaries, page_size=1000)
+        self.assertTrue(got_all_summaries)
+        # the pages are put together in order, even though they finished out of order
+        self.assertEqual(summaries, SUMMARIES)
+        self.assertEqual(self.server.offsets, [0, 2000, 1000])
+        # the remaining pages were requested concurrently
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_ids(self):
+        got_all_ids, granule_ids = self.run_listing(get_granule_ids, granule_class_filters=['SENATE'], page_size=1000)
+        self.assertTrue(got_all_ids)
+        self.assertEqual(granule_ids, [g['granuleId'] for g in SUMMARIES if g['granuleClass'] == 'SENATE'])
+
+    def test_failed_listing(self):
+        self.server.failing_offsets = {0}
+        self.assertEqual(self.run_listing(get_granule_ids, granule_class_filters=['HOUSE', 'SENATE'], page_size=1000), (False, []))
+        # the remaining pages are not requested once the first one has failed
+        self.assertEqual(self.server.offsets, [0])
+
+    def test_failed_page(self):
+        self.server.failing_offsets = {1000}
+        got_all_ids, granule_ids = self.run_listing(get_granule_ids, granule_class_filters=['HOUSE', 'SENATE'], page_size=1000)
+        self.assertFalse(got_all_ids)
+        self.assertEqual(granule_ids, [g['granuleId'] for g in SUMMARIES[:1000] + SUMMARIES[2000:]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from unittest import TestCase, main
+from httpx import Response
+import asyncio
+
+from crec.api import KeyPool
+
+
+class KeyPoolTest(TestCase):
+    def test_choose(self):
+        pool = KeyPool(api_keys=['aaaa1', 'bbbb2'])
+        chosen = []
+        for _ in range(4):
+            key = pool.choose()
+            key.requests += 1
+            chosen.append(key.api_key)
+        self.assertEqual(sorted(chosen), ['aaaa1', 'aaaa1', 'bbbb2', 'bbbb2'])
+
+        exhausted = pool.keys[0]
+        exhausted.rate_limiter.on_rate_limited(wait=60, response=Response(429, headers={'Retry-After': '60'}))
+        self.assertTrue(all(pool.choose() is pool.keys[1] for _ in range(3)))
+        self.assertEqual(len(pool.report()), 2)
+        self.assertNotIn('aaaa1', pool.report()[0])
+
+    def test_saturated_key(self):
+        async def run():
+            pool = KeyPool(api_keys=['aaaa1', 'bbbb2'])
+            busy, free = pool.keys
+            # the busy key has no quota yet, so it has more tokens than the free key,
+            # but its only concurrency slot is taken
+            busy.rate_limiter.concurrency = 1
+            await busy.rate_limiter.acquire()
+            free.rate_limiter.update(Response(200, headers={'X-RateLimit-Limit': '3600', 'X-RateLimit-Remaining': '1'}))
+
+            chosen = []
+            for _ in range(2):
+                key = pool.choose()
+                await asyncio.wait_for(key.rate_limiter.acquire(), timeout=1)
+                chosen.append(key.api_key)
+
+            # both keys are saturated now: the free key is out of tokens for about a
+            # second, and the busy key has tokens, so only its slot is waited for
+            self.assertLess(free.rate_limiter.tokens, 1)
+            key = pool.choose()
+            self.assertIs(key, busy)
+            waiting = asyncio.ensure_future(key.rate_limiter.acquire())
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            await busy.rate_limiter.release()
+            await asyncio.wait_for(waiting, timeout=1)
+            return chosen
+
+        self.assertEqual(asyncio.run(run()), ['bbbb2', 'bbbb2'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from unittest import TestCase, main
+import tempfile
+import os
+from xml.etree import ElementTree as et
+
+from crec.granule import Granule
+from crec.manifest import Manifest
+
+
+class ManifestTest(TestCase):
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = Manifest(path=os.path.join(directory, 'manifest.sqlite'))
+            granule_ids = ['CREC-2018-01-04-pt1-PgS2', 'CREC-2018-01-04-pt1-PgS1']
+            manifest.discovered(date='2018-01-04', granule_ids=granule_ids, classes=['SENATE'])
+            self.assertIsNone(manifest.finished_date(date='2018-01-04', classes=['SENATE']))
+
+            granules = []
+            for granule_id in granule_ids:
+                granule = Granule(granule_id=granule_id)
+                granule.write_responses(write=directory, xml_response=et.fromstring('<mods/>'), htm_response=f'<pre>{granule_id}</pre>')
+                granule.valid_responses = granule.complete = True
+                granules.append(granule)
+            manifest.record(granules=granules, write=directory)
+            manifest.finish_dates(dates=['2018-01-04'], incomplete_days=set())
+
+            self.assertEqual(manifest.finished_date(date='2018-01-04', classes=['SENATE']), granule_ids)
+            self.assertIsNone(manifest.finished_date(date='2018-01-04', classes=['SENATE', 'HOUSE']))
+            self.assertEqual(set(manifest.finished_files(granule_ids=granule_ids)), set(granule_ids))
+
+            with open(granules[0].write_paths(write=directory)[1], 'a') as htm_file:
+                htm_file.write('changed')
+            self.assertEqual(list(manifest.finished_files(granule_ids=granule_ids)), granule_ids[1:])
+            self.assertEqual(manifest.report(), '1 of 1 dates and 2 of 2 granules finished')
+            manifest.close()
+
+    def test_narrower_classes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = Manifest(path=os.path.join(directory, 'manifest.sqlite'))
+            senate_id, house_id = 'CREC-2018-01-04-pt1-PgS1', 'CREC-2018-01-04-pt1-PgH1'
+
+            def finish(granule_ids, complete):
+                granules = []
+                for granule_id in granule_ids:
+                    granule = Granule(granule_id=granule_id)
+                    granule.write_responses(write=directory, xml_response=et.fromstring('<mods/>'), htm_response=f'<pre>{granule_id}</pre>')
+                    granule.valid_responses = True
+                    granule.complete = complete
+                    granules.append(granule)
+                manifest.record(granules=granules, write=directory)
+                manifest.finish_dates(dates=['2018-01-04'], incomplete_days=set())
+
+            # a run with both classes, in which the house granule failed
+            manifest.discovered(date='2018-01-04', granule_ids=[senate_id, house_id], classes=['SENATE', 'HOUSE'])
+            finish(granule_ids=[senate_id], complete=True)
+            finish(granule_ids=[house_id], complete=False)
+            self.assertIsNone(manifest.finished_date(date='2018-01-04', classes=['SENATE', 'HOUSE']))
+
+            # a run with only the senate is not held up by the house granule, and does not return it
+            manifest.discovered(date='2018-01-04', granule_ids=[senate_id], classes=['SENATE'])
+            finish(granule_ids=[senate_id], complete=True)
+            self.assertEqual(manifest.finished_date(date='2018-01-04', classes=['SENATE']), [senate_id])
+            self.assertEqual(manifest.report(), '1 of 1 dates and 1 of 1 granules finished')
+
+            # going back to both classes lists the house granule again, and keeps the senate granule's files
+            manifest.discovered(date='2018-01-04', granule_ids=[senate_id, house_id], classes=['SENATE', 'HOUSE'])
+            manifest.finish_dates(dates=['2018-01-04'], incomplete_days=set())
+            self.assertIsNone(manifest.finished_date(date='2018-01-04', classes=['SENATE', 'HOUSE']))
+            self.assertEqual(list(manifest.finished_files(granule_ids=[senate_id, house_id])), [senate_id])
+            finish(granule_ids=[house_id], complete=True)
+            self.assertEqual(manifest.finished_date(date='2018-01-04', classes=['SENATE', 'HOUSE']), [senate_id, house_id])
+            manifest.close()
+
+
+if __name__ == "__main__":
+    main()
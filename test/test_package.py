@@ -0,0 +1,41 @@
+from unittest import TestCase, main
+import asyncio
+import tempfile
+import time
+import os
+
+from crec.package import PackageCalendar, package_dates, read_watermark, write_watermark
+
+
+class PackageTest(TestCase):
+    def test_package_dates(self):
+        packages = [{'packageId': 'CREC-2018-01-04'}, {'packageId': 'CREC-2018-01-03'}, {'packageId': 'CREC-2018-01-04'}, {'packageId': 'CRECB-2018-pt1'}]
+        self.assertEqual(package_dates(packages), ['2018-01-03', '2018-01-04'])
+
+    def test_watermark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sync', 'watermark.json')
+            self.assertIsNone(read_watermark(path))
+            write_watermark(path, '2018-01-04T00:00:00Z')
+            write_watermark(path, '2018-01-05T00:00:00Z')
+            self.assertEqual(read_watermark(path), '2018-01-05T00:00:00Z')
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['watermark.json'])
+
+    def test_calendar(self):
+        self.assertEqual(PackageCalendar.month_range('2017-11-20', '2018-02-03'), ['2017-11', '2017-12', '2018-01', '2018-02'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'calendar.json')
+            calendar = PackageCalendar(path=path)
+            calendar.months = {'2018-01': {'fetched_at': time.time(), 'dates': ['2018-01-02', '2018-01-06', '2018-01-30']}}
+            calendar.save()
+
+            calendar = PackageCalendar(path=path)
+            self.assertTrue(calendar.is_fresh('2018-01'))
+            covered, dates = asyncio.run(calendar.session_dates('2018-01-03', '2018-01-29', client=None, logger=None))
+            self.assertEqual((covered, dates), (True, ['2018-01-06']))
+            self.assertFalse(PackageCalendar(path=path, max_age=0).is_fresh('2018-01'))
+
+
+if __name__ == "__main__":
+    main()
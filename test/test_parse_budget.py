@@ -0,0 +1,58 @@
+from unittest import TestCase, main
+from xml.etree import ElementTree as et
+import time
+
+from crec.granule import Granule, ParseTimeoutError
+
+HEAD = '<html>\n<body><pre>\n[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]\n\n\n\n                        MORNING BUSINESS\n\n'
+MODS = '<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgS27</granuleId><congMember role="SPEAKING" bioGuideId="S000001"><name type="parsed">Mr. SMITH</name><name type="authority-fnf">John Smith</name></congMember></extension></mods>'
+
+# each of these used to take time quadratic in its length to parse (from seconds to
+# minutes at this size)
+ADVERSARIAL = [
+    HEAD + '  ' + 'Mr. SMITH (for '*50000,
+    HEAD + '  ' + 'x [[Page '*50000,
+    HEAD + '  Mr. SMITH. Yes. {time}' + '\n '*50000,
+    HEAD + '  ' + 'The PRESIDING OFFICER ('*50000,
+]
+
+
+class ParseBudgetTest(TestCase):
+    def parse(self, text, parse_budget):
+        granule = Granule(granule_id='CREC-2018-01-04-pt1-PgS27')
+        granule.parse_responses(xml_response=et.fromstring(MODS), htm_response=text, parse_budget=parse_budget)
+        return granule
+
+    def test_adversarial(self):
+        for text in ADVERSARIAL:
+            granule = self.parse(text=text, parse_budget=10)
+            self.assertTrue(granule.parsed, granule.parse_exception)
+
+    def test_parse_budget(self):
+        granule = self.parse(text=HEAD + '  Mr. SMITH. Yes.\n'*1000, parse_budget=0)
+        self.assertFalse(granule.parsed)
+        self.assertIsInstance(granule.parse_exception, ParseTimeoutError)
+
+        granule = self.parse(text=HEAD + '  Mr. SMITH. Yes.\n'*1000, parse_budget=False)
+        self.assertTrue(granule.parsed)
+        self.assertEqual(len(granule.passages.to_list()), 1000)
+
+    def test_step_past_budget(self):
+        # a step is not interrupted: the budget is checked once it has finished
+        class SlowGranule(Granule):
+            def find_titled_speakers(self):
+                time.sleep(0.3)
+                super().find_titled_speakers()
+
+        granule = SlowGranule(granule_id='CREC-2018-01-04-pt1-PgS27')
+        start = time.monotonic()
+        granule.parse_responses(xml_response=et.fromstring(MODS), htm_response=HEAD + '  Mr. SMITH. Yes.\n', parse_budget=0.05)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertFalse(granule.parsed)
+        self.assertIsInstance(granule.parse_exception, ParseTimeoutError)
+        # the steps after it did not run
+        self.assertEqual(len(granule.passages.to_list()), 0)
+
+
+if __name__ == "__main__":
+    main()
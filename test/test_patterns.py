@@ -0,0 +1,110 @@
+from unittest import TestCase, main
+from xml.etree import ElementTree as et
+import random
+import re
+
+from crec.granule import Granule
+from crec.patterns import find_titles, speaker_matcher, SpeakerMatcher
+
+# the titles as they were before they were precompiled, which find_titles must agree with
+BASELINE_TITLES = [
+    'The PRESIDING OFFICER(?: \\([^)]*\\))?',
+    'The SPEAKER pro tempore(?: \\([^)]*\\))?(?: \\(during the vote\\))?',
+    'The SPEAKER pro tempore(?: \\(during the vote\\))?',
+    'The SPEAKER pro tempore(?: \\([^)]*\\))?',
+    'The SPEAKER pro tempore',
+    'The SPEAKER(?: \\(during the vote\\))',
+    'The SPEAKER(?: \\([^)]*\\))?',
+    'The CHAIR(?: \\([^)]*\\))?',
+    'The Acting CHAIR(?: \\([^)]*\\))?',
+    'The ACTING PRESIDENT pro tempore',
+    'The ACTING PRESIDENT(?: \\([^)]*\\))?',
+    'The PRESIDENT(?: \\([^)]*\\))?',
+    'The CHIEF JUSTICE(?: \\([^)]*\\))?',
+    'The VICE PRESIDENT(?: \\([^)]*\\))?',
+    '(Mr\\.|Ms\\.|Miss) Counsel (?=\\w*[A-Z]{2,})[A-Za-z]{3,}',
+    '(Mr\\.|Ms\\.|Miss) Manager (?=\\w*[A-Z]{2,})[A-Za-z]{3,}'
+]
+TEXT = '''The PRESIDING OFFICER. The Senator from Kentucky.
+
+The PRESIDING OFFICER (Mr. SULLIVAN). Without objection, it is so ordered.
+
+The SPEAKER pro tempore (Mr. LaHOOD) (during the vote). There are 2 minutes remaining.
+
+The SPEAKER pro tempore. The question is on the motion. The SPEAKER (during the vote). The SPEAKER.
+
+The Acting CHAIR (Ms. FOXX). The CHAIR recognizes the gentleman. The ACTING PRESIDENT pro tempore. The ACTING PRESIDENT (Mr. X).
+
+The PRESIDENT pro tempore. The CHIEF JUSTICE. The VICE PRESIDENT. The Presiding Officer is not a title.
+
+Mr. Manager RASKIN. Ms. Manager DeGETTE. Mr. Counsel PHILBIN. Miss Counsel Sekulow. Mr. Manager NADLER of New York.'''
+NESTED = 'The SPEAKER pro tempore (Mr. Smith (of Texas)). The PRESIDING OFFICER (Mr. KING (for himself) (during the vote). The CHAIR (unclosed. (a) The CHAIR (Ms. FOXX) (during the vote).'
+SPEAKERS = ['Mr\\. KING of Iowa', 'Mr\\. SMITH', 'Mr\\. KING', 'The PRESIDING OFFICER \\(Mr\\. SULLIVAN\\)']
+PIECES = ['Mr. SMITH (for ', 'Mr. KING (for himself and Mr. SMITH): ', 'Mr. KING. ', 'Mr. KING of Iowa. ', 'Mr. SMITH led the Pledge of Allegiance as follows: ', 'The PRESIDING OFFICER (Mr. SULLIVAN). ', '): ', ')', '(', 'words ', ' ', '\n  ']
+HTM = '<html>\n<body><pre>\n[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]\n\n\n\n                        MORNING BUSINESS\n\n  Mr. KING of Iowa. Mr. Speaker, I rise today.\n  Mr. KING. I thank the gentleman.\n  Mr. KING of Iowa. I yield back.\n\n                          ____________________\n\n</pre></body>\n</html>\n'
+MEMBERS = [('Mr. KING', 'Angus King'), ('Mr. KING of Iowa', 'Steve King')]
+
+
+def baseline_speakers(names, text):
+    # how speakers were found before the matchers were cached
+    search = '(' + '|'.join([f'(?P<s{i}>{name}(\\.| led the Pledge of Allegiance as follows:| \\(for [\\s\\S]+\\):)( |))' for i, name in enumerate(names)]) + ')'
+    return [(m.start(), m.end(), [k for k, v in m.groupdict().items() if v is not None][0]) for m in re.finditer(search, text)]
+
+
+def granule(members):
+    congress_members = ''.join(f'<congMember role="SPEAKING" bioGuideId="B{i}"><name type="parsed">{parsed}</name><name type="authority-fnf">{name}</name></congMember>' for i, (parsed, name) in enumerate(members))
+    mods = f'<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>CREC-2018-01-04-pt1-PgH1</granuleId>{congress_members}</extension></mods>'
+    g = Granule(granule_id='CREC-2018-01-04-pt1-PgH1')
+    g.parse_responses(xml_response=et.fromstring(mods), htm_response=HTM)
+    return g
+
+
+class PatternsTest(TestCase):
+    def test_find_titles(self):
+        for text in [TEXT, TEXT.replace('\n\n', ' '), TEXT[:200], '', 'The', 'no titles here', NESTED, NESTED[::-1], 'The CHAIR (x' + NESTED, NESTED + ' The CHAIR (x The CHAIR.']:
+            expected = [match for t in BASELINE_TITLES for match in re.findall(t, text)]
+            self.assertEqual(find_titles(text), expected)
+
+    def test_parenthesized_titles(self):
+        # a parenthetical runs to the first closing parenthesis, even if it has opened another
+        self.assertEqual(find_titles('The SPEAKER pro tempore (Mr. Smith (of Texas)). The question is on the motion.'), [
+            'The SPEAKER pro tempore (Mr. Smith (of Texas)',
+            'The SPEAKER pro tempore',
+            'The SPEAKER pro tempore (Mr. Smith (of Texas)',
+            'The SPEAKER pro tempore',
+            'The SPEAKER'
+        ])
+        self.assertEqual(find_titles('The CHAIR (Mr. Smith. The CHAIR (Mr. Jones).'), ['The CHAIR (Mr. Smith. The CHAIR (Mr. Jones)'])
+        self.assertEqual(find_titles('(a) The CHAIR (Mr. Smith. The CHAIR.'), ['The CHAIR', 'The CHAIR'])
+
+    def test_speaker_boundaries(self):
+        names = tuple(SPEAKERS)
+        matcher = SpeakerMatcher(names=names)
+        r = random.Random(0)
+        texts = ['', 'Mr. KING (for himself): Yes. Mr. SMITH. No. Mr. KING (for x): Maybe. Mr. SMITH (for y. Mr. KING. Done.']
+        texts += [''.join(r.choice(PIECES) for _ in range(r.randint(1, 40))) for _ in range(2000)]
+        for text in texts:
+            self.assertEqual(matcher.find(text), baseline_speakers(names=names, text=text), text)
+
+        # the people a speaker speaks for run to the last '):', and the passages after it are found without them
+        self.assertEqual(matcher.find('Mr. KING (for himself): Yes. Mr. SMITH. No. Mr. KING (for x): Maybe. Mr. SMITH (for y. Mr. KING. Done.'), [(0, 62, 's2'), (87, 97, 's2')])
+
+    def test_speaker_matcher(self):
+        # a name that starts another one is tried after it, whatever the order of the metadata
+        speaker_matcher.cache_clear()
+        for members in [MEMBERS, MEMBERS[::-1]]:
+            g = granule(members=members)
+            self.assertTrue(g.parsed, g.parse_exception)
+            self.assertEqual([p.speaker.parsed_name for p in g.passages], ['Mr. KING of Iowa', 'Mr. KING', 'Mr. KING of Iowa'])
+            self.assertEqual([p.text.strip() for p in g.passages], ['Mr. Speaker, I rise today.', 'I thank the gentleman.', 'I yield back.'])
+
+        # granules with the same speakers share a matcher
+        self.assertEqual(speaker_matcher.cache_info().misses, 1)
+        self.assertEqual(speaker_matcher.cache_info().hits, 1)
+        names = ('Mr\\. KING of Iowa', 'Mr\\. KING')
+        self.assertIs(speaker_matcher(names), speaker_matcher(tuple(names)))
+        self.assertIsNot(speaker_matcher(names), speaker_matcher(names[::-1]))
+
+
+if __name__ == "__main__":
+    main()
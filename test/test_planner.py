@@ -0,0 +1,59 @@
+from unittest import TestCase, main
+
+from crec.constants import SUMMARY_SIZE
+from crec.planner import Planner
+
+SUMMARIES = [{'granuleId': f'CREC-2018-01-04-pt1-PgS{i}', 'granuleClass': ['HOUSE', 'SENATE', 'EXTENSIONS', 'DAILYDIGEST'][i % 4]} for i in range(40)]
+
+
+class PlannerTest(TestCase):
+    def test_plan_date(self):
+        planner = Planner()
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=[g['granuleId'] for g in SUMMARIES])
+        self.assertTrue(plan.zipped)
+        self.assertFalse(plan.ranges)
+        # one request to list the granules, and one for the zipped file
+        self.assertEqual(plan.requests, 2)
+
+        digest_ids = [g['granuleId'] for g in SUMMARIES if g['granuleClass'] == 'DAILYDIGEST']
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids)
+        self.assertFalse(plan.zipped)
+        self.assertEqual(plan.requests, 1 + 2*len(digest_ids))
+        self.assertEqual(plan.granule_ids, digest_ids)
+
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids, zip_on_disk=True)
+        self.assertTrue(plan.zipped)
+        self.assertEqual((plan.requests, plan.estimated_bytes), (1, len(SUMMARIES)*SUMMARY_SIZE))
+
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=[])
+        self.assertFalse(plan.zipped)
+        self.assertEqual(plan.requests, 1)
+        self.assertIn('1 dates in zipped files (0 with range requests)', Planner.report(plans=[plan, planner.plan_date(date='2018-01-05', summaries=SUMMARIES, granule_ids=[g['granuleId'] for g in SUMMARIES])]))
+
+    def test_plan_ranges(self):
+        planner = Planner(ranges=True)
+        digest_ids = [g['granuleId'] for g in SUMMARIES if g['granuleClass'] == 'DAILYDIGEST']
+        # too few granules for the whole zipped file, but enough that range requests
+        # beat two requests per granule
+        self.assertFalse(Planner().plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids).zipped)
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids)
+        self.assertTrue(plan.zipped and plan.ranges)
+        # the listing, the end of the zipped file, its metadata, and each wanted granule
+        self.assertEqual(plan.requests, 3 + len(digest_ids))
+        self.assertEqual(plan.granule_ids, digest_ids)
+
+        # neighboring granules are read in a single range
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=[g['granuleId'] for g in SUMMARIES[:10]])
+        self.assertEqual(plan.requests, 4)
+
+        # a single granule is still cheaper on its own
+        self.assertFalse(planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids[:1]).zipped)
+
+        plan = planner.plan_date(date='2018-01-04', summaries=SUMMARIES, granule_ids=digest_ids, zip_on_disk=True)
+        self.assertTrue(plan.zipped)
+        self.assertFalse(plan.ranges)
+        self.assertIn('2 dates in zipped files (1 with range requests)', Planner.report(plans=[plan, planner.plan_date(date='2018-01-05', summaries=SUMMARIES, granule_ids=digest_ids)]))
+
+
+if __name__ == '__main__':
+    main()
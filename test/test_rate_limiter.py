@@ -0,0 +1,121 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from httpx import Response
+import email.utils
+import asyncio
+import threading
+import time
+
+from crec.api import GovInfoClient, RateLimiter
+from crec.logger import Logger
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = b'body'
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RateLimiterTest(TestCase):
+    def test_update(self):
+        limiter = RateLimiter(window=3600)
+        limiter.update(Response(200))
+        self.assertIsNone(limiter.rate)
+        self.assertEqual(limiter.tokens, float('inf'))
+
+        # without a reset, the quota is spread over the window
+        limiter.update(Response(200, headers={'X-RateLimit-Limit': '3600', 'X-RateLimit-Remaining': '100'}), in_flight=3)
+        self.assertEqual((limiter.limit, limiter.remaining), (3600, 100))
+        self.assertEqual(limiter.learned_rate, 1.0)
+        self.assertEqual(limiter.rate, 1.0)
+        self.assertEqual(limiter.tokens, 98)
+
+        # with a reset, what remains is spread over the time until the reset
+        limiter.update(Response(200, headers={'X-RateLimit-Limit': '3600', 'X-RateLimit-Remaining': '50', 'X-RateLimit-Reset': '100'}), in_flight=1)
+        self.assertEqual(limiter.learned_rate, 0.5)
+        self.assertEqual(limiter.rate, 0.5)
+        self.assertEqual(limiter.tokens, 50)
+
+        limiter.update(Response(200, headers={'X-RateLimit-Remaining': '50', 'X-RateLimit-Reset': str(int(time.time()) + 200)}))
+        self.assertAlmostEqual(limiter.learned_rate, 0.25, places=2)
+
+    def test_additive_increase(self):
+        limiter = RateLimiter()
+        limiter.update(Response(200, headers={'X-RateLimit-Limit': '3600', 'X-RateLimit-Remaining': '3600'}))
+        limiter.concurrency, limiter.rate = 4, 0.5
+        for _ in range(3):
+            limiter.on_success()
+        self.assertEqual(limiter.concurrency, 4)
+        limiter.on_success()
+        self.assertEqual(limiter.concurrency, 5)
+        self.assertAlmostEqual(limiter.rate, 0.54)
+
+        for _ in range(100):
+            limiter.on_success()
+        self.assertEqual(limiter.rate, limiter.learned_rate)
+
+    def test_multiplicative_decrease(self):
+        limiter = RateLimiter(max_concurrency=100)
+        limiter.update(Response(200, headers={'X-RateLimit-Limit': '3600', 'X-RateLimit-Remaining': '10'}))
+
+        pause = limiter.on_rate_limited(wait=30, response=Response(429), in_flight=8)
+        self.assertEqual(pause, 30)
+        self.assertEqual(limiter.concurrency, 4)
+        self.assertEqual(limiter.rate, 0.5)
+        self.assertEqual(limiter.tokens, 0)
+
+        # errors that arrive while requests are paused count as the same error
+        pause = limiter.on_rate_limited(wait=30, response=Response(429), in_flight=4)
+        self.assertLessEqual(pause, 30)
+        self.assertEqual((limiter.concurrency, limiter.rate, limiter.rate_limit_errors), (4, 0.5, 2))
+
+        # the pause lasts until the quota resets, if GovInfo says when
+        limiter.paused_until = 0
+        pause = limiter.on_rate_limited(wait=30, response=Response(429, headers={'X-RateLimit-Reset': '120'}))
+        self.assertEqual(pause, 120)
+        self.assertEqual((limiter.concurrency, limiter.rate), (2, 0.25))
+        self.assertGreater(limiter.paused_until, time.monotonic() + 100)
+
+        limiter.paused_until = 0
+        retry_at = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(limiter.on_rate_limited(wait=30, response=Response(429, headers={'Retry-After': retry_at})), 60, delta=2)
+        self.assertEqual(limiter.concurrency, 1)
+
+        self.assertEqual(limiter.report(), 'current rate: 0.12 requests/second; learned rate: 1.00 requests/second; concurrency: 1 requests; rate limit errors: 4')
+
+    def test_client(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        server.script = [(429, {'X-RateLimit-Limit': '360000', 'X-RateLimit-Remaining': '0', 'Retry-After': '0'}), (200, {'X-RateLimit-Limit': '360000', 'X-RateLimit-Remaining': '359999'}), (206, {})]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger = Logger(rate_limit_wait=30, print_logs=False, write_logs=False, write_path=None)
+        client = GovInfoClient(rate_limit_wait=30, retry_limit=2, logger=logger, api_key=None)
+        client.non_api_root = f'http://127.0.0.1:{server.server_address[1]}/'
+
+        async def get():
+            async with client:
+                return await client.get(url='content/a', use_api=False, use_cache=False), await client.get(url='content/b', use_api=False, use_cache=False)
+
+        (first_validity, _), (second_validity, _) = asyncio.run(get())
+        self.assertTrue(first_validity)
+        # a partial response to a request without a Range header is retried, not accepted
+        self.assertTrue(second_validity)
+        limiter = client.rate_limiter
+        # halved to one request by the error, and raised by one after a successful round
+        self.assertEqual((limiter.rate_limit_errors, limiter.concurrency, limiter.in_flight), (1, 2, 0))
+        self.assertEqual(limiter.learned_rate, 100.0)
+        server.shutdown()
+        server.server_close()
+        logger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import tempfile
+import threading
+import zipfile
+import random
+import string
+import io
+import os
+import struct
+import time
+
+from crec.api import GovInfoClient
+from crec.downloader import Downloader
+from crec.logger import Logger
+from crec.remotezip import RemoteZip
+
+DATE = '2018-01-04'
+GRANULES = [(f'CREC-{DATE}-pt1-PgS{i}', ['HOUSE', 'SENATE', 'EXTENSIONS', 'DAILYDIGEST'][i % 4]) for i in range(40)]
+
+
+def make_zip() -> bytes:
+    text = random.Random(0)
+    related_items = ''.join(f'<relatedItem type="constituent" ID="id-{g_id}"><extension><granuleClass>{g_class}</granuleClass></extension></relatedItem>' for g_id, g_class in GRANULES)
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(zip_bytes, 'w', zipfile.ZIP_DEFLATED) as date_zip:
+        date_zip.writestr(f'CREC-{DATE}/mods.xml', f'<mods xmlns="http://www.loc.gov/mods/v3">{related_items}</mods>')
+        for g_id, _ in GRANULES:
+            date_zip.writestr(f'CREC-{DATE}/html/{g_id}.htm', f'<pre>{g_id} ' + ''.join(text.choices(string.ascii_letters + ' \n', k=4000)) + '</pre>')
+        date_zip.writestr(f'CREC-{DATE}/pdf/stored.txt', b'stored, not deflated', compress_type=zipfile.ZIP_STORED)
+    return zip_bytes.getvalue()
+
+
+def corrupt(body: bytes, part: str) -> bytes:
+    body = bytearray(body)
+    eocd_index = body.rfind(b'PK\x05\x06')
+    if part == 'directory' and eocd_index >= 0:
+        # claim more entries than the central directory holds, so it reads as truncated
+        struct.pack_into('<HH', body, eocd_index + 8, 1000, 1000)
+    elif part == 'member' and eocd_index < 0:
+        # start each member's compressed content with an invalid deflate block
+        header_index = body.find(b'PK\x03\x04')
+        while header_index >= 0 and header_index + 30 <= len(body):
+            name_length, extra_length = struct.unpack_from('<HH', body, header_index + 26)
+            data_index = header_index + 30 + name_length + extra_length
+            if data_index < len(body):
+                body[data_index] = 0xFF
+            header_index = body.find(b'PK\x03\x04', header_index + 4)
+    return bytes(body)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        content = self.server.content
+        range_header = self.headers.get('Range', None)
+        self.server.ranges.append(range_header)
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        if range_header is not None and self.server.honor_ranges:
+            start, end = range_header.split('=')[1].split('-')
+            if start == '':
+                start, end = max(len(content) - int(end), 0), len(content) - 1
+            else:
+                start, end = int(start), min(int(end), len(content) - 1)
+            body = corrupt(content[start:end + 1], self.server.corrupt)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+        else:
+            body = content
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RemoteZipTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.content = make_zip()
+        self.server.honor_ranges = True
+        self.server.corrupt = None
+        self.server.ranges = []
+        self.server.lock = threading.Lock()
+        self.server.in_flight = self.server.max_in_flight = 0
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger = Logger(rate_limit_wait=False, print_logs=False, write_logs=False, write_path=None)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.logger.close()
+
+    def client(self) -> GovInfoClient:
+        client = GovInfoClient(rate_limit_wait=False, retry_limit=1, logger=self.logger, api_key=None)
+        client.non_api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        return client
+
+    def test_read_members(self):
+        names = [f'CREC-{DATE}/mods.xml', f'CREC-{DATE}/html/{GRANULES[5][0]}.htm', f'CREC-{DATE}/html/{GRANULES[6][0]}.htm', f'CREC-{DATE}/pdf/stored.txt']
+
+        async def read():
+            async with self.client() as client:
+                response_validity, _, remote_zip = await RemoteZip.open(url=f'content/pkg/CREC-{DATE}.zip', client=client, file=tempfile.TemporaryFile(), tail_size=512)
+                self.assertTrue(response_validity)
+                response_validity, _, contents = await remote_zip.read_members(names=names)
+                self.assertTrue(response_validity)
+                return remote_zip, contents
+
+        remote_zip, contents = asyncio.run(read())
+        date_zip = zipfile.ZipFile(io.BytesIO(self.server.content))
+        self.assertEqual(remote_zip.namelist(), date_zip.namelist())
+        self.assertEqual(contents, {name: date_zip.read(name) for name in names})
+        self.assertLess(remote_zip.downloaded_bytes, len(self.server.content) / 4)
+        self.assertLess(remote_zip.requests, 2 + len(names))
+
+    def test_concurrent_ranges(self):
+        names = [f'CREC-{DATE}/html/{g_id}.htm' for g_id, _ in GRANULES[::8]]
+        self.server.delay = 0.2
+
+        async def read():
+            async with self.client() as client:
+                _, _, remote_zip = await RemoteZip.open(url=f'content/pkg/CREC-{DATE}.zip', client=client, file=tempfile.TemporaryFile(), tail_size=512)
+                self.server.max_in_flight = 0
+                response_validity, _, contents = await remote_zip.read_members(names=names, max_gap=0)
+                self.assertTrue(response_validity)
+                return remote_zip, contents
+
+        remote_zip, contents = asyncio.run(read())
+        date_zip = zipfile.ZipFile(io.BytesIO(self.server.content))
+        self.assertEqual(contents, {name: date_zip.read(name) for name in names})
+        # each member is its own range, and the ranges were in flight together
+        self.assertEqual(remote_zip.requests, 2 + len(names))
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def test_ignored_ranges(self):
+        self.server.honor_ranges = False
+
+        async def read():
+            async with self.client() as client:
+                zip_file = tempfile.TemporaryFile()
+                response_validity, _, remote_zip = await RemoteZip.open(url=f'content/pkg/CREC-{DATE}.zip', client=client, file=zip_file)
+                return response_validity, remote_zip, zip_file
+
+        response_validity, remote_zip, zip_file = asyncio.run(read())
+        self.assertTrue(response_validity)
+        self.assertIsNone(remote_zip)
+        self.assertEqual(zip_file.read(), self.server.content)
+
+    def test_downloader_ranges(self):
+        for honor_ranges in [True, False]:
+            self.server.honor_ranges = honor_ranges
+            with tempfile.TemporaryDirectory() as directory:
+                client = self.client()
+                downloader = Downloader(granule_class_filter=['DAILYDIGEST'], parse=False, write=directory, zipped=True, ranges=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=1, api_key=None, logger=self.logger, client=client)
+
+                async def get():
+                    async with client:
+                        return await downloader.get_granules_from_zip_date(date=DATE, client=client)
+
+                granules = asyncio.run(get())
+                self.assertEqual([g.id for g in granules], [g_id for g_id, g_class in GRANULES if g_class == 'DAILYDIGEST'])
+                self.assertTrue(all(g.complete for g in granules))
+                self.assertEqual(len(os.listdir(directory)), 2*len(granules))
+                downloader.close()
+
+    def test_downloader_corrupt_ranges(self):
+        for part in ['directory', 'member']:
+            self.server.corrupt = part
+            self.server.ranges = []
+            client = self.client()
+            downloader = Downloader(granule_class_filter=['DAILYDIGEST'], parse=True, write=False, zipped=True, ranges=True, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=1, api_key=None, logger=self.logger, client=client)
+
+            async def get():
+                async with client:
+                    return await downloader.get_granules_from_zip_date(date=DATE, client=client)
+
+            granules = asyncio.run(get())
+            self.assertEqual([g.id for g in granules], [g_id for g_id, g_class in GRANULES if g_class == 'DAILYDIGEST'])
+            # the range requests failed, and the whole zipped file was requested instead
+            self.assertGreater(len(self.server.ranges), 1)
+            self.assertIsNone(self.server.ranges[-1])
+            downloader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+from unittest import TestCase, main
+from httpx._client import ClientState
+
+from crec.session import Session
+
+
+class SessionTest(TestCase):
+    def test_session(self):
+        with Session(print_logs=False, http2=False) as session:
+            self.assertEqual(session.client._state, ClientState.OPENED)
+            self.assertTrue(session.loop_handler.is_alive())
+
+        self.assertTrue(session.closed)
+        self.assertEqual(session.client._state, ClientState.CLOSED)
+        self.assertFalse(session.loop_handler.is_alive())
+        self.assertNotIn(session.logger.queue_handler, session.logger.logger.handlers)
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import json
+
+from crec.record import Record
+from crec.session import Session
+
+DATES = ['2018-01-02', '2018-01-03', '2018-01-04', '2018-01-05']
+GRANULE_IDS = {date: [f'CREC-{date}-pt1-PgS{i}' for i in range(1, 4)] for date in DATES}
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>{granule_id}</granuleId><granuleClass>SENATE</granuleClass>
+<congMember role="SPEAKING" bioGuideId="M000355"><name type="parsed">Mr. McCONNELL</name><name type="authority-fnf">Mitch McConnell</name></congMember>
+<congMember role="SPEAKING" bioGuideId="S000148"><name type="parsed">Mr. SCHUMER</name><name type="authority-fnf">Charles E. Schumer</name></congMember>
+</extension></mods>'''
+HTM = '''<html>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+
+
+
+                        MORNING BUSINESS
+
+  Mr. McCONNELL. Mr. President, I ask unanimous consent about {granule_id}.
+  Mr. SCHUMER. Mr. President, I object to {granule_id}.
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+
+
+class PackageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /packages/CREC-<date>/granules, and /packages/CREC-<date>/granules/<granule id>/<mods or htm>
+        parts = self.path.split('?')[0].strip('/').split('/')
+        self.server.paths.append('/'.join(parts))
+        if len(parts) == 3:
+            granules = [{'granuleId': g_id, 'granuleClass': 'SENATE', 'title': 'MORNING BUSINESS'} for g_id in GRANULE_IDS[parts[1][5:]]]
+            body, content_type = json.dumps({'count': len(granules), 'granules': granules}).encode(), 'application/json'
+        elif parts[4] == 'mods':
+            body, content_type = MODS.format(granule_id=parts[3]).encode(), 'application/xml'
+        else:
+            body, content_type = HTM.format(granule_id=parts[3]).encode(), 'text/html'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def passage_summary(passages) -> list:
+    return [(p.granule_attributes['granuleId'], p.speaker.first_last, p.text) for p in passages]
+
+
+class StreamTest(TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PackageHandler)
+        self.server.paths = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.session = Session(rate_limit_wait=False, retry_limit=1, http2=False, print_logs=False)
+        self.session.client.api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def record(self, stream: bool) -> Record:
+        return Record(dates=DATES, zipped=False, batch_size=2, session=self.session, stream=stream)
+
+    def test_stream(self):
+        record = self.record(stream=False)
+        streamed_granules = [g.id for g in self.record(stream=True).iter_granules()]
+        streamed_passages = passage_summary(self.record(stream=True).iter_passages())
+
+        self.assertEqual(streamed_granules, [g_id for date in DATES for g_id in GRANULE_IDS[date]])
+        self.assertEqual(streamed_granules, [g.id for g in record.granules])
+        self.assertEqual(len(streamed_passages), 2 * len(streamed_granules))
+        self.assertEqual(streamed_passages, passage_summary(record.passages))
+
+    def test_stop_early(self):
+        passages = self.record(stream=True).iter_passages(prefetch=1)
+        passage = next(passages)
+        passages.close()
+
+        self.assertEqual((passage.granule_attributes['granuleId'], passage.speaker.first_last), (GRANULE_IDS[DATES[0]][0], 'Mitch McConnell'))
+        # only the first day, and the day prefetched after it, were requested
+        requested_dates = {path.split('/')[1][5:] for path in self.server.paths}
+        self.assertEqual(requested_dates, set(DATES[:2]))
+        self.assertLess(len(self.server.paths), len(DATES) * (1 + 2 * len(GRANULE_IDS[DATES[0]])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+from unittest import TestCase, main
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import tempfile
+import threading
+import json
+import os
+import re
+
+from crec.downloader import Downloader
+from crec.package import read_watermark, write_watermark
+from crec.record import Record
+from crec.session import Session
+
+DATES = ['2018-01-03', '2018-01-04', '2018-01-05']
+# a watermark from before any package below was last modified, standing in for an earlier sync
+EARLIER_SYNC = '2018-02-01T00:00:00Z'
+MODS = '''<mods xmlns="http://www.loc.gov/mods/v3"><extension><granuleId>{granule_id}</granuleId><granuleClass>SENATE</granuleClass>
+<congMember role="SPEAKING" bioGuideId="M000355"><name type="parsed">Mr. McCONNELL</name><name type="authority-fnf">Mitch McConnell</name></congMember>
+</extension></mods>'''
+HTM = '''<html>
+<body><pre>
+[Congressional Record Volume 164, Number 3 (Thursday, January 4, 2018)]
+
+
+
+                        MORNING BUSINESS
+
+  Mr. McCONNELL. Mr. President, this is version {version} of {granule_id}.
+
+                          ____________________
+
+</pre></body>
+</html>
+'''
+
+
+def granule_id(date: str) -> str:
+    return f'CREC-{date}-pt1-PgS1'
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        # /published/<start date>/<end date>, /packages/CREC-<date>/granules, and
+        # /packages/CREC-<date>/granules/<granule id>/<mods or htm>
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        self.server.paths.append('/'.join(parts))
+        if parts[0] == 'published':
+            since = parse_qs(url.query).get('modifiedSince', [''])[0]
+            packages = [{'packageId': f'CREC-{d}', 'lastModified': m} for d, m in self.server.modified.items() if parts[1] <= d <= parts[2] and m > since]
+            body, content_type = json.dumps({'count': len(packages), 'packages': packages}).encode(), 'application/json'
+        elif len(parts) == 3:
+            granules = [{'granuleId': granule_id(parts[1][5:]), 'granuleClass': 'SENATE', 'title': 'MORNING BUSINESS'}]
+            body, content_type = json.dumps({'count': len(granules), 'granules': granules}).encode(), 'application/json'
+        elif parts[1][5:] in self.server.failing:
+            body, content_type = b'the granule does not exist', 'text/plain'
+        elif parts[4] == 'mods':
+            body, content_type = MODS.format(granule_id=parts[3]).encode(), 'application/xml'
+        else:
+            body, content_type = HTM.format(granule_id=parts[3], version=self.server.versions[parts[1][5:]]).encode(), 'text/html'
+        self.send_response(400 if parts[1][5:] in self.server.failing and len(parts) == 5 else 200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class SyncTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.watermark_path = os.path.join(self.directory.name, 'watermark.json')
+        self.manifest_path = os.path.join(self.directory.name, 'manifest.sqlite')
+        self.write_path = os.path.join(self.directory.name, 'granules')
+        os.makedirs(self.write_path)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SyncHandler)
+        self.server.paths = []
+        self.server.modified = {d: '2018-01-10T00:00:00Z' for d in DATES}
+        self.server.versions = {d: 1 for d in DATES}
+        self.server.failing = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.session = Session(rate_limit_wait=False, retry_limit=1, cache=os.path.join(self.directory.name, 'cache'), http2=False, print_logs=False)
+        self.session.client.api_root = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def sync(self) -> Record:
+        self.server.paths = []
+        return Record(dates=DATES, sync=self.watermark_path, resume=self.manifest_path, write=self.write_path, zipped=False, session=self.session)
+
+    def modify(self, date: str) -> None:
+        self.server.modified[date] = '2100-01-01T00:00:00Z'
+        self.server.versions[date] += 1
+
+    def requested_dates(self) -> set:
+        return {path.split('/')[1][5:] for path in self.server.paths if path.startswith('packages/')}
+
+    def versions(self, record: Record) -> dict:
+        return {g.id: int(re.search(r'this is version (\d+)', g.raw_text).group(1)) for g in record.granules}
+
+    def test_sync(self):
+        # the first sync gets every date, and sets the watermark
+        record = self.sync()
+        self.assertEqual([g.id for g in record.granules], [granule_id(d) for d in DATES])
+        self.assertEqual(self.requested_dates(), set(DATES))
+        self.assertIsNotNone(read_watermark(self.watermark_path))
+
+        # a modified package is requested again, past the cache and the manifest
+        write_watermark(self.watermark_path, EARLIER_SYNC)
+        self.modify(DATES[1])
+        record = self.sync()
+        self.assertEqual(self.versions(record), {granule_id(DATES[1]): 2})
+        self.assertEqual(self.requested_dates(), {DATES[1]})
+        self.assertGreater(read_watermark(self.watermark_path), EARLIER_SYNC)
+
+        # the watermark stays put if a modified package cannot be retrieved
+        write_watermark(self.watermark_path, EARLIER_SYNC)
+        self.modify(DATES[2])
+        self.server.failing.add(DATES[2])
+        record = self.sync()
+        self.assertEqual(record.incomplete_granules, {granule_id(DATES[2])})
+        self.assertEqual(read_watermark(self.watermark_path), EARLIER_SYNC)
+
+        # and the next sync tries again
+        self.server.failing.clear()
+        record = self.sync()
+        self.assertEqual(self.versions(record), {granule_id(d): 2 for d in DATES[1:]})
+        self.assertEqual(record.incomplete_granules, set())
+        self.assertGreater(read_watermark(self.watermark_path), EARLIER_SYNC)
+
+    def test_forget_dates(self):
+        self.sync()
+        downloader = Downloader(granule_class_filter=None, parse=True, write=self.write_path, zipped=False, batch_size=3, batch_wait=False, rate_limit_wait=False, retry_limit=1, api_key=None, logger=self.session.logger, resume=self.manifest_path, client=self.session.client)
+        cache = self.session.client.cache
+
+        def cached(date: str) -> bool:
+            return cache.lookup(cache.key(url=f'{self.session.client.api_root}packages/CREC-{date}/granules/{granule_id(date)}/htm')) is not None
+
+        self.assertTrue(all(cached(d) for d in DATES))
+        downloader.forget_dates(dates=[DATES[1]])
+        self.assertEqual([cached(d) for d in DATES], [True, False, True])
+        self.assertEqual([downloader.manifest.finished_date(date=d, classes=downloader.progress_key) is not None for d in DATES], [True, False, True])
+        downloader.manifest.close()
+
+
+if __name__ == '__main__':
+    main()